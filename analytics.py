@@ -1,5 +1,6 @@
 from database.database import get_session
-from database.models import User, Selection, Gift
+from database.functions import day
+from database.models import User, Selection, SelectionGift, Gift
 from sqlalchemy import func, select
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
@@ -11,7 +12,7 @@ class Analytics:
         async with get_session() as session:
             total_users = await session.scalar(select(func.count(User.telegram_id)))
             total_selections = await session.scalar(select(func.count(Selection.id)))
-            total_gifts = await session.scalar(select(func.count(Gift.id)))
+            total_gifts = await session.scalar(select(func.count(Gift.id)).where(Gift.is_active))
 
             return {
                 'total_users': total_users,
@@ -24,8 +25,8 @@ class Analytics:
         async with get_session() as session:
             query = select(
                 Gift.category,
-                func.count(Selection.id).label('usage_count')
-            ).join(Selection).group_by(Gift.category).order_by(func.count(Selection.id).desc())
+                func.count(SelectionGift.selection_id).label('usage_count')
+            ).join(SelectionGift).group_by(Gift.category).order_by(func.count(SelectionGift.selection_id).desc())
 
             result = await session.execute(query)
             return result.all()
@@ -36,12 +37,12 @@ class Analytics:
             start_date = datetime.utcnow() - timedelta(days=days)
 
             query = select(
-                func.date(Selection.created_at),
+                day(Selection.created_at),
                 func.count(Selection.id)
             ).where(
                 Selection.created_at >= start_date
             ).group_by(
-                func.date(Selection.created_at)
+                day(Selection.created_at)
             )
 
             result = await session.execute(query)
@@ -61,6 +62,7 @@ class Analytics:
             for range_name, (min_price, max_price) in ranges.items():
                 count = await session.scalar(
                     select(func.count(Gift.id)).where(
+                        Gift.is_active,
                         Gift.price.between(min_price, max_price)
                     )
                 )
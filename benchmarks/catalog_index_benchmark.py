@@ -0,0 +1,135 @@
+# Перезагрузка индекса каталога (GiftView + build_catalog_index) и подбор через
+# find_matching_gifts на каталоге из 100 тысяч подарков для обоих движков подбора.
+# Запуск из корня проекта: python -m benchmarks.catalog_index_benchmark
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix='gift_bot_bench_')
+# База для бенчмарка подменяется до импорта модулей проекта
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORK_DIR, 'catalog.db')}"
+
+from sqlalchemy import insert
+
+from database.database import dispose_engines, engine, init_db
+from database.models import Gift
+from services import catalog_index, gift_finder
+from services.catalog_index import RECIPIENT_FIELDS, load_catalog_gifts, reload_catalog_index
+from services.gift_finder import find_matching_gifts
+
+CATALOG_SIZE = 100_000
+SELECTIONS = 200
+RELOADS = 5
+BACKENDS = ('python', 'numpy')
+CATEGORIES = [f"Категория {i}" for i in range(40)]
+AGE_RANGES = ["0-12", "12-18", "18-99", "25-55", "35-99", "60+"]
+
+
+def generate_gifts(count: int, seed: int = 42):
+    rnd = random.Random(seed)
+    for i in range(count):
+        gift = {
+            'name': f"Подарок {i}",
+            'description': "Описание подарка",
+            'category': rnd.choice(CATEGORIES),
+            'subcategory': "Разное",
+            'link': f"https://example.com/{i}",
+            'age_range': rnd.choice(AGE_RANGES),
+            'price': float(rnd.randint(500, 50000)),
+            'city': "Вся Россия",
+            'marketplace_available': rnd.random() < 0.5,
+            'trend_score': rnd.randint(1, 10),
+            'consumable': rnd.random() < 0.3,
+            'creativity_score': rnd.randint(1, 10),
+            'image_name': str(i % 10 + 1)
+        }
+        for field in RECIPIENT_FIELDS.values():
+            gift[field] = rnd.random() < 0.4
+        yield gift
+
+
+def generate_criteria(count: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [
+        {
+            'recipient': rnd.choice(list(RECIPIENT_FIELDS)),
+            'age': rnd.randint(5, 80),
+            'budget': rnd.choice([0, 1000, 3000, 10000]),
+            'marketplace': rnd.random() < 0.5,
+            'consumable': rnd.random() < 0.5,
+            'trend_score': rnd.randint(1, 10)
+        }
+        for _ in range(count)
+    ]
+
+
+def use_backend(backend: str):
+    # Движок выбирается настройкой MATCHER_BACKEND при запуске бота
+    catalog_index.MATCHER_BACKEND = backend
+    gift_finder.MATCHER_BACKEND = backend
+
+
+def as_ids(result):
+    return [(category, [gift.id for gift in gifts]) for category, gifts in result.items()]
+
+
+async def seed():
+    await init_db()
+    rows = list(generate_gifts(CATALOG_SIZE))
+    async with engine.begin() as conn:
+        for start in range(0, len(rows), 5000):
+            await conn.execute(insert(Gift), rows[start:start + 5000])
+
+
+async def measure_reload() -> tuple:
+    # Отдельно чтение строк GiftView и полная перезагрузка (чтение + построение индекса)
+    loads, reloads = [], []
+    for _ in range(RELOADS):
+        started = time.perf_counter()
+        await load_catalog_gifts()
+        loads.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await reload_catalog_index()
+        reloads.append(time.perf_counter() - started)
+    return statistics.median(loads), statistics.median(reloads)
+
+
+async def measure_selections(criteria_list) -> tuple:
+    results = []
+    started = time.perf_counter()
+    for criteria in criteria_list:
+        results.append(await find_matching_gifts(criteria))
+    return (time.perf_counter() - started) / len(criteria_list), results
+
+
+async def main():
+    await seed()
+    criteria_list = generate_criteria(SELECTIONS)
+
+    results = {}
+    for backend in BACKENDS:
+        use_backend(backend)
+        load_time, reload_time = await measure_reload()
+        selection_time, results[backend] = await measure_selections(criteria_list)
+        print(
+            f"{backend:>6}: чтение {CATALOG_SIZE} строк {load_time * 1000:.0f} мс, "
+            f"перезагрузка индекса {reload_time * 1000:.0f} мс, "
+            f"подбор {selection_time * 1000:.2f} мс на подборку"
+        )
+
+    same = all(
+        as_ids(a) == as_ids(b) for a, b in zip(*(results[backend] for backend in BACKENDS))
+    )
+    print(f"Результаты движков совпадают: {same}")
+
+    await dispose_engines()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+# Нагрузочный бенчмарк базы: параллельные подборки (запись) и просмотр истории (чтение)
+# на профилях 'debug' (прежние настройки) и 'production' (WAL, пул, read-only движок).
+# Запуск из корня проекта: python -m benchmarks.db_load_benchmark
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix='gift_bot_bench_')
+# База для бенчмарка подменяется до импорта модулей проекта
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORK_DIR, 'unused.db')}"
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database.database import make_engine
+from database.models import Base, User, Gift, Selection, SelectionGift
+
+USERS = 100
+SELECTIONS_PER_USER = 10
+GIFTS = 1_000
+GIFTS_PER_SELECTION = 6
+
+
+async def seed(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(Gift.__table__.insert(), [
+            {'name': f"Подарок {i}", 'category': f"Категория {i % 40}", 'price': 1000.0, 'description': ''}
+            for i in range(1, GIFTS + 1)
+        ])
+        await conn.execute(User.__table__.insert(), [
+            {'telegram_id': user_id, 'name': f"Пользователь {user_id}"} for user_id in range(1, USERS + 1)
+        ])
+
+
+async def simulate_user(user_id: int, write_session, read_session, read_latencies: list, errors: list):
+    rnd = random.Random(user_id)
+    for _ in range(SELECTIONS_PER_USER):
+        # Сохранение подборки, как в process_consumable
+        try:
+            async with write_session() as session:
+                selection = Selection(user_id=user_id, recipient_type='friend', age=30, budget=0)
+                session.add(selection)
+                await session.flush()
+                for gift_id in rnd.sample(range(1, GIFTS + 1), GIFTS_PER_SELECTION):
+                    session.add(SelectionGift(selection_id=selection.id, gift_id=gift_id))
+                await session.commit()
+        except OperationalError:
+            # "database is locked": подборка пользователя потеряна
+            errors.append(user_id)
+
+        # Просмотр истории и карточки подарка
+        started = time.perf_counter()
+        async with read_session() as session:
+            await session.execute(
+                select(Selection).where(Selection.user_id == user_id).order_by(Selection.created_at.desc())
+            )
+            await session.get(Gift, rnd.randint(1, GIFTS))
+        read_latencies.append(time.perf_counter() - started)
+
+
+async def run_profile(profile: str):
+    url = f"sqlite+aiosqlite:///{os.path.join(WORK_DIR, f'{profile}.db')}"
+    engine = make_engine(url, profile)
+    # Логи SQL не сравниваем: иначе бенчмарк измеряет вывод в консоль
+    engine.sync_engine.echo = False
+    await seed(engine)
+
+    read_engine = make_engine(url, profile, read_only=True) if profile == 'production' else engine
+    write_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    read_session = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+    read_latencies = []
+    errors = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        simulate_user(user_id, write_session, read_session, read_latencies, errors)
+        for user_id in range(1, USERS + 1)
+    ))
+    elapsed = time.perf_counter() - started
+
+    if read_engine is not engine:
+        await read_engine.dispose()
+    await engine.dispose()
+
+    saved = USERS * SELECTIONS_PER_USER - len(errors)
+    read_latencies.sort()
+    print(
+        f"{profile:>10}: {saved} подборок за {elapsed:.2f} с ({saved / elapsed:.0f}/с), "
+        f"ошибок блокировки {len(errors)}, чтение истории: "
+        f"медиана {statistics.median(read_latencies) * 1000:.1f} мс, "
+        f"p95 {read_latencies[int(len(read_latencies) * 0.95)] * 1000:.1f} мс"
+    )
+
+
+async def main():
+    print(f"{USERS} пользователей параллельно, по {SELECTIONS_PER_USER} подборок")
+    for profile in ('debug', 'production'):
+        await run_profile(profile)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+# Бенчмарк потокового импорта каталога на сгенерированном xlsx на 100k строк.
+# Запуск из корня проекта: python -m benchmarks.excel_import_benchmark
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix='gift_bot_bench_')
+# База для бенчмарка подменяется до импорта модулей проекта
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+
+import openpyxl
+
+from database.database import init_db, engine
+from services.excel_parser import COLUMN_MAPPING, process_excel_file, shutdown_import_workers
+
+ROWS = 100_000
+CATEGORIES = [f"Категория {i}" for i in range(40)]
+
+
+def generate_workbook(path: str, rows: int, seed: int = 42):
+    rnd = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(COLUMN_MAPPING.values()))
+
+    for i in range(rows):
+        row = {
+            'name': f"Подарок {i}",
+            'description': "Описание подарка " * 5,
+            'category': rnd.choice(CATEGORIES),
+            'subcategory': "Разное",
+            'link': f"https://example.com/gift/{i}",
+            'age_range': "18-99",
+            'price': rnd.randint(500, 50000),
+            'city': "Вся Россия",
+            'marketplace_available': rnd.choice(["Да", "Нет"]),
+            'trend_score': rnd.randint(1, 10),
+            'consumable': rnd.choice(["Да", "Нет", None]),
+            'creativity_score': rnd.randint(1, 10),
+            'image_name': i % 10 + 1,
+            'sku': f"SKU-{i}"
+        }
+        for field in COLUMN_MAPPING:
+            if field.startswith('for_'):
+                row[field] = rnd.choice(["Да", "да", None])
+        sheet.append([row[field] for field in COLUMN_MAPPING])
+
+    workbook.save(path)
+
+
+async def main():
+    path = os.path.join(WORK_DIR, 'catalog.xlsx')
+
+    started = time.perf_counter()
+    generate_workbook(path, ROWS)
+    print(f"Сгенерирован файл на {ROWS} строк за {time.perf_counter() - started:.1f} с "
+          f"({os.path.getsize(path) / 1024 / 1024:.1f} МБ)")
+
+    await init_db()
+    stats = await process_excel_file(path)
+    print(
+        f"Импорт: {stats['rows']} строк за {stats['seconds']:.1f} с "
+        f"(разбор {stats['parse_seconds']:.1f} с), {stats['rows_per_sec']:.0f} строк/с, "
+        f"пик памяти обработчика {stats['peak_memory_mb']:.1f} МБ ({stats['peak_memory_scope']})"
+    )
+
+    shutdown_import_workers()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+# Микробенчмарк движков подбора: построчный GiftFinder против VectorGiftFinder.
+# Запуск из корня проекта: python -m benchmarks.matcher_benchmark
+import random
+import time
+from types import SimpleNamespace
+
+from services.catalog_index import CatalogIndex, RECIPIENT_FIELDS
+from services.gift_columns import GiftColumns
+from services.gift_finder import GiftFinder, VectorGiftFinder
+
+CATALOG_SIZES = (1_000, 10_000, 50_000)
+SELECTIONS = 100
+CATEGORIES = [f"Категория {i}" for i in range(40)]
+AGE_RANGES = ["0-12", "12-18", "18-99", "25-55", "35-99", "60+"]
+
+
+def generate_gifts(count: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    gifts = []
+    for i in range(1, count + 1):
+        gift = SimpleNamespace(
+            id=i,
+            category=rnd.choice(CATEGORIES),
+            age_range=rnd.choice(AGE_RANGES),
+            price=float(rnd.randint(500, 50000)),
+            marketplace_available=rnd.random() < 0.5,
+            trend_score=rnd.randint(1, 10),
+            consumable=rnd.random() < 0.3,
+            creativity_score=rnd.randint(1, 10),
+            is_active=True
+        )
+        for field in RECIPIENT_FIELDS.values():
+            setattr(gift, field, rnd.random() < 0.4)
+        gifts.append(gift)
+    return gifts
+
+
+def generate_criteria(count: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [
+        {
+            'recipient': rnd.choice(list(RECIPIENT_FIELDS)),
+            'age': rnd.randint(5, 80),
+            'budget': rnd.choice([0, 1000, 3000, 10000]),
+            'marketplace': rnd.random() < 0.5,
+            'consumable': rnd.random() < 0.5,
+            'trend_score': rnd.randint(1, 10)
+        }
+        for _ in range(count)
+    ]
+
+
+def measure(finder_class, catalog, criteria_list):
+    started = time.perf_counter()
+    results = [finder_class(criteria).rank(catalog) for criteria in criteria_list]
+    return (time.perf_counter() - started) / len(criteria_list), results
+
+
+def as_ids(result):
+    return [(category, [gift.id for gift in gifts]) for category, gifts in result.items()]
+
+
+def main():
+    criteria_list = generate_criteria(SELECTIONS)
+
+    for size in CATALOG_SIZES:
+        gifts = generate_gifts(size)
+
+        # Колонки строятся вместе с индексом при перезагрузке каталога
+        started = time.perf_counter()
+        columns = GiftColumns(gifts)
+        columns_time = time.perf_counter() - started
+        catalog = CatalogIndex(gifts, columns)
+
+        python_time, python_results = measure(GiftFinder, catalog, criteria_list)
+        vector_time, vector_results = measure(VectorGiftFinder, catalog, criteria_list)
+        same = all(as_ids(a) == as_ids(b) for a, b in zip(python_results, vector_results))
+
+        print(
+            f"{size:>6} подарков: python {python_time * 1000:7.2f} мс, "
+            f"numpy {vector_time * 1000:6.2f} мс (x{python_time / vector_time:.1f}), "
+            f"колонки {columns_time * 1000:.0f} мс, результаты совпадают: {same}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Поиск по каталогу из 100 тысяч подарков: FTS5 (bm25) против LIKE '%...%'.
+# Запуск из корня проекта: python -m benchmarks.search_benchmark
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix='gift_bot_bench_')
+# База для бенчмарка подменяется до импорта модулей проекта
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(WORK_DIR, 'search.db')}"
+
+from sqlalchemy import insert
+
+from database.database import dispose_engines, engine, init_db
+from database.models import FTS_COLUMNS, Gift
+from services.catalog_index import reload_catalog_index
+from services.catalog_search import _search_ids_like, _words, search_gifts
+
+CATALOG_SIZE = 100_000
+REPEATS = 50
+CATEGORIES = ["Гаджеты", "Парфюмерия и ароматы", "Эстетичные решения", "Впечатления", "Для дома", "Спорт"]
+# Слова из запросов встречаются с частотой обычных слов каталога, остальной словарь -
+# синтетические слова с распределением Ципфа, как в текстах на естественном языке
+WORDS = (
+    "аромадиффузор свеча массаж набор плед кружка часы наушники колонка книга сертификат "
+    "керамика уход кожа чай кофе путешествие рюкзак кошелек зонт лампа "
+    "игра пазл конструктор велосипед коврик йога термос ежедневник ручка духи ёлка"
+).split()
+VOCABULARY_SIZE = 20_000
+QUERIES = ["массаж", "аромат свеча", "наушн", "ёлка", "кофе термос", "сертификат впечатл"]
+
+
+def make_vocabulary(rnd: random.Random) -> list:
+    letters = "абвгдежзиклмнопрстуфхцчшэюя"
+    vocabulary = [
+        ''.join(rnd.choice(letters) for _ in range(rnd.randint(4, 10))) for _ in range(VOCABULARY_SIZE)
+    ]
+    # Слова запросов - на местах от 50-го до 500-го по частоте
+    for word in WORDS:
+        vocabulary[rnd.randint(50, 500)] = word
+    return vocabulary
+
+
+def generate_gifts(count: int, seed: int = 42):
+    rnd = random.Random(seed)
+    vocabulary = make_vocabulary(rnd)
+    weights = [1 / rank ** 1.1 for rank in range(1, len(vocabulary) + 1)]
+    for i in range(count):
+        name = rnd.choices(vocabulary, weights, k=3)
+        yield {
+            'name': f"{' '.join(name).capitalize()} {i}",
+            'description': ' '.join(rnd.choices(vocabulary, weights, k=30)),
+            'category': rnd.choice(CATEGORIES),
+            'subcategory': rnd.choice(CATEGORIES),
+            'link': f"https://example.com/{i}",
+            'price': float(rnd.randint(500, 50000)),
+        }
+
+
+async def seed():
+    # init_db создаёт таблицы и миграцией - индекс gifts_fts с триггерами,
+    # так что вставка заполняет индекс так же, как импорт из Excel
+    await init_db()
+    rows = list(generate_gifts(CATALOG_SIZE))
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        for start in range(0, len(rows), 5000):
+            await conn.execute(insert(Gift), rows[start:start + 5000])
+    print(f"Вставка {CATALOG_SIZE} подарков с индексацией: {time.perf_counter() - started:.1f} с")
+
+
+async def measure(search) -> list:
+    timings = []
+    for _ in range(REPEATS):
+        for query in QUERIES:
+            started = time.perf_counter()
+            await search(query)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings
+
+
+def report(name: str, timings: list):
+    print(
+        f"{name:>6}: медиана {statistics.median(timings) * 1000:.2f} мс, "
+        f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} мс"
+    )
+
+
+async def main():
+    await seed()
+    await reload_catalog_index()
+
+    for query in QUERIES:
+        found = await search_gifts(query, limit=3)
+        print(f"  «{query}»: {', '.join(gift.name for gift in found) or '-'}")
+
+    report('FTS5', await measure(lambda query: search_gifts(query, limit=10)))
+    report('LIKE', await measure(lambda query: _search_ids_like(_words(query), FTS_COLUMNS, 10)))
+    await dispose_engines()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
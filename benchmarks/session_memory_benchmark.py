@@ -0,0 +1,122 @@
+# Память, которую занимают результаты подборок в user_data: объекты Gift из ORM
+# (как раньше) против кортежей id, которые разрешаются через общий индекс каталога.
+# Запуск из корня проекта: python -m benchmarks.session_memory_benchmark [число сессий]
+import gc
+import random
+import sys
+import tracemalloc
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from database.models import Base, Gift
+from services.catalog_index import CatalogIndex, GiftView
+
+SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+# Для ORM-варианта замеряем часть сессий и пересчитываем на SESSIONS:
+# 100 тысяч сессий с объектами ORM не помещаются в память тестовой машины
+ORM_SAMPLE = min(SESSIONS, 2_000)
+CATALOG_SIZE = 2_000
+CATEGORIES = [f"Категория {i}" for i in range(40)]
+CATEGORIES_PER_SESSION = 10
+GIFTS_PER_CATEGORY = 2
+
+
+def seed(engine):
+    rnd = random.Random(42)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Gift), [
+            {
+                'name': f"Подарок {i}",
+                'description': "Описание подарка " * 20,
+                'category': rnd.choice(CATEGORIES),
+                'link': f"https://example.com/{i}",
+                'price': float(rnd.randint(500, 50000)),
+                'image_name': f"{i}.jpg",
+                'age_range': "18-99",
+            }
+            for i in range(CATALOG_SIZE)
+        ])
+
+
+def random_selection(rnd: random.Random):
+    gift_ids = rnd.sample(range(1, CATALOG_SIZE + 1), CATEGORIES_PER_SESSION * GIFTS_PER_CATEGORY)
+    return {
+        f"Категория {i}": gift_ids[i * GIFTS_PER_CATEGORY:(i + 1) * GIFTS_PER_CATEGORY]
+        for i in range(CATEGORIES_PER_SESSION)
+    }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+def orm_sessions(engine, count: int):
+    # Как прежний view_historical_gifts: у каждой сессии свои объекты Gift,
+    # отсоединённые от закрытой сессии SQLAlchemy
+    rnd = random.Random(1)
+    user_data = {}
+    for user_id in range(count):
+        with Session(engine) as session:
+            current_gifts = {}
+            for category, gift_ids in random_selection(rnd).items():
+                current_gifts[category] = session.execute(
+                    select(Gift).where(Gift.id.in_(gift_ids))
+                ).scalars().all()
+        user_data[user_id] = {'current_gifts': current_gifts, 'current_category_index': 0}
+    return user_data
+
+
+def id_sessions(count: int):
+    rnd = random.Random(1)
+    return {
+        user_id: {
+            'current_gifts': {category: tuple(ids) for category, ids in random_selection(rnd).items()},
+            'current_category_index': 0
+        }
+        for user_id in range(count)
+    }
+
+
+def load_catalog(engine):
+    columns = [Gift.__table__.c[field] for field in GiftView._fields]
+    with engine.connect() as conn:
+        return CatalogIndex([GiftView._make(row) for row in conn.execute(select(*columns))])
+
+
+def main():
+    engine = create_engine('sqlite://')
+    seed(engine)
+
+    catalog, catalog_bytes = measure(lambda: load_catalog(engine))
+    _, orm_bytes = measure(lambda: orm_sessions(engine, ORM_SAMPLE))
+    user_data, id_bytes = measure(lambda: id_sessions(SESSIONS))
+
+    # Проверяем, что id действительно разрешаются через каталог
+    first = user_data[0]['current_gifts']
+    assert all(len(catalog.get_many(ids)) == len(ids) for ids in first.values())
+
+    orm_per_session = orm_bytes / ORM_SAMPLE
+    id_per_session = id_bytes / SESSIONS
+    orm_total = orm_per_session * SESSIONS
+    id_total = id_bytes + catalog_bytes
+
+    print(f"{SESSIONS} сессий, по {CATEGORIES_PER_SESSION * GIFTS_PER_CATEGORY} подарков в каждой")
+    print(f"  объекты ORM: {orm_per_session / 1024:.1f} КБ на сессию, "
+          f"~{orm_total / 2 ** 20:.0f} МБ всего (замер на {ORM_SAMPLE} сессиях)")
+    print(f"  кортежи id:  {id_per_session / 1024:.2f} КБ на сессию, "
+          f"{id_bytes / 2 ** 20:.0f} МБ + общий каталог {catalog_bytes / 2 ** 20:.1f} МБ")
+    print(f"  экономия: в {orm_per_session / id_per_session:.0f} раз на сессию, "
+          f"в {orm_total / id_total:.0f} раз с учётом каталога")
+
+
+if __name__ == '__main__':
+    main()
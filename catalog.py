@@ -2,6 +2,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler
 from database.database import async_session
 from database.models import Gift
+from sqlalchemy import select
 
 
 async def show_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
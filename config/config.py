@@ -6,20 +6,69 @@ load_dotenv()
 
 # Основные настройки бота
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS', '').split(',')))
+ADMIN_IDS = [int(admin_id) for admin_id in os.getenv('ADMIN_IDS', '').split(',') if admin_id.strip()]
+
+# Получение обновлений: 'polling' или 'webhook' (ASGI-приложение под uvicorn)
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+# Публичный адрес, на который Telegram шлёт обновления (без пути); если пуст,
+# вебхук не устанавливается (например, его ставит другой экземпляр)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Обязателен в режиме вебхука: Telegram присылает его в заголовке каждого обновления
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or None
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+# Сколько обновлений обрабатывается одновременно (обновления одного чата - всегда по очереди);
+# 1 - строго последовательная обработка, как раньше
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '32'))
+# Сохранение user_data и состояний диалогов: период записи (с) и срок хранения
+# данных неактивных пользователей (дни)
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '30'))
+PERSISTENCE_TTL_DAYS = int(os.getenv('PERSISTENCE_TTL_DAYS', '7'))
 
 # Настройки базы данных
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite+aiosqlite:///gift_bot.db')
 
 # Настройки приложения
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
+# Профиль подключения к базе: 'production' (WAL, пул, без логов SQL) или 'debug' (echo)
+DB_PROFILE = os.getenv('DB_PROFILE', 'production')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
 MAX_GIFTS_PER_CATEGORY = 2
 ITEMS_PER_PAGE = 5
+# Движок подбора подарков: 'numpy' (векторный) или 'python'
+MATCHER_BACKEND = os.getenv('MATCHER_BACKEND', 'numpy')
+# Импорт каталога: число процессов для разбора Excel и период отчёта о прогрессе (с)
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', '1'))
+IMPORT_PROGRESS_INTERVAL = float(os.getenv('IMPORT_PROGRESS_INTERVAL', '2'))
+# Число процессов для подготовки изображений (по умолчанию - по числу ядер)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '0')) or os.cpu_count() or 1
+# Картинка страницы категории: 'collage' (все подарки одним фото) или 'first' (фото первого подарка)
+CATEGORY_PRESENTATION = os.getenv('CATEGORY_PRESENTATION', 'collage')
+# Сколько коллажей хранить (в памяти и на диске); давно не показанные удаляются
+COLLAGE_CACHE_SIZE = int(os.getenv('COLLAGE_CACHE_SIZE', '500'))
+# Сколько file_id загруженных в Telegram изображений хранить (в памяти и в базе)
+MEDIA_CACHE_SIZE = int(os.getenv('MEDIA_CACHE_SIZE', '5000'))
+# Как часто процесс бота сверяет версию каталога в базе (с): каталог может
+# загрузить другой процесс
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', '5'))
+# Время жизни кэша списка администраторов (с)
+ADMIN_CACHE_TTL = float(os.getenv('ADMIN_CACHE_TTL', '300'))
+# Кэш профилей пользователей: максимум записей и период записи времени активности (с)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+LAST_SEEN_FLUSH_INTERVAL = float(os.getenv('LAST_SEEN_FLUSH_INTERVAL', '60'))
+# Сколько последних открытых подборок из истории держать в памяти
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', '1000'))
 
 # Пути к файлам
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
 IMAGES_DIR = os.path.join(ASSETS_DIR, 'images')
+# Подготовленные для Telegram копии изображений
+RENDITIONS_DIR = os.path.join(ASSETS_DIR, 'renditions')
 
 # Создаем директории, если они не существуют
 os.makedirs(IMAGES_DIR, exist_ok=True)
+os.makedirs(RENDITIONS_DIR, exist_ok=True)
@@ -1,2 +1,2 @@
-from .models import User, Gift, Selection, SelectionGift
+from .models import User, Gift, Selection, SelectionGift, MediaFile, ImageRendition, BotState
 from .database import init_db, get_session
\ No newline at end of file
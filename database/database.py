@@ -1,13 +1,104 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, func
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy import select, func, event, insert
 from .models import Base, User, Gift, Selection, SelectionGift
-from config.config import DATABASE_URL
+from .migrations import lock_migrations, run_migrations
+from .snapshot import pack_snapshot
+from config.config import DATABASE_URL, DB_PROFILE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT
 import contextlib
+import json
+import os
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# PRAGMA для каждого нового соединения с SQLite
+PRODUCTION_PRAGMAS = {
+    # Читатели не блокируют писателя и наоборот
+    'journal_mode': 'WAL',
+    # В режиме WAL fsync нужен только при контрольной точке
+    'synchronous': 'NORMAL',
+    # Ждём освобождения блокировки записи вместо ошибки "database is locked"
+    'busy_timeout': 5000,
+    'cache_size': -64000,  # 64 МБ
+    'mmap_size': 268435456,  # 256 МБ
+    'temp_store': 'MEMORY'
+}
+
+DB_PROFILES = {
+    'production': {'echo': False, 'pragmas': PRODUCTION_PRAGMAS, 'pooled': True},
+    # Прежнее поведение: каждое SQL-выражение в логе, настройки SQLite по умолчанию
+    'debug': {'echo': True, 'pragmas': {}, 'pooled': False}
+}
+
+
+def _is_sqlite_file(url: URL) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def _read_only_url(url: URL) -> URL:
+    return url.set(
+        database=f"file:{os.path.abspath(url.database)}",
+        query={**url.query, 'mode': 'ro', 'uri': 'true'}
+    )
+
+
+def _pragma_listener(pragmas: dict):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_pragmas
+
+
+def _json_dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def make_engine(database_url: str, profile: str = DB_PROFILE, read_only: bool = False) -> AsyncEngine:
+    settings = DB_PROFILES[profile]
+    url = make_url(database_url)
+    is_sqlite = url.get_backend_name() == 'sqlite'
+
+    # JSON-колонки (снимки подборок) пишутся без \uXXXX: кириллица вдвое компактнее
+    options = {'echo': settings['echo'], 'json_serializer': _json_dumps}
+    # Сетевой базе (PostgreSQL) пул нужен в любом профиле
+    if settings['pooled'] or not is_sqlite:
+        options.update(
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT
+        )
+    if not is_sqlite:
+        # Соединения, разорванные сервером или балансировщиком, заменяются до выдачи
+        options['pool_pre_ping'] = True
+
+    pragmas = dict(settings['pragmas']) if is_sqlite else {}
+    if read_only and is_sqlite:
+        url = _read_only_url(url)
+        # Режим журнала хранится в файле базы и задаётся соединением на запись
+        pragmas.pop('journal_mode', None)
+
+    new_engine = create_async_engine(url, **options)
+    if pragmas:
+        event.listen(new_engine.sync_engine, 'connect', _pragma_listener(pragmas))
+    if read_only and url.get_backend_name() == 'postgresql':
+        new_engine = new_engine.execution_options(postgresql_readonly=True)
+    return new_engine
+
+
+engine = make_engine(DATABASE_URL)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Отдельный путь только для чтения: каталог и история не ждут соединений,
+# занятых записью. Для базы в памяти используется основной движок
+if _is_sqlite_file(make_url(DATABASE_URL)) or make_url(DATABASE_URL).get_backend_name() == 'postgresql':
+    read_engine = make_engine(DATABASE_URL, read_only=True)
+else:
+    read_engine = engine
+read_session = sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
 @contextlib.asynccontextmanager
 async def get_session():
     async with async_session() as session:
@@ -20,9 +111,24 @@ async def get_session():
 
 async def init_db():
     async with engine.begin() as conn:
+        await conn.run_sync(lock_migrations)
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+
+
+async def dispose_engines():
+    if read_engine is not engine:
+        await read_engine.dispose()
+    await engine.dispose()
 
 async def get_or_create_user(telegram_id: int, phone: str = None, name: str = None):
+    # Импорт здесь: services.user_cache сам зависит от этого модуля
+    from services import user_cache
+
+    cached = await user_cache.get_user(telegram_id)
+    if cached and (not phone or cached.phone) and (not name or cached.name):
+        return cached
+
     async with get_session() as session:
         result = await session.execute(
             select(User).where(User.telegram_id == telegram_id)
@@ -38,28 +144,39 @@ async def get_or_create_user(telegram_id: int, phone: str = None, name: str = No
             if name and not user.name:
                 user.name = name
 
-        return user
+        await session.commit()
+        return user_cache.remember_user(user)
 
-async def save_selection(user_id: int, recipient_type: str, selected_gifts: dict):
+async def save_selection(user_id: int, recipient_type: str, selected_gifts: dict, **criteria) -> int:
+    # criteria - остальные параметры подбора (age, budget, ...). История читает снимок
+    # подарков из самой подборки; SelectionGift остаётся для аналитики
     async with get_session() as session:
-        selection = Selection(user_id=user_id, recipient_type=recipient_type)
+        selection = Selection(
+            user_id=user_id,
+            recipient_type=recipient_type,
+            gifts_snapshot=pack_snapshot(selected_gifts),
+            **criteria
+        )
         session.add(selection)
         await session.flush()
 
-        for category, gifts in selected_gifts.items():
-            for gift in gifts:
-                selection_gift = SelectionGift(
-                    selection_id=selection.id,
-                    gift_id=gift.id,
-                    category=category
-                )
-                session.add(selection_gift)
+        links = [
+            {'selection_id': selection.id, 'gift_id': gift.id, 'category': category}
+            for category, gifts in selected_gifts.items()
+            for gift in gifts
+        ]
+        # Пустой список insert() понял бы как одну строку со значениями по умолчанию
+        if links:
+            await session.execute(insert(SelectionGift), links)
+        return selection.id
 
 async def get_gift_stats():
     async with get_session() as session:
-        total_gifts = await session.scalar(select(func.count(Gift.id)))
+        total_gifts = await session.scalar(
+            select(func.count(Gift.id)).where(Gift.is_active)
+        )
         total_categories = await session.scalar(
-            select(func.count(func.distinct(Gift.category)))
+            select(func.count(func.distinct(Gift.category))).where(Gift.is_active)
         )
         return {
             'total_gifts': total_gifts,
@@ -0,0 +1,20 @@
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class day(FunctionElement):
+    # Дата без времени: date(x) в SQLite, CAST(x AS DATE) в остальных СУБД
+    type = Date()
+    name = 'day'
+    inherit_cache = True
+
+
+@compiles(day)
+def _compile_day(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS DATE)"
+
+
+@compiles(day, 'sqlite')
+def _compile_day_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)})"
@@ -0,0 +1,189 @@
+import logging
+import time
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, func, inspect, text, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+from .models import FTS_COLUMNS, Base, Gift, Selection, SelectionGift
+from .snapshot import pack_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки PostgreSQL, под которой создаётся и мигрирует схема
+MIGRATION_LOCK_ID = 0x67696674
+# Сколько процесс ждёт, пока другой закончит миграции SQLite (с)
+MIGRATION_LOCK_TIMEOUT = 300
+
+
+# Версии схемы, применённые к базе
+schema_migrations = Table(
+    'schema_migrations',
+    MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, default=datetime.utcnow)
+)
+
+
+def _add_column(conn: Connection, table_name: str, column_name: str):
+    # Колонка берётся из модели; в новой базе её уже создал create_all
+    if column_name in {column['name'] for column in inspect(conn).get_columns(table_name)}:
+        return
+
+    column = Base.metadata.tables[table_name].columns[column_name]
+    ddl = f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg.compile(dialect=conn.dialect)
+        ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def _create_indexes(conn: Connection, table_name: str):
+    for index in Base.metadata.tables[table_name].indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _gift_sku_and_is_active(conn: Connection):
+    _add_column(conn, 'gifts', 'sku')
+    _add_column(conn, 'gifts', 'is_active')
+
+
+def _user_last_seen(conn: Connection):
+    _add_column(conn, 'users', 'last_seen')
+
+
+def _hot_query_indexes(conn: Connection):
+    for table_name in ('users', 'gifts', 'selections', 'selection_gifts'):
+        _create_indexes(conn, table_name)
+
+
+def _selection_gifts_snapshot(conn: Connection):
+    _add_column(conn, 'selections', 'gifts_snapshot')
+
+    # Снимки старых подборок собираются из того, что осталось в каталоге
+    category = func.coalesce(SelectionGift.category, Gift.category, "Без категории")
+    rows = conn.execute(
+        select(
+            SelectionGift.selection_id, category.label('category'),
+            Gift.id, Gift.name, Gift.price, Gift.link, Gift.image_name, Gift.description
+        )
+        .join(Gift, Gift.id == SelectionGift.gift_id)
+        .join(Selection, Selection.id == SelectionGift.selection_id)
+        .where(Selection.gifts_snapshot.is_(None))
+        .order_by(SelectionGift.selection_id, category, Gift.id)
+    ).all()
+
+    selections = {}
+    for row in rows:
+        selections.setdefault(row.selection_id, {}).setdefault(row.category, []).append(row)
+    if selections:
+        conn.execute(
+            update(Selection.__table__)
+            .where(Selection.__table__.c.id == bindparam('sid'))
+            .values(gifts_snapshot=bindparam('snapshot')),
+            [
+                {'sid': selection_id, 'snapshot': pack_snapshot(gifts_by_category)}
+                for selection_id, gifts_by_category in selections.items()
+            ]
+        )
+        logger.info(f"Сохранены снимки подарков для {len(selections)} подборок")
+
+
+# Полнотекстовый индекс каталога (только SQLite, FTS5). Таблица с внешним содержимым:
+# тексты хранятся только в gifts, триггеры поддерживают индекс при любом импорте.
+# Ё приводится к Е, иначе "елка" не находит "Ёлка"
+def _fts_values(prefix: str) -> str:
+    return ', '.join(
+        f"replace(replace(coalesce({prefix}{column}, ''), 'ё', 'е'), 'Ё', 'Е')" for column in FTS_COLUMNS
+    )
+
+
+def _gifts_fts(conn: Connection):
+    if conn.dialect.name != 'sqlite':
+        # PostgreSQL ищет через ILIKE (services.catalog_search)
+        return
+
+    columns = ', '.join(FTS_COLUMNS)
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS gifts_fts USING fts5("
+            f"{columns}, content='gifts', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+    except OperationalError as e:
+        logger.warning(f"FTS5 недоступен, поиск по каталогу будет медленным: {e}")
+        return
+
+    # Скрытые подарки в поиске не нужны: если их нет в индексе, поиску не приходится
+    # соединять каждое совпадение с gifts ради проверки is_active
+    insert_new = (
+        f"INSERT INTO gifts_fts(rowid, {columns}) SELECT new.id, {_fts_values('new.')} WHERE new.is_active;"
+    )
+    delete_old = (
+        f"INSERT INTO gifts_fts(gifts_fts, rowid, {columns}) "
+        f"SELECT 'delete', old.id, {_fts_values('old.')} WHERE old.is_active;"
+    )
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS gifts_fts_insert AFTER INSERT ON gifts BEGIN {insert_new} END"))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS gifts_fts_delete AFTER DELETE ON gifts BEGIN {delete_old} END"))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS gifts_fts_update AFTER UPDATE OF {columns}, is_active ON gifts "
+        f"BEGIN {delete_old} {insert_new} END"
+    ))
+    conn.execute(text(
+        f"INSERT INTO gifts_fts(rowid, {columns}) SELECT id, {_fts_values('')} FROM gifts WHERE is_active"
+    ))
+
+
+def _gifts_active_id_index(conn: Connection):
+    _create_indexes(conn, 'gifts')
+
+
+# (версия, имя, функция). Новые миграции только добавляются в конец
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, 'gift_sku_and_is_active', _gift_sku_and_is_active),
+    (2, 'user_last_seen', _user_last_seen),
+    (3, 'hot_query_indexes', _hot_query_indexes),
+    (4, 'selection_gifts_snapshot', _selection_gifts_snapshot),
+    (5, 'gifts_fts', _gifts_fts),
+    (6, 'gifts_active_id_index', _gifts_active_id_index),
+]
+
+
+def lock_migrations(conn: Connection):
+    # Процессы бота стартуют одновременно: схему создаёт и мигрирует один из них,
+    # остальные ждут конца его транзакции и находят миграции уже применёнными.
+    # Вызывается первым выражением транзакции
+    if conn.dialect.name == 'postgresql':
+        # Снимается вместе с завершением транзакции
+        conn.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK_ID)))
+    elif conn.dialect.name == 'sqlite':
+        # BEGIN IMMEDIATE сразу берёт блокировку записи; каждая попытка ждёт busy_timeout
+        deadline = time.monotonic() + MIGRATION_LOCK_TIMEOUT
+        while True:
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                return
+            except OperationalError as e:
+                if 'locked' not in str(e) or time.monotonic() >= deadline:
+                    raise
+
+
+def run_migrations(conn: Connection) -> List[str]:
+    schema_migrations.create(conn, checkfirst=True)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    done = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+
+        logger.info(f"Применяю миграцию {version}: {name}")
+        migrate(conn)
+        conn.execute(schema_migrations.insert().values(version=version, name=name))
+        done.append(name)
+    return done
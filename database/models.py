@@ -1,25 +1,33 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, BigInteger
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, BigInteger, Index, JSON
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.sql import expression
 from datetime import datetime
 
 Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
-    telegram_id = Column(BigInteger, primary_key=True)
+    telegram_id = Column(BigInteger, primary_key=True, autoincrement=False)
     name = Column(String)
     username = Column(String)
     phone = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime)
     is_premium = Column(Boolean, default=False)
     is_admin = Column(Boolean, default=False)
 
     selections = relationship("Selection", back_populates="user")
 
+    __table_args__ = (
+        # Новые пользователи за день (уведомления)
+        Index('ix_users_created_at', 'created_at'),
+    )
+
 class Gift(Base):
     __tablename__ = 'gifts'
 
     id = Column(Integer, primary_key=True)
+    sku = Column(String(100))
     name = Column(String(200), nullable=False)
     description = Column(Text)
     category = Column(String(100), nullable=False)
@@ -45,6 +53,9 @@ class Gift(Base):
 
     image_name = Column(String(200))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Подарки, пропавшие из загруженной таблицы, скрываются, а не удаляются,
+    # чтобы не ломать ссылки из истории подборок
+    is_active = Column(Boolean, default=True, server_default=expression.true(), nullable=False)
 
     selection_gifts = relationship("SelectionGift", back_populates="gift")
     selections = relationship(
@@ -55,6 +66,18 @@ class Gift(Base):
     )
     selection_gifts = relationship("SelectionGift", back_populates="gift")
 
+    # Подбор идёт по индексу каталога в памяти (services.catalog_index), поэтому
+    # индексы на for_*, trend_score и т.п. только замедлили бы импорт
+    __table_args__ = (
+        # Активный каталог и группировка по категориям (аналитика, админка)
+        Index('ix_gifts_active_category', 'is_active', 'category'),
+        # Постраничный просмотр каталога в админке (keyset по id)
+        Index('ix_gifts_active_id', 'is_active', 'id'),
+    )
+
+# Колонки gifts в полнотекстовом индексе gifts_fts (миграция 5), в порядке колонок индекса
+FTS_COLUMNS = ('name', 'description', 'category', 'subcategory')
+
 class Selection(Base):
     __tablename__ = 'selections'
 
@@ -67,6 +90,9 @@ class Selection(Base):
     trend_score = Column(Integer)
     consumable = Column(Boolean)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Подарки подборки на момент сохранения (database.snapshot): история читается
+    # из одной строки и не зависит от последующих загрузок каталога
+    gifts_snapshot = Column(JSON)
 
     user = relationship("User", back_populates="selections")
     selection_gifts = relationship("SelectionGift", back_populates="selection")
@@ -78,6 +104,13 @@ class Selection(Base):
     )
     selection_gifts = relationship("SelectionGift", back_populates="selection")
 
+    __table_args__ = (
+        # История пользователя: фильтр по user_id и сортировка по (created_at, id)
+        Index('ix_selections_user_created', 'user_id', 'created_at', 'id'),
+        # Активность по дням (аналитика, уведомления)
+        Index('ix_selections_created_at', 'created_at'),
+    )
+
 class SelectionGift(Base):
     __tablename__ = 'selection_gifts'
 
@@ -95,3 +128,52 @@ class SelectionGift(Base):
         back_populates="selection_gifts",
         overlaps="gifts,selections"
     )
+
+    __table_args__ = (
+        # Первичный ключ начинается с selection_id; поиск подборок по подарку
+        Index('ix_selection_gifts_gift', 'gift_id'),
+    )
+
+
+class MediaFile(Base):
+    __tablename__ = 'media_files'
+
+    # file_id, выданный Telegram при первой загрузке файла с таким содержимым
+    image_name = Column(String(200), primary_key=True)
+    content_hash = Column(String(64), primary_key=True)
+    file_id = Column(String(200), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class BotState(Base):
+    __tablename__ = 'bot_state'
+
+    # Данные python-telegram-bot между перезапусками: user_data и состояния диалогов
+    kind = Column(String(100), primary_key=True)
+    key = Column(String(200), primary_key=True)
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class Meta(Base):
+    __tablename__ = 'meta'
+
+    # Счётчики, общие для всех процессов бота (например, версия каталога).
+    # В отличие от bot_state, записи не устаревают
+    key = Column(String(100), primary_key=True)
+    value = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ImageRendition(Base):
+    __tablename__ = 'image_renditions'
+
+    image_name = Column(String(200), primary_key=True)
+    rendition = Column(String(20), primary_key=True)
+    source_hash = Column(String(64), nullable=False)
+    path = Column(String(500), nullable=False)
+    format = Column(String(10))
+    width = Column(Integer)
+    height = Column(Integer)
+    size_bytes = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,42 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+# Описание в карточке подарка всё равно обрезается до этой длины
+DESCRIPTION_LIMIT = 700
+
+
+class GiftSnapshot(NamedTuple):
+    # Подарок в том виде, в каком он попал в подборку; не зависит от перезагрузок каталога
+    category: str
+    id: int
+    name: str
+    price: float
+    link: Optional[str]
+    image_name: Optional[str]
+    description: Optional[str]
+
+
+def pack_snapshot(gifts_by_category: Dict[str, list]) -> List[list]:
+    # Компактная форма для Selection.gifts_snapshot: список строк в порядке полей GiftSnapshot,
+    # подарки идут по категориям в порядке показа
+    return [
+        [
+            category,
+            gift.id,
+            gift.name,
+            gift.price,
+            gift.link,
+            gift.image_name,
+            (gift.description or '')[:DESCRIPTION_LIMIT] or None
+        ]
+        for category, gifts in gifts_by_category.items()
+        for gift in gifts
+    ]
+
+
+def unpack_snapshot(rows: Optional[List[list]]) -> Dict[str, Tuple[GiftSnapshot, ...]]:
+    gifts_by_category: Dict[str, List[GiftSnapshot]] = {}
+    for row in rows or ():
+        gift = GiftSnapshot._make(row)
+        gifts_by_category.setdefault(gift.category, []).append(gift)
+    return {category: tuple(gifts) for category, gifts in gifts_by_category.items()}
@@ -1,21 +1,25 @@
 from telegram import Update
 from telegram.ext import ContextTypes, CallbackQueryHandler, MessageHandler, filters, CommandHandler
 from database.database import async_session
-from database.models import User, Gift
+from database.models import User
 from keyboards.inline import get_admin_menu, get_main_menu
+from services import admin_cache, catalog_browser, user_cache
+from services.catalog_index import get_catalog_index
+from services.catalog_search import search_gifts
+from services.update_processor import ChatOrderedUpdateProcessor
 from services.excel_parser import process_excel_file
+from services.image_registry import resolve_image
+from services.media_cache import reply_photo
 import os
 import logging
 from telegram.error import BadRequest
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from sqlalchemy import select, func
+from sqlalchemy import select
 
 
 async def check_admin(user_id: int) -> bool:
-    async with async_session() as session:
-        user = await session.get(User, user_id)
-        return user and user.is_admin
+    return await admin_cache.is_admin(user_id)
 
 
 async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -49,61 +53,60 @@ async def view_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
+    text = (
+        f"📋 Текущий каталог: {catalog_browser.total_active()} подарков\n"
+        "🔎 Поиск по названию или категории: /find <запрос>"
+    )
+    reply_markup = await get_catalog_keyboard(context)
+
     # If there's no message to edit (was deleted), send a new one
     if not query.message:
-        message = await context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="📋 Текущий каталог:",
-            reply_markup=await get_catalog_keyboard(context)
+            text=text,
+            reply_markup=reply_markup
         )
         return
 
     try:
-        await query.edit_message_text(
-            "📋 Текущий каталог:",
-            reply_markup=await get_catalog_keyboard(context)
-        )
+        await query.edit_message_text(text, reply_markup=reply_markup)
     except BadRequest:
         # If we can't edit the message, send a new one
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="📋 Текущий каталог:",
-            reply_markup=await get_catalog_keyboard(context)
+            text=text,
+            reply_markup=reply_markup
         )
 
 
-async def get_catalog_keyboard(context):
-    page = context.user_data.get('catalog_page', 0)
-    items_per_page = 6
-
-    async with async_session() as session:
-        total_gifts = await session.execute(select(func.count(Gift.id)))
-        total_count = total_gifts.scalar()
-
-        gifts = await session.execute(
-            select(Gift)
-            .offset(page * items_per_page)
-            .limit(items_per_page)
-        )
-        gifts = gifts.scalars().all()
+async def get_catalog_keyboard(context, before_id: int = None):
+    # Позиция в каталоге - id первого подарка страницы: "Назад к каталогу"
+    # возвращает на ту же страницу
+    first_id = context.user_data.get('catalog_first_id', 0)
+    if before_id is not None:
+        page = await catalog_browser.load_page(before_id=before_id)
+    else:
+        page = await catalog_browser.load_page(after_id=max(0, first_id - 1))
+    if page.items:
+        context.user_data['catalog_first_id'] = page.items[0].id
 
-        keyboard = []
-        for gift in gifts:
-            keyboard.append([InlineKeyboardButton(f"{gift.name} - {gift.price}₽",
-                                                  callback_data=f"view_gift_{gift.id}")])
+    keyboard = []
+    for gift in page.items:
+        keyboard.append([InlineKeyboardButton(f"{gift.name} - {gift.price}₽",
+                                              callback_data=f"view_gift_{gift.id}")])
 
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data="prev_catalog_page"))
-        if (page + 1) * items_per_page < total_count:
-            nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data="next_catalog_page"))
+    nav_buttons = []
+    if page.has_prev:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"prev_catalog_page_{page.items[0].id}"))
+    if page.has_next:
+        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"next_catalog_page_{page.items[-1].id}"))
 
-        if nav_buttons:
-            keyboard.append(nav_buttons)
+    if nav_buttons:
+        keyboard.append(nav_buttons)
 
-        keyboard.append([InlineKeyboardButton("↩️ В админ-меню", callback_data="admin_menu")])
+    keyboard.append([InlineKeyboardButton("↩️ В админ-меню", callback_data="admin_menu")])
 
-        return InlineKeyboardMarkup(keyboard)
+    return InlineKeyboardMarkup(keyboard)
 
 
 async def view_gift_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -112,55 +115,86 @@ async def view_gift_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     gift_id = int(query.data.split('_')[2])
 
-    async with async_session() as session:
-        gift = await session.get(Gift, gift_id)
-
-        text = f"🎁 {gift.name}\n\n"
-        text += f"📝 {gift.description}\n\n"
-        text += f"💰 {gift.price}₽"
-
-        # Изменяем callback_data на соответствующий паттерн
-        keyboard = [[InlineKeyboardButton("↩️ Назад к каталогу", callback_data="view_catalog")]]
-
-        if gift.image_name:
-            try:
-                extensions = ['.jpg', '.jpeg', '.png']
-                for ext in extensions:
-                    photo_path = f"assets/images/{gift.image_name}{ext}"
-                    try:
-                        with open(photo_path, 'rb') as photo:
-                            await query.message.reply_photo(
-                                photo=photo,
-                                caption=text,
-                                reply_markup=InlineKeyboardMarkup(keyboard)
-                            )
-                            await query.message.delete()
-                            break
-                    except FileNotFoundError:
-                        continue
-            except Exception as e:
-                logging.error(f"Ошибка при отправке фото: {e}")
-                await query.edit_message_text(
-                    text,
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-        else:
+    gift = get_catalog_index().get(gift_id)
+    if not gift:
+        await query.edit_message_text(
+            "Подарок не найден: возможно, каталог обновился.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("↩️ Назад к каталогу", callback_data="view_catalog")]])
+        )
+        return
+
+    text = f"🎁 {gift.name}\n\n"
+    text += f"📝 {gift.description}\n\n"
+    text += f"💰 {gift.price}₽"
+
+    # Изменяем callback_data на соответствующий паттерн
+    keyboard = [[InlineKeyboardButton("↩️ Назад к каталогу", callback_data="view_catalog")]]
+
+    image_path = resolve_image(gift.image_name)
+    if image_path:
+        try:
+            await reply_photo(
+                query.message,
+                image_path,
+                caption=text,
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+            await query.message.delete()
+        except Exception as e:
+            logging.error(f"Ошибка при отправке фото: {e}")
             await query.edit_message_text(
                 text,
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
+    else:
+        await query.edit_message_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
 
 
 async def handle_catalog_navigation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    if query.data == "prev_catalog_page":
-        context.user_data['catalog_page'] = max(0, context.user_data.get('catalog_page', 0) - 1)
+    # prev_catalog_page_<id первого на странице> / next_catalog_page_<id последнего>
+    direction, _, _, gift_id = query.data.split('_')
+    gift_id = int(gift_id)
+    if direction == "prev":
+        reply_markup = await get_catalog_keyboard(context, before_id=gift_id)
     else:
-        context.user_data['catalog_page'] = context.user_data.get('catalog_page', 0) + 1
+        context.user_data['catalog_first_id'] = gift_id + 1
+        reply_markup = await get_catalog_keyboard(context)
 
-    await view_catalog(update, context)
+    try:
+        await query.edit_message_reply_markup(reply_markup=reply_markup)
+    except BadRequest:
+        await view_catalog(update, context)
+
+
+async def find_gift(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_admin(update.effective_user.id):
+        return
+
+    query_text = ' '.join(context.args)
+    if not query_text:
+        await update.message.reply_text("ℹ️ Использование: /find <название или категория>")
+        return
+
+    gifts = await search_gifts(query_text, limit=catalog_browser.CATALOG_PAGE_SIZE * 2, columns=('name', 'category'))
+    if not gifts:
+        await update.message.reply_text("Ничего не найдено.")
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(f"{gift.name} - {gift.price}₽", callback_data=f"view_gift_{gift.id}")]
+        for gift in gifts
+    ]
+    keyboard.append([InlineKeyboardButton("📋 Весь каталог", callback_data="view_catalog")])
+    await update.message.reply_text(
+        f"🔎 Найдено по запросу «{query_text}»:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
 
 
 async def handle_excel_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -170,11 +204,39 @@ async def handle_excel_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     file = await context.bot.get_file(update.message.document)
     file_path = f"temp_{update.message.document.file_name}"
 
+    status_message = await update.message.reply_text("⏳ Файл получен, начинаю обработку...")
+
+    async def report_progress(stage: str, rows: int):
+        text = (
+            f"⏳ Читаю файл: обработано строк {rows}..." if stage == 'parsing'
+            else f"💾 Сохраняю {rows} строк в базу..."
+        )
+        try:
+            await status_message.edit_text(text)
+        except BadRequest:
+            pass
+
     try:
         await file.download_to_drive(file_path)
-        await process_excel_file(file_path)
+        stats = await process_excel_file(file_path, on_progress=report_progress)
+        if not stats:
+            await update.message.reply_text(
+                "❌ Не удалось обработать файл. Проверьте структуру таблицы.",
+                reply_markup=get_admin_menu()
+            )
+            return
+
         await update.message.reply_text(
-            "✅ База данных успешно обновлена!",
+            "✅ База данных успешно обновлена!\n\n"
+            f"Строк в файле: {stats['rows']}\n"
+            f"➕ Добавлено: {stats['added']}\n"
+            f"✏️ Обновлено: {stats['updated']}\n"
+            f"🙈 Скрыто: {stats['deactivated']}\n"
+            f"▫️ Без изменений: {stats['unchanged']}\n"
+            + (f"⚠️ Дубликатов пропущено: {stats['duplicates']}\n" if stats['duplicates'] else "")
+            + f"\n{stats['rows_per_sec']:.0f} строк/с, пик памяти "
+            + ("импорта" if stats['peak_memory_scope'] == 'import' else "обработчика за всё время")
+            + f" {stats['peak_memory_mb']:.1f} МБ",
             reply_markup=get_admin_menu()
         )
     except Exception as e:
@@ -187,7 +249,7 @@ async def handle_excel_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id != 583416877:
+    if not admin_cache.is_superadmin(update.effective_user.id):
         return
 
     try:
@@ -201,6 +263,8 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if user:
                 user.is_admin = True
                 await session.commit()
+                user_cache.remember_user(user)
+                admin_cache.invalidate_admin_cache()
                 await update.message.reply_text(f"✅ Пользователь @{username} назначен администратором")
             else:
                 await update.message.reply_text("❌ Пользователь не найден в базе данных")
@@ -210,6 +274,35 @@ async def add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
+async def show_metrics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_admin(update.effective_user.id):
+        return
+
+    users = user_cache.cache_stats()
+    text = (
+        "📊 Кэш пользователей:\n"
+        f"Записей: {users['size']} из {users['capacity']}\n"
+        f"Попадания: {users['hits']}, промахи: {users['misses']} ({users['hit_rate']:.1%})\n"
+        f"Вытеснено: {users['evictions']}\n"
+        f"Ожидают записи времени активности: {users['pending_last_seen']}\n\n"
+        f"📬 Очередь обновлений: {context.application.update_queue.qsize()}\n"
+    )
+
+    processor = context.application.update_processor
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        updates = processor.stats()
+        text += (
+            f"В работе: {updates['in_progress']} из {updates['max_concurrent']}\n"
+            f"Ждут своей очереди в чате: {updates['waiting']} (максимум {updates['max_waiting']})\n"
+            f"Активных чатов: {updates['active_chats']}\n"
+            f"Обработано: {updates['processed']}"
+        )
+    else:
+        text += "Обновления обрабатываются последовательно"
+
+    await update.message.reply_text(text)
+
+
 async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -226,8 +319,10 @@ def register_admin_handlers(application):
     application.add_handler(CallbackQueryHandler(upload_database, pattern="^upload_database$"))
     application.add_handler(CallbackQueryHandler(view_catalog, pattern="^view_catalog$"))
     application.add_handler(CallbackQueryHandler(view_gift_details, pattern=r"^view_gift_\d+$"))
-    application.add_handler(CallbackQueryHandler(handle_catalog_navigation, pattern="^(prev|next)_catalog_page$"))
+    application.add_handler(CallbackQueryHandler(handle_catalog_navigation, pattern=r"^(prev|next)_catalog_page_\d+$"))
+    application.add_handler(CommandHandler("find", find_gift))
     application.add_handler(CommandHandler("add", add_admin))
+    application.add_handler(CommandHandler("metrics", show_metrics))
     application.add_handler(CallbackQueryHandler(back_to_main, pattern="^back_to_main$"))
     application.add_handler(
         MessageHandler(
@@ -1,37 +1,42 @@
+import asyncio
 import logging
 
 from telegram import Update
 from telegram.ext import (ContextTypes, CommandHandler,
-                          MessageHandler, filters, CallbackQueryHandler, ConversationHandler)
+                          MessageHandler, filters, CallbackQueryHandler, ConversationHandler, TypeHandler)
 from database.database import async_session
 from database.models import User
 from keyboards.inline import get_main_menu
+from services.admin_cache import is_admin
+from services.catalog_index import refresh_catalog_index
+from services.image_registry import reload_image_registry
+from services import registration, user_cache
 from telegram import KeyboardButton, ReplyKeyboardMarkup
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logging.info(f"Start command received from user {update.effective_user.id}")
     try:
-        async with async_session() as session:
-            user = await session.get(User, update.effective_user.id)
-            logging.info(f"User data: {user}")
-
-            if not user:
-                logging.info("New user - requesting phone number")
-                keyboard = [[KeyboardButton("📱 Поделиться номером телефона", request_contact=True)]]
-                reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
-
-                await update.message.reply_text(
-                    "Добро пожаловать! Для начала работы поделитесь, пожалуйста, номером телефона.",
-                    reply_markup=reply_markup
-                )
-                return
-
-            logging.info("Existing user - showing main menu")
+        user = await user_cache.get_user(update.effective_user.id)
+        logging.info(f"User data: {user}")
+
+        if not user:
+            logging.info("New user - requesting phone number")
+            keyboard = [[KeyboardButton("📱 Поделиться номером телефона", request_contact=True)]]
+            reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
+
             await update.message.reply_text(
-                f"С возвращением, {user.name}! Выберите действие:",
-                reply_markup=get_main_menu(is_admin=user.is_admin)  # Передаём статус админа
+                "Добро пожаловать! Для начала работы поделитесь, пожалуйста, номером телефона.",
+                reply_markup=reply_markup
             )
+            registration.expect_contact(update.effective_user.id)
+            return
+
+        logging.info("Existing user - showing main menu")
+        await update.message.reply_text(
+            f"С возвращением, {user.name}! Выберите действие:",
+            reply_markup=get_main_menu(is_admin=await is_admin(user.telegram_id))  # Передаём статус админа
+        )
     except Exception as e:
         logging.error(f"Error in start_command: {e}")
         raise
@@ -48,7 +53,9 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         session.add(user)
         await session.commit()
+        user_cache.remember_user(user)
 
+    registration.expect_name(update.effective_user.id)
     await update.message.reply_text(
         "Спасибо! Теперь введите ваше имя:"
     )
@@ -58,12 +65,35 @@ async def handle_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     name = update.message.text
     user_id = update.effective_user.id
 
+    state = registration.registration_state(user_id)
+    if state is None:
+        # Состояние регистрации живёт в памяти и теряется при перезапуске, поэтому
+        # сверяемся с профилем; зарегистрированные берутся из кэша без запроса к базе
+        profile = await user_cache.get_user(user_id)
+        if profile and profile.name:
+            # Обычное сообщение зарегистрированного пользователя (например, ответ в подборке)
+            return
+        if not profile:
+            await update.message.reply_text(
+                "Пожалуйста, начните сначала с команды /start"
+            )
+            return
+        # Номер телефона уже получен: продолжаем регистрацию с ввода имени
+        registration.expect_name(user_id)
+    if state == registration.AWAITING_CONTACT:
+        await update.message.reply_text(
+            "Пожалуйста, начните сначала с команды /start"
+        )
+        return
+
     async with async_session() as session:
         user = await session.get(User, user_id)
         if user and not user.name:  # Проверяем, что имя ещё не установлено
             user.name = name
             context.user_data['user_name'] = name
             await session.commit()
+            user_cache.remember_user(user)
+            registration.finish_registration(user_id)
 
             await update.message.reply_text(
                 f"Отлично, {name}! Выберите действие:",
@@ -73,15 +103,31 @@ async def handle_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return ConversationHandler.END
         elif user and user.name:
             # Если имя уже установлено, игнорируем текстовые сообщения
+            registration.finish_registration(user_id)
             return
         else:
+            registration.finish_registration(user_id)
             await update.message.reply_text(
                 "Пожалуйста, начните сначала с команды /start"
             )
 
 
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Только отметка в памяти: в базу время активности пишется пачками
+    if update.effective_user:
+        user_cache.touch(update.effective_user.id)
+
+
+async def refresh_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Каталог и фотографии мог обновить импорт в другом процессе бота
+    if await refresh_catalog_index():
+        await asyncio.to_thread(reload_image_registry)
+
 
 def register_common_handlers(application):
+    # В группе срабатывает только первый подходящий обработчик, поэтому у проверки каталога своя группа
+    application.add_handler(TypeHandler(Update, refresh_catalog), group=-2)
+    application.add_handler(TypeHandler(Update, track_activity), group=-1)
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(MessageHandler(filters.CONTACT, handle_contact))
     # Обрабатываем имя только при первой регистрации
@@ -2,8 +2,7 @@ import telegram
 from telegram import InputMediaPhoto
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from telegram.ext import ContextTypes, CallbackQueryHandler, MessageHandler, filters, ConversationHandler
-from database.database import async_session
-from database.models import Gift, Selection, SelectionGift
+from database.database import save_selection
 from keyboards.inline import (
     get_recipient_keyboard,
     get_yes_no_keyboard,
@@ -11,8 +10,12 @@ from keyboards.inline import (
     get_gift_navigation_keyboard,
     get_main_menu
 )
+from services.catalog_index import get_catalog_index
+from services.collage import category_image
+from services.gift_finder import find_matching_gifts
+from services.image_registry import resolve_image
+from services.media_cache import edit_photo
 from sqlalchemy import select, func
-import os
 from PIL import Image
 
 # Состояния разговора
@@ -37,74 +40,70 @@ async def show_gift_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     gift_id = int(query.data.split('_')[1])
 
-    async with async_session() as session:
-        gift = await session.get(Gift, gift_id)
+    # Подарок берётся из индекса каталога в памяти, без запроса к базе
+    gift = get_catalog_index().get(gift_id)
+    if not gift:
+        await show_category_gifts(update, context)
+        return SHOWING_RESULTS
+
+    # Сокращаем описание, если оно слишком длинное
+    description = gift.description or ''
+    if len(description) > 700:
+        description = description[:697] + "..."
+
+    # Формируем более короткий текст
+    text = (
+        f"*{gift.name}*\n"
+        f"💰 Цена: {gift.price:,.2f} ₽\n\n"
+        f"_{description}_\n\n"
+        f"[Подробнее]({gift.link})"
+    )
 
-        # Сокращаем описание, если оно слишком длинное
-        description = gift.description
-        if len(description) > 700:
-            description = description[:697] + "..."
+    keyboard = [
+        [InlineKeyboardButton("◀️ Назад", callback_data="nav_back")],
+        [InlineKeyboardButton("🏠 В меню", callback_data="main_menu")]
+    ]
 
-        # Формируем более короткий текст
-        text = (
+    image_path = resolve_image(gift.image_name)
+
+    try:
+        if image_path:
+            await edit_photo(
+                query.message,
+                image_path,
+                caption=text,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown'
+            )
+        else:
+            await query.message.edit_text(
+                text,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown',
+                disable_web_page_preview=False
+            )
+    except telegram.error.BadRequest as e:
+        # Если всё ещё слишком длинное, отправляем совсем короткую версию
+        short_text = (
             f"*{gift.name}*\n"
             f"💰 Цена: {gift.price:,.2f} ₽\n\n"
-            f"_{description}_\n\n"
             f"[Подробнее]({gift.link})"
         )
-
-        keyboard = [
-            [InlineKeyboardButton("◀️ Назад", callback_data="nav_back")],
-            [InlineKeyboardButton("🏠 В меню", callback_data="main_menu")]
-        ]
-
-        image_path = None
-        for ext in ['.png', '.jpg', '.jpeg']:
-            temp_path = f"assets/images/{gift.image_name}{ext}"
-            if os.path.exists(temp_path):
-                image_path = temp_path
-                break
-
-        try:
-            if image_path:
-                await query.message.edit_media(
-                    media=InputMediaPhoto(
-                        media=open(image_path, 'rb'),
-                        caption=text,
-                        parse_mode='Markdown'
-                    ),
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            else:
-                await query.message.edit_text(
-                    text,
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='Markdown',
-                    disable_web_page_preview=False
-                )
-        except telegram.error.BadRequest as e:
-            # Если всё ещё слишком длинное, отправляем совсем короткую версию
-            short_text = (
-                f"*{gift.name}*\n"
-                f"💰 Цена: {gift.price:,.2f} ₽\n\n"
-                f"[Подробнее]({gift.link})"
+        if image_path:
+            await edit_photo(
+                query.message,
+                image_path,
+                caption=short_text,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown'
+            )
+        else:
+            await query.message.edit_text(
+                short_text,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown',
+                disable_web_page_preview=False
             )
-            if image_path:
-                await query.message.edit_media(
-                    media=InputMediaPhoto(
-                        media=open(image_path, 'rb'),
-                        caption=short_text,
-                        parse_mode='Markdown'
-                    ),
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            else:
-                await query.message.edit_text(
-                    short_text,
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='Markdown',
-                    disable_web_page_preview=False
-                )
 
     return SHOWING_RESULTS
 
@@ -256,66 +255,6 @@ async def process_trend(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return CONSUMABLE
 
 
-async def find_matching_gifts(selection_data):
-    # Определяем словарь фильтров получателей
-    recipient_filters = {
-        'friend': Gift.for_friend,
-        'wife': Gift.for_wife,
-        'sister': Gift.for_sister,
-        'mother': Gift.for_mother,
-        'husband': Gift.for_husband,
-        'brother': Gift.for_brother,
-        'father': Gift.for_father,
-        'man': Gift.for_man,
-        'woman': Gift.for_woman
-    }
-
-    async with async_session() as session:
-        base_query = select(Gift)
-        filters = []
-
-        # Фильтр получателя
-        if selection_data['recipient'] in recipient_filters:
-            filters.append(recipient_filters[selection_data['recipient']] == True)
-
-        # Остальные фильтры
-        filters.append(Gift.marketplace_available == selection_data['marketplace'])
-        filters.append(Gift.consumable == selection_data['consumable'])
-
-        # Применяем базовые фильтры
-        base_query = base_query.filter(*filters)
-
-        # Пробуем найти подарки с точным соответствием trend_score
-        trend_query = base_query.filter(Gift.trend_score == selection_data['trend_score'])
-        results = await session.execute(trend_query)
-        gifts = results.scalars().all()
-
-        # Если подарков не найдено, расширяем диапазон поиска
-        if not gifts:
-            trend_query = base_query.filter(
-                Gift.trend_score.between(
-                    selection_data['trend_score'] - 2,
-                    selection_data['trend_score'] + 2
-                )
-            )
-            results = await session.execute(trend_query)
-            gifts = results.scalars().all()
-
-        print("Debug: Selection data:", selection_data)
-        print("Debug: SQL Query:", str(trend_query))
-        print("Debug: Found gifts:", len(gifts))
-
-        # Группировка результатов
-        categorized_gifts = {}
-        for gift in gifts:
-            if gift.category not in categorized_gifts:
-                categorized_gifts[gift.category] = []
-            if len(categorized_gifts[gift.category]) < 2:
-                categorized_gifts[gift.category].append(gift)
-
-        return dict(sorted(categorized_gifts.items())[:3])
-
-
 async def process_consumable(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -333,32 +272,22 @@ async def process_consumable(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return ConversationHandler.END
 
-    # Сохраняем подборку в базу данных
-    async with async_session() as session:
-        selection = Selection(
-            user_id=update.effective_user.id,
-            recipient_type=context.user_data['selection']['recipient'],
-            age=context.user_data['selection']['age'],
-            budget=context.user_data['selection']['budget'],
-            marketplace=context.user_data['selection']['marketplace'],
-            trend_score=context.user_data['selection']['trend_score'],
-            consumable=consumable
-        )
-        session.add(selection)
-        await session.flush()
-
-        # Сохраняем связи с подарками
-        for category_gifts in gifts_by_category.values():
-            for gift in category_gifts:
-                selection_gift = SelectionGift(
-                    selection_id=selection.id,
-                    gift_id=gift.id
-                )
-                session.add(selection_gift)
-
-        await session.commit()
+    # Сохраняем подборку в базу данных вместе с категориями подарков
+    await save_selection(
+        update.effective_user.id,
+        context.user_data['selection']['recipient'],
+        gifts_by_category,
+        age=context.user_data['selection']['age'],
+        budget=context.user_data['selection']['budget'],
+        marketplace=context.user_data['selection']['marketplace'],
+        trend_score=context.user_data['selection']['trend_score'],
+        consumable=consumable
+    )
 
-    context.user_data['current_gifts'] = gifts_by_category
+    # В user_data храним только id подарков: сами подарки лежат в общем индексе каталога
+    context.user_data['current_gifts'] = {
+        category: tuple(gift.id for gift in gifts) for category, gifts in gifts_by_category.items()
+    }
     context.user_data['current_category_index'] = 0
 
     # Показываем первую категорию
@@ -386,7 +315,7 @@ async def show_category_gifts(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     categories = list(gifts_by_category.keys())
     current_category = categories[current_index]
-    gifts = gifts_by_category[current_category]
+    gifts = get_catalog_index().get_many(gifts_by_category[current_category])
 
     text = f"Отлично! Мы подобрали для вас подарки в {len(gifts_by_category)} категориях.\n\n"
     text += f"Сейчас: {current_category}\n\n"
@@ -394,23 +323,14 @@ async def show_category_gifts(update: Update, context: ContextTypes.DEFAULT_TYPE
     for i, gift in enumerate(gifts, 1):
         text += f"{i}) [{gift.name}]({gift.link})\n"
 
-    media_group = []
-    for gift in gifts:
-        for ext in ['.png', '.jpg', '.jpeg']:
-            image_path = f"assets/images/{gift.image_name}{ext}"
-            if os.path.exists(image_path):
-                media_group.append(open(image_path, 'rb'))
-                break
-
-    try:
-        if media_group:
-            await query.message.edit_media(
-                media=InputMediaPhoto(
-                    media=media_group[0],
-                    caption=text,
-                    parse_mode='Markdown'
-                ),
-                reply_markup=get_gift_navigation_keyboard(current_index, len(categories), gifts)
+    async with category_image(gifts) as image_path:
+        if image_path:
+            await edit_photo(
+                query.message,
+                image_path,
+                caption=text,
+                reply_markup=get_gift_navigation_keyboard(current_index, len(categories), gifts),
+                parse_mode='Markdown'
             )
         else:
             await query.edit_message_text(
@@ -419,9 +339,6 @@ async def show_category_gifts(update: Update, context: ContextTypes.DEFAULT_TYPE
                 parse_mode='Markdown',
                 disable_web_page_preview=True
             )
-    finally:
-        for media in media_group:
-            media.close()
 
 
 
@@ -459,7 +376,8 @@ def register_gift_selection_handlers(application):
             CallbackQueryHandler(cancel_selection, pattern="^main_menu$")
         ],
         per_message=False,
-        name="gift_selection"
+        name="gift_selection",
+        persistent=True
     )
 
     application.add_handler(conv_handler)
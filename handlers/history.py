@@ -1,11 +1,12 @@
 from asyncio.log import logger
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import ContextTypes, CallbackQueryHandler, ConversationHandler
-from database.database import async_session
-from database.models import Selection, SelectionGift, Gift
-from keyboards.inline import get_main_menu, get_gift_navigation_keyboard
-from sqlalchemy import select
-import os
+from keyboards.inline import get_main_menu, get_gift_navigation_keyboard, get_history_keyboard
+from services.collage import category_image
+from services.history import OLDER, load_history_page, load_selection_gifts
+from services.image_registry import resolve_image
+from services.media_cache import edit_photo
+from utils.history_cursor import decode_cursor
 
 VIEWING_HISTORY, VIEWING_GIFTS, SHOWING_GIFT_DETAILS = range(3)
 
@@ -13,38 +14,30 @@ async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    async with async_session() as session:
-        stmt = select(Selection).where(
-            Selection.user_id == update.effective_user.id
-        ).order_by(Selection.created_at.desc())
+    # "history" - первая страница, "hist_older_<курсор>" / "hist_newer_<курсор>" - соседние
+    cursor = None
+    direction = OLDER
+    if query.data.startswith('hist_'):
+        _, direction, value = query.data.split('_', 2)
+        cursor = decode_cursor(value)
 
-        result = await session.execute(stmt)
-        selections = result.scalars().all()
-
-        if not selections:
-            await query.edit_message_text(
-                "У вас пока нет истории подборок подарков.",
-                reply_markup=get_main_menu()
-            )
-            return ConversationHandler.END
-
-        keyboard = []
-        for selection in selections:
-            button_text = f"🎁 {selection.recipient_type} ({selection.created_at.strftime('%d.%m.%Y')})"
-            keyboard.append([
-                InlineKeyboardButton(
-                    button_text,
-                    callback_data=f"view_hist_{selection.id}"
-                )
-            ])
-
-        keyboard.append([InlineKeyboardButton("🏠 В главное меню", callback_data="main_menu")])
+    page = await load_history_page(update.effective_user.id, cursor, direction)
+    if not page.items and cursor is not None:
+        # Подборки на этой странице могли удалить - начинаем с начала
+        page = await load_history_page(update.effective_user.id)
 
+    if not page.items:
         await query.edit_message_text(
-            "📜 Выберите подборку для просмотра:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            "У вас пока нет истории подборок подарков.",
+            reply_markup=get_main_menu()
         )
-        return VIEWING_HISTORY
+        return ConversationHandler.END
+
+    await query.edit_message_text(
+        "📜 Выберите подборку для просмотра:",
+        reply_markup=get_history_keyboard(page)
+    )
+    return VIEWING_HISTORY
 
 async def view_historical_gifts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -52,33 +45,31 @@ async def view_historical_gifts(update: Update, context: ContextTypes.DEFAULT_TY
 
     selection_id = int(query.data.split('_')[2])
 
-    async with async_session() as session:
-        stmt = select(Gift).join(SelectionGift).where(
-            SelectionGift.selection_id == selection_id
+    # Подарки берутся из снимка подборки (закэширован по selection_id),
+    # в user_data - только номер подборки
+    if not await load_selection_gifts(selection_id):
+        await query.edit_message_text(
+            "В этой подборке нет подарков.",
+            reply_markup=get_main_menu()
         )
-        result = await session.execute(stmt)
-        gifts = result.scalars().all()
+        return ConversationHandler.END
 
-        gifts_by_category = {}
-        for gift in gifts:
-            category = gift.category if gift.category else "Без категории"
-            if category not in gifts_by_category:
-                gifts_by_category[category] = []
-            gifts_by_category[category].append(gift)
+    context.user_data['history_selection_id'] = selection_id
+    context.user_data['current_category_index'] = 0
 
-        context.user_data['current_gifts'] = gifts_by_category
-        context.user_data['current_category_index'] = 0
-
-        await show_category_gifts(update, context)
-        return VIEWING_GIFTS
+    await show_category_gifts(update, context)
+    return VIEWING_GIFTS
 
 async def show_category_gifts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query if isinstance(update, Update) else update
     message = query.message
 
-    gifts_by_category = context.user_data.get('current_gifts', {})
+    gifts_by_category = await load_selection_gifts(context.user_data.get('history_selection_id', 0))
     current_index = context.user_data.get('current_category_index', 0)
     categories = list(gifts_by_category.keys())
+    if not categories:
+        await message.edit_text("Подборка не найдена.", reply_markup=get_main_menu())
+        return
 
     if query.data and query.data.startswith('nav_'):
         if query.data == "nav_prev":
@@ -104,33 +95,22 @@ async def show_category_gifts(update: Update, context: ContextTypes.DEFAULT_TYPE
     keyboard = get_gift_navigation_keyboard(current_index, len(categories), gifts)
 
     try:
-        image_path = None
-        for gift in gifts:
-            for ext in ['.png', '.jpg', '.jpeg']:
-                temp_path = f"assets/images/{gift.image_name}{ext}"
-                if os.path.exists(temp_path):
-                    image_path = temp_path
-                    break
+        async with category_image(gifts) as image_path:
             if image_path:
-                break
-
-        if image_path:
-            with open(image_path, 'rb') as photo:
-                await message.edit_media(
-                    media=InputMediaPhoto(
-                        media=photo,
-                        caption=text,
-                        parse_mode='Markdown'
-                    ),
-                    reply_markup=keyboard
+                await edit_photo(
+                    message,
+                    image_path,
+                    caption=text,
+                    reply_markup=keyboard,
+                    parse_mode='Markdown'
+                )
+            else:
+                await message.edit_text(
+                    text,
+                    reply_markup=keyboard,
+                    parse_mode='Markdown',
+                    disable_web_page_preview=True
                 )
-        else:
-            await message.edit_text(
-                text,
-                reply_markup=keyboard,
-                parse_mode='Markdown',
-                disable_web_page_preview=True
-            )
     except Exception as e:
         logger.error(f"Error showing category gifts: {e}")
         await message.edit_text(
@@ -148,65 +128,63 @@ async def show_gift_details(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     gift_id = int(query.data.split('_')[1])
 
-    async with async_session() as session:
-        gift = await session.get(Gift, gift_id)
-        if not gift:
-            await query.message.edit_text(
-                "Подарок не найден.",
-                reply_markup=get_main_menu()
-            )
-            return ConversationHandler.END
-
-        text = (
-            f"*{gift.name}*\n"
-            f"💰 Цена: {gift.price:,.2f} ₽\n\n"
-            f"_{gift.description[:700] + '...' if len(gift.description) > 700 else gift.description}_\n\n"
-            f"[Подробнее]({gift.link})"
+    gifts_by_category = await load_selection_gifts(context.user_data.get('history_selection_id', 0))
+    gift = next(
+        (gift for gifts in gifts_by_category.values() for gift in gifts if gift.id == gift_id),
+        None
+    )
+    if not gift:
+        await query.message.edit_text(
+            "Подарок не найден.",
+            reply_markup=get_main_menu()
         )
+        return ConversationHandler.END
 
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("◀️ Назад", callback_data="nav_back")],
-            [InlineKeyboardButton("🏠 В меню", callback_data="main_menu")]
-        ])
+    description = gift.description or ''
 
-        try:
-            image_path = None
-            for ext in ['.png', '.jpg', '.jpeg']:
-                temp_path = f"assets/images/{gift.image_name}{ext}"
-                if os.path.exists(temp_path):
-                    image_path = temp_path
-                    break
+    text = (
+        f"*{gift.name}*\n"
+        f"💰 Цена: {gift.price:,.2f} ₽\n\n"
+        f"_{description[:700] + '...' if len(description) > 700 else description}_\n\n"
+        f"[Подробнее]({gift.link})"
+    )
 
-            if image_path:
-                with open(image_path, 'rb') as photo:
-                    await query.message.edit_media(
-                        media=InputMediaPhoto(
-                            media=photo,
-                            caption=text,
-                            parse_mode='Markdown'
-                        ),
-                        reply_markup=keyboard
-                    )
-            else:
-                await query.message.edit_text(
-                    text,
-                    reply_markup=keyboard,
-                    parse_mode='Markdown',
-                    disable_web_page_preview=False
-                )
-        except Exception as e:
-            logger.error(f"Error showing gift details: {e}")
-            short_text = (
-                f"*{gift.name}*\n"
-                f"💰 Цена: {gift.price:,.2f} ₽\n\n"
-                f"[Подробнее]({gift.link})"
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("◀️ Назад", callback_data="nav_back")],
+        [InlineKeyboardButton("🏠 В меню", callback_data="main_menu")]
+    ])
+
+    try:
+        image_path = resolve_image(gift.image_name)
+
+        if image_path:
+            await edit_photo(
+                query.message,
+                image_path,
+                caption=text,
+                reply_markup=keyboard,
+                parse_mode='Markdown'
             )
+        else:
             await query.message.edit_text(
-                short_text,
+                text,
                 reply_markup=keyboard,
                 parse_mode='Markdown',
                 disable_web_page_preview=False
             )
+    except Exception as e:
+        logger.error(f"Error showing gift details: {e}")
+        short_text = (
+            f"*{gift.name}*\n"
+            f"💰 Цена: {gift.price:,.2f} ₽\n\n"
+            f"[Подробнее]({gift.link})"
+        )
+        await query.message.edit_text(
+            short_text,
+            reply_markup=keyboard,
+            parse_mode='Markdown',
+            disable_web_page_preview=False
+        )
 
     return SHOWING_GIFT_DETAILS
 
@@ -245,7 +223,8 @@ def register_history_handlers(application):
         entry_points=[CallbackQueryHandler(show_history, pattern="^history$")],
         states={
             VIEWING_HISTORY: [
-                CallbackQueryHandler(view_historical_gifts, pattern=r"^view_hist_\d+$")
+                CallbackQueryHandler(view_historical_gifts, pattern=r"^view_hist_\d+$"),
+                CallbackQueryHandler(show_history, pattern=r"^hist_(older|newer)_\d+_\d+$")
             ],
             VIEWING_GIFTS: [
                 CallbackQueryHandler(show_category_gifts, pattern="^nav_"),
@@ -260,7 +239,8 @@ def register_history_handlers(application):
             CallbackQueryHandler(main_menu_callback, pattern="^main_menu$")
         ],
         name="history_conversation",
-        per_message=True
+        per_message=True,
+        persistent=True
     )
 
     application.add_handler(conv_handler)
@@ -1,11 +1,23 @@
 from PIL import Image
+import asyncio
 import os
 from config.config import IMAGES_DIR
+from services.image_registry import register_image, unregister_image
 import aiofiles
 import logging
 from typing import Optional
 
 
+def _optimize_image(filepath: str):
+    with Image.open(filepath) as img:
+        # Изменяем размер, сохраняя пропорции
+        max_size = (800, 800)
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+        # Сохраняем оптимизированное изображение
+        img.convert('RGB').save(filepath, 'JPEG', quality=85, optimize=True)
+
+
 async def save_gift_image(image_data: bytes, image_name: str) -> Optional[str]:
     try:
         # Создаем имя файла
@@ -16,15 +28,10 @@ async def save_gift_image(image_data: bytes, image_name: str) -> Optional[str]:
         async with aiofiles.open(filepath, 'wb') as f:
             await f.write(image_data)
 
-        # Оптимизируем изображение
-        with Image.open(filepath) as img:
-            # Изменяем размер, сохраняя пропорции
-            max_size = (800, 800)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-            # Сохраняем оптимизированное изображение
-            img.save(filepath, 'JPEG', quality=85, optimize=True)
+        # Оптимизируем изображение вне цикла событий
+        await asyncio.to_thread(_optimize_image, filepath)
 
+        register_image(image_name, filepath)
         return filename
     except Exception as e:
         logging.error(f"Ошибка при сохранении изображения: {e}")
@@ -36,6 +43,7 @@ async def delete_gift_image(image_name: str) -> bool:
         filepath = os.path.join(IMAGES_DIR, f"{image_name}.jpg")
         if os.path.exists(filepath):
             os.remove(filepath)
+            unregister_image(image_name)
             return True
         return False
     except Exception as e:
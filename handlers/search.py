@@ -0,0 +1,81 @@
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes, CommandHandler, InlineQueryHandler
+from telegram.helpers import escape_markdown
+from keyboards.inline import get_main_menu
+from services.catalog_search import search_gifts
+
+SEARCH_RESULTS = 10
+# Результатов в одном ответе на инлайн-запрос (Telegram принимает до 50)
+INLINE_RESULTS = 20
+# Каталог меняется только при загрузке Excel, ответы можно кэшировать на стороне Telegram
+INLINE_CACHE_TIME = 300
+
+
+def _gift_text(gift) -> str:
+    return (
+        f"🎁 *{escape_markdown(gift.name)}*\n"
+        f"💰 Цена: {gift.price:,.2f} ₽\n\n"
+        f"[Подробнее]({gift.link})"
+    )
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query_text = ' '.join(context.args)
+    if not query_text:
+        await update.message.reply_text(
+            "🔎 Напишите, что ищете: /search духи\n"
+            f"Искать можно и в любом чате: @{context.bot.username} <запрос>"
+        )
+        return
+
+    gifts = await search_gifts(query_text, limit=SEARCH_RESULTS)
+    if not gifts:
+        await update.message.reply_text(
+            "Ничего не нашлось. Попробуйте другие слова или подберите подарок по параметрам.",
+            reply_markup=get_main_menu()
+        )
+        return
+
+    text = f"🔎 Нашлось по запросу «{escape_markdown(query_text)}»:\n\n"
+    for i, gift in enumerate(gifts, 1):
+        text += f"{i}) [{escape_markdown(gift.name)}]({gift.link}) - {gift.price:,.0f} ₽\n"
+
+    await update.message.reply_text(
+        text,
+        reply_markup=get_main_menu(),
+        parse_mode='Markdown',
+        disable_web_page_preview=True
+    )
+
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    inline_query = update.inline_query
+    query_text = inline_query.query.strip()
+    if not query_text:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME)
+        return
+
+    # offset - сколько результатов уже отдано; Telegram присылает его при прокрутке
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    gifts = await search_gifts(query_text, limit=INLINE_RESULTS, offset=offset)
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(gift.id),
+            title=gift.name,
+            description=f"{gift.price:,.0f} ₽ · {gift.category}",
+            url=gift.link or None,
+            input_message_content=InputTextMessageContent(_gift_text(gift), parse_mode='Markdown')
+        )
+        for gift in gifts
+    ]
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        next_offset=str(offset + INLINE_RESULTS) if len(gifts) == INLINE_RESULTS else ''
+    )
+
+
+def register_search_handlers(application):
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(InlineQueryHandler(inline_search))
@@ -1,5 +1,7 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+from utils.history_cursor import encode_cursor
+
 
 def get_main_menu(is_admin=False):
     keyboard = [
@@ -81,26 +83,23 @@ def get_gift_navigation_keyboard(current_index, total_categories, gifts):
     return InlineKeyboardMarkup(keyboard)
 
 
-def get_history_keyboard(selections: list, page: int = 0, items_per_page: int = 5):
+def get_history_keyboard(page):
+    # page - services.history.HistoryPage: подборки одной страницы и курсоры соседних
     keyboard = []
 
-    start_idx = page * items_per_page
-    end_idx = start_idx + items_per_page
-    current_page_selections = selections[start_idx:end_idx]
-
-    for selection in current_page_selections:
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{selection.recipient_type} ({selection.created_at.strftime('%d.%m.%Y')})",
-                callback_data=f"history_{selection.id}"
-            )
-        ])
+    for item in page.items:
+        text = f"🎁 {item.recipient_type} ({item.created_at.strftime('%d.%m.%Y')})"
+        if item.gift_count:
+            text += f" · {item.gift_count} шт."
+        if item.top_category:
+            text += f" · {item.top_category}"
+        keyboard.append([InlineKeyboardButton(text, callback_data=f"view_hist_{item.id}")])
 
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️", callback_data=f"history_page_{page - 1}"))
-    if end_idx < len(selections):
-        nav_buttons.append(InlineKeyboardButton("➡️", callback_data=f"history_page_{page + 1}"))
+    if page.newer:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"hist_newer_{encode_cursor(page.newer)}"))
+    if page.older:
+        nav_buttons.append(InlineKeyboardButton("Старше ➡️", callback_data=f"hist_older_{encode_cursor(page.older)}"))
 
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -1,11 +1,45 @@
 import logging
 from telegram.ext import ApplicationBuilder, CommandHandler
-from config.config import BOT_TOKEN
+from config.config import (
+    BOT_TOKEN, RUN_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    MAX_CONCURRENT_UPDATES
+)
 from handlers.admin import register_admin_handlers
 from handlers.common import register_common_handlers
 from handlers.gift_selection import register_gift_selection_handlers
 from handlers.history import register_history_handlers
+from handlers.search import register_search_handlers
 from handlers.subscription import register_subscription_handlers
+from database.database import init_db, dispose_engines
+from services.catalog_index import get_catalog_index, reload_catalog_index
+from services.excel_parser import shutdown_import_workers
+from services.image_pipeline import shutdown_image_workers
+from services.image_registry import reload_image_registry
+from services.media_cache import load_media_cache
+from services.persistence import DatabasePersistence
+from services.registration import load_registration_state
+from services.update_processor import ChatOrderedUpdateProcessor
+from services.user_cache import start_last_seen_flusher, stop_last_seen_flusher
+from services.webhook import WebhookApp
+
+
+async def on_startup(application):
+    await init_db()
+    # Каталог меняется только при загрузке Excel, поэтому читаем его один раз
+    # (если его ещё не загрузило хранилище состояния при инициализации)
+    if not len(get_catalog_index()):
+        await reload_catalog_index()
+    reload_image_registry()
+    await load_media_cache()
+    await load_registration_state()
+    start_last_seen_flusher()
+
+
+async def on_shutdown(application):
+    await stop_last_seen_flusher()
+    shutdown_import_workers()
+    shutdown_image_workers()
+    await dispose_engines()
 
 
 def main():
@@ -15,8 +49,27 @@ def main():
         level=logging.INFO
     )
 
+    if RUN_MODE == 'webhook' and not WEBHOOK_SECRET:
+        # Без секрета вебхук принял бы поддельное обновление, например /add от имени суперадминистратора
+        raise SystemExit("RUN_MODE=webhook требует WEBHOOK_SECRET")
+
     # Создание приложения
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    persistence = DatabasePersistence()
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .persistence(persistence)
+    )
+    if MAX_CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES))
+    if RUN_MODE == 'webhook':
+        # Обновления приходят через ASGI-приложение, Updater не нужен
+        builder = builder.updater(None)
+    app = builder.build()
+    # Хранилище вытесняет из памяти приложения данные давно неактивных пользователей
+    persistence.attach(app)
 
     # Регистрация обработчиков
     register_common_handlers(app)
@@ -24,9 +77,23 @@ def main():
     register_admin_handlers(app)
     register_history_handlers(app)
     register_subscription_handlers(app)
+    register_search_handlers(app)
 
     # Запуск бота
-    app.run_polling(poll_interval=1)
+    if RUN_MODE == 'webhook':
+        # uvicorn нужен только в режиме вебхука
+        import uvicorn
+
+        uvicorn.run(
+            WebhookApp(app, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET, webhook_url=WEBHOOK_URL),
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            lifespan='on',
+            # Логи запуска и остановки пишет бот, журнал доступа не нужен
+            access_log=False
+        )
+    else:
+        app.run_polling(poll_interval=1)
 
 
 if __name__ == '__main__':
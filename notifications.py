@@ -1,10 +1,11 @@
 from telegram import Bot
 from database.database import get_session
-from database.models import User
+from database.models import User, Selection
+from sqlalchemy import func, select
 from typing import List, Union
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class NotificationManager:
@@ -63,17 +64,22 @@ class NotificationManager:
     async def send_daily_summary(self, admin_ids: List[int]):
         async with get_session() as session:
             today = datetime.now().date()
+            # Диапазон вместо func.date(...) == today, чтобы работали индексы по created_at
+            day_start = datetime.combine(today, datetime.min.time())
+            day_end = day_start + timedelta(days=1)
 
             # Получаем статистику за день
             stats = {
                 'new_users': await session.scalar(
                     select(func.count(User.telegram_id)).where(
-                        func.date(User.created_at) == today
+                        User.created_at >= day_start,
+                        User.created_at < day_end
                     )
                 ),
                 'selections_made': await session.scalar(
                     select(func.count(Selection.id)).where(
-                        func.date(Selection.created_at) == today
+                        Selection.created_at >= day_start,
+                        Selection.created_at < day_end
                     )
                 )
             }
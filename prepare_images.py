@@ -0,0 +1,19 @@
+import asyncio
+import logging
+import sys
+from database.database import init_db
+from services.image_pipeline import process_catalog_images, shutdown_image_workers
+
+
+async def prepare(force: bool):
+    await init_db()
+    try:
+        stats = await process_catalog_images(force=force)
+        logging.info(f"Готово: {stats}")
+    finally:
+        shutdown_image_workers()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # --force пересобирает копии даже для неизменённых файлов
+    asyncio.run(prepare(force='--force' in sys.argv))
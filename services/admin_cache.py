@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import time
+from typing import FrozenSet
+
+from sqlalchemy import select
+
+from config.config import ADMIN_IDS, ADMIN_CACHE_TTL
+from database.database import async_session
+from database.models import User
+
+logger = logging.getLogger(__name__)
+
+
+# Администраторы из ADMIN_IDS и users.is_admin
+_admins: FrozenSet[int] = frozenset(ADMIN_IDS)
+_expires_at = 0.0
+_lock = asyncio.Lock()
+
+
+async def _load_admins() -> FrozenSet[int]:
+    async with async_session() as session:
+        result = await session.execute(select(User.telegram_id).where(User.is_admin))
+        return frozenset(ADMIN_IDS).union(result.scalars())
+
+
+async def get_admin_ids() -> FrozenSet[int]:
+    global _admins, _expires_at
+
+    if time.monotonic() < _expires_at:
+        return _admins
+
+    async with _lock:
+        # Пока ждали блокировку, кэш мог обновить другой обработчик
+        if time.monotonic() >= _expires_at:
+            try:
+                _admins = await _load_admins()
+                logger.info(f"Кэш администраторов обновлён: {len(_admins)}")
+            except Exception as e:
+                # Работаем со старым списком, повторим при следующей проверке
+                logger.error(f"Не удалось обновить кэш администраторов: {e}")
+                return _admins
+            _expires_at = time.monotonic() + ADMIN_CACHE_TTL
+    return _admins
+
+
+async def is_admin(user_id: int) -> bool:
+    return user_id in await get_admin_ids()
+
+
+def is_superadmin(user_id: int) -> bool:
+    # Назначать администраторов могут только указанные в ADMIN_IDS
+    return user_id in ADMIN_IDS
+
+
+def invalidate_admin_cache():
+    global _expires_at
+    _expires_at = 0.0
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from database.database import read_session
+from database.models import Gift
+from services.catalog_index import CatalogIndex, get_catalog_index
+
+logger = logging.getLogger(__name__)
+
+
+CATALOG_PAGE_SIZE = 6
+# Сколько заранее загруженных страниц держать (на всех администраторов)
+PREFETCH_LIMIT = 50
+
+
+class CatalogItem(NamedTuple):
+    id: int
+    name: str
+    price: float
+
+
+class CatalogPage(NamedTuple):
+    items: List[CatalogItem]
+    has_prev: bool
+    has_next: bool
+
+
+# id, после которого начинается страница -> (снимок каталога, строки страницы + 1).
+# Импорт подменяет индекс каталога, и страницы старого снимка перестают совпадать
+_prefetched: Dict[int, Tuple[CatalogIndex, List[CatalogItem]]] = {}
+_prefetch_tasks: Dict[int, asyncio.Task] = {}
+
+
+def _first_active_id() -> Optional[int]:
+    return next((gift.id for gift in get_catalog_index().gifts if gift.is_active is not False), None)
+
+
+def total_active() -> int:
+    # Вместо COUNT(*) на каждой странице: число активных подарков уже посчитано
+    # при построении индекса каталога и обновляется вместе с ним после импорта
+    return get_catalog_index().active_count
+
+
+async def _fetch_after(after_id: int, page_size: int) -> List[CatalogItem]:
+    # Keyset по первичному ключу: стоимость не зависит от номера страницы
+    async with read_session() as session:
+        result = await session.execute(
+            select(Gift.id, Gift.name, Gift.price)
+            .where(Gift.is_active, Gift.id > after_id)
+            .order_by(Gift.id)
+            .limit(page_size + 1)
+        )
+        return [CatalogItem(*row) for row in result]
+
+
+async def _fetch_before(before_id: int, page_size: int) -> List[CatalogItem]:
+    async with read_session() as session:
+        result = await session.execute(
+            select(Gift.id, Gift.name, Gift.price)
+            .where(Gift.is_active, Gift.id < before_id)
+            .order_by(Gift.id.desc())
+            .limit(page_size + 1)
+        )
+        return [CatalogItem(*row) for row in result]
+
+
+async def _prefetch(after_id: int, page_size: int):
+    catalog = get_catalog_index()
+    try:
+        rows = await _fetch_after(after_id, page_size)
+    except Exception as e:
+        logger.warning(f"Не удалось заранее загрузить страницу каталога: {e}")
+        return
+    finally:
+        _prefetch_tasks.pop(after_id, None)
+
+    if len(_prefetched) >= PREFETCH_LIMIT:
+        _prefetched.pop(next(iter(_prefetched)))
+    _prefetched[after_id] = (catalog, rows)
+
+
+def _schedule_prefetch(after_id: int, page_size: int):
+    if after_id in _prefetched or after_id in _prefetch_tasks:
+        return
+    _prefetch_tasks[after_id] = asyncio.create_task(_prefetch(after_id, page_size))
+
+
+async def _rows_after(after_id: int, page_size: int) -> List[CatalogItem]:
+    task = _prefetch_tasks.get(after_id)
+    if task is not None:
+        # Страница уже загружается - дожидаемся её, а не читаем второй раз
+        await asyncio.shield(task)
+
+    cached = _prefetched.get(after_id)
+    if cached is not None and cached[0] is get_catalog_index():
+        return cached[1]
+    return await _fetch_after(after_id, page_size)
+
+
+async def load_page(
+        after_id: int = 0,
+        before_id: Optional[int] = None,
+        page_size: int = CATALOG_PAGE_SIZE
+) -> CatalogPage:
+    # Страница активных подарков, начинающаяся после after_id, или (для кнопки
+    # "назад") заканчивающаяся перед before_id. Читается page_size + 1 строка
+    if before_id is not None:
+        rows = await _fetch_before(before_id, page_size)
+        has_prev = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        page = CatalogPage(items, has_prev, True)
+    else:
+        rows = await _rows_after(after_id, page_size)
+        items = rows[:page_size]
+        has_prev = bool(items) and items[0].id != _first_active_id()
+        page = CatalogPage(items, has_prev, len(rows) > page_size)
+
+    if page.has_next and page.items:
+        # Следующую страницу читаем, пока администратор смотрит на эту
+        _schedule_prefetch(page.items[-1].id, page_size)
+    return page
+
+
+def invalidate_prefetched():
+    _prefetched.clear()
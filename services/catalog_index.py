@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import re
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import insert, select, update
+
+from config.config import CATALOG_VERSION_CHECK_INTERVAL, MATCHER_BACKEND
+from database.database import engine, read_session
+from database.models import Gift, Meta
+
+if TYPE_CHECKING:
+    from services.gift_columns import GiftColumns
+
+logger = logging.getLogger(__name__)
+
+
+RECIPIENT_FIELDS = {
+    'friend': 'for_friend',
+    'wife': 'for_wife',
+    'sister': 'for_sister',
+    'mother': 'for_mother',
+    'husband': 'for_husband',
+    'brother': 'for_brother',
+    'father': 'for_father',
+    'man': 'for_man',
+    'woman': 'for_woman'
+}
+
+class GiftView(NamedTuple):
+    # Неизменяемое представление подарка для подбора и отображения. В отличие от
+    # ORM-объекта не несёт состояния сессии SQLAlchemy и занимает в разы меньше памяти
+    id: int
+    name: str
+    description: Optional[str]
+    category: str
+    subcategory: Optional[str]
+    link: Optional[str]
+    price: float
+    image_name: Optional[str]
+    age_range: Optional[str]
+    trend_score: Optional[int]
+    creativity_score: Optional[int]
+    marketplace_available: Optional[bool]
+    consumable: Optional[bool]
+    is_active: bool
+    for_friend: Optional[bool]
+    for_wife: Optional[bool]
+    for_sister: Optional[bool]
+    for_mother: Optional[bool]
+    for_husband: Optional[bool]
+    for_brother: Optional[bool]
+    for_father: Optional[bool]
+    for_man: Optional[bool]
+    for_woman: Optional[bool]
+
+
+DEFAULT_TREND_SCORE = 5
+DEFAULT_CREATIVITY_SCORE = 5
+MIN_AGE, MAX_AGE = 0, 100
+
+# Позиции установленных битов для каждого значения байта
+_BYTE_POSITIONS = tuple(
+    tuple(bit for bit in range(8) if value >> bit & 1)
+    for value in range(256)
+)
+
+
+def _mask_from_positions(positions: Iterable[int], size: int) -> int:
+    # Собираем маску через bytearray: побитовое OR для больших int квадратично
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def parse_age_range(value: Optional[str]) -> Tuple[int, int]:
+    # В таблице возраст записан как "18-99", "12+" или одним числом
+    numbers = [int(number) for number in re.findall(r'\d+', str(value or ''))]
+    if not numbers:
+        return MIN_AGE, MAX_AGE
+    if len(numbers) == 1:
+        if '+' in str(value):
+            return numbers[0], MAX_AGE
+        return numbers[0], numbers[0]
+    return min(numbers[0], numbers[1]), max(numbers[0], numbers[1])
+
+
+class CatalogIndex:
+    # Неизменяемый снимок каталога: после построения объект только читается,
+    # поэтому его можно безопасно разделять между всеми обработчиками
+
+    def __init__(self, gifts: Sequence[GiftView], columns: Optional['GiftColumns'] = None):
+        self.gifts = tuple(sorted(gifts, key=lambda gift: gift.id))
+        self.by_id = {gift.id: gift for gift in self.gifts}
+        size = len(self.gifts)
+        self._size_bytes = (size + 7) // 8
+        self.all_mask = (1 << size) - 1
+        self.age_ranges = tuple(parse_age_range(gift.age_range) for gift in self.gifts)
+        # Колоночное представление для векторного подбора по тем же подаркам
+        # (см. build_catalog_index); None - подбор идёт по маскам
+        self.columns = columns
+
+        recipient_positions = {recipient: [] for recipient in RECIPIENT_FIELDS}
+        trend_positions: Dict[int, List[int]] = {}
+        marketplace_positions = []
+        consumable_positions = []
+        active_positions = []
+
+        for position, gift in enumerate(self.gifts):
+            # Скрытые подарки остаются в by_id для истории, но не подбираются
+            if gift.is_active is not False:
+                active_positions.append(position)
+
+            for recipient, field in RECIPIENT_FIELDS.items():
+                if getattr(gift, field):
+                    recipient_positions[recipient].append(position)
+
+            trend_score = gift.trend_score if gift.trend_score is not None else DEFAULT_TREND_SCORE
+            trend_positions.setdefault(trend_score, []).append(position)
+
+            if gift.marketplace_available:
+                marketplace_positions.append(position)
+            if gift.consumable:
+                consumable_positions.append(position)
+
+        self.recipient_masks = {
+            recipient: _mask_from_positions(positions, size)
+            for recipient, positions in recipient_positions.items()
+        }
+        self.trend_buckets = {
+            trend_score: _mask_from_positions(positions, size)
+            for trend_score, positions in trend_positions.items()
+        }
+        self.marketplace_mask = _mask_from_positions(marketplace_positions, size)
+        self.consumable_mask = _mask_from_positions(consumable_positions, size)
+        self.active_mask = _mask_from_positions(active_positions, size)
+        self.active_count = len(active_positions)
+
+    def __len__(self) -> int:
+        return len(self.gifts)
+
+    def trend_mask(self, min_trend: int, max_trend: int) -> int:
+        mask = 0
+        for trend_score, bucket in self.trend_buckets.items():
+            if min_trend <= trend_score <= max_trend:
+                mask |= bucket
+        return mask
+
+    def match_mask(
+            self,
+            recipient: Optional[str] = None,
+            marketplace: Optional[bool] = None,
+            consumable: Optional[bool] = None,
+            min_trend: Optional[int] = None,
+            max_trend: Optional[int] = None
+    ) -> int:
+        mask = self.active_mask
+
+        if recipient in self.recipient_masks:
+            mask &= self.recipient_masks[recipient]
+
+        if marketplace is not None:
+            mask &= self.marketplace_mask if marketplace else ~self.marketplace_mask
+
+        if consumable is not None:
+            mask &= self.consumable_mask if consumable else ~self.consumable_mask
+
+        if min_trend is not None or max_trend is not None:
+            mask &= self.trend_mask(
+                min_trend if min_trend is not None else min(self.trend_buckets, default=0),
+                max_trend if max_trend is not None else max(self.trend_buckets, default=0)
+            )
+
+        return mask & self.all_mask
+
+    def positions(self, mask: int) -> Iterable[int]:
+        data = mask.to_bytes(self._size_bytes, 'little')
+        for byte_index, value in enumerate(data):
+            if value:
+                base = byte_index << 3
+                for bit in _BYTE_POSITIONS[value]:
+                    yield base + bit
+
+    def gifts_for(self, mask: int) -> List[GiftView]:
+        gifts = self.gifts
+        return [gifts[position] for position in self.positions(mask)]
+
+    def get(self, gift_id: int) -> Optional[GiftView]:
+        return self.by_id.get(gift_id)
+
+    def get_many(self, gift_ids: Iterable[int]) -> List[GiftView]:
+        # Подарки, которых нет в текущем снимке каталога, пропускаются
+        by_id = self.by_id
+        return [by_id[gift_id] for gift_id in gift_ids if gift_id in by_id]
+
+
+_catalog_index = CatalogIndex(())
+_reload_lock = asyncio.Lock()
+# Версия каталога в базе, из которой построен _catalog_index
+CATALOG_VERSION = 'catalog_version'
+_catalog_version: Optional[int] = None
+_version_checked_at = 0.0
+
+
+def get_catalog_index() -> CatalogIndex:
+    return _catalog_index
+
+
+def build_catalog_index(gifts: Sequence[GiftView]) -> CatalogIndex:
+    # Импорт здесь: services.gift_columns сам зависит от этого модуля
+    from services.gift_columns import GiftColumns
+
+    gifts = sorted(gifts, key=lambda gift: gift.id)
+    columns = GiftColumns(gifts) if MATCHER_BACKEND == 'numpy' else None
+    return CatalogIndex(gifts, columns)
+
+
+async def load_catalog_gifts() -> List[GiftView]:
+    # Только нужные колонки, без создания ORM-объектов
+    columns = [Gift.__table__.c[field] for field in GiftView._fields]
+    async with read_session() as session:
+        result = await session.execute(select(*columns))
+        return [GiftView._make(row) for row in result]
+
+
+async def get_catalog_version() -> int:
+    async with read_session() as session:
+        return await session.scalar(select(Meta.value).where(Meta.key == CATALOG_VERSION)) or 0
+
+
+async def bump_catalog_version() -> int:
+    # Каталог изменён: остальные процессы бота перезагрузят его при следующей проверке
+    global _catalog_version
+
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            update(Meta).where(Meta.key == CATALOG_VERSION).values(value=Meta.value + 1)
+        )
+        if not result.rowcount:
+            await conn.execute(insert(Meta).values(key=CATALOG_VERSION, value=1))
+        version = await conn.scalar(select(Meta.value).where(Meta.key == CATALOG_VERSION))
+
+    # Этот процесс уже перестроил индекс после записи; если между ними каталог
+    # никто больше не менял, перезагружать его ещё раз незачем
+    if _catalog_version == version - 1:
+        _catalog_version = version
+    return version
+
+
+async def reload_catalog_index() -> CatalogIndex:
+    global _catalog_index, _catalog_version, _version_checked_at
+
+    # Индекс строится целиком и подменяется одной операцией присваивания,
+    # так что обработчики видят либо старый, либо новый каталог
+    async with _reload_lock:
+        # Версия читается до подарков: изменение между чтениями вызовет ещё одну перезагрузку
+        version = await get_catalog_version()
+        gifts = await load_catalog_gifts()
+        # Маски и колонки - чистые вычисления, строим их вместе вне цикла событий
+        index = await asyncio.to_thread(build_catalog_index, gifts)
+        _catalog_index = index
+        _catalog_version = version
+        _version_checked_at = time.monotonic()
+
+    logger.info(f"Индекс каталога перестроен: {index.active_count} активных из {len(index)} подарков")
+    return index
+
+
+async def refresh_catalog_index() -> bool:
+    # Каталог загружает один процесс бота, а обслуживают все. Перед обработкой
+    # обновлений версия в базе сверяется с загруженной не чаще раза в
+    # CATALOG_VERSION_CHECK_INTERVAL. Возвращает True, если индекс перестроен
+    global _version_checked_at
+
+    if time.monotonic() - _version_checked_at < CATALOG_VERSION_CHECK_INTERVAL:
+        return False
+    _version_checked_at = time.monotonic()
+
+    try:
+        version = await get_catalog_version()
+    except Exception as e:
+        # Работаем со старым каталогом, повторим при следующей проверке
+        logger.error(f"Не удалось проверить версию каталога: {e}")
+        return False
+    if version == _catalog_version:
+        return False
+
+    logger.info(f"Каталог изменён другим процессом (версия {_catalog_version} -> {version})")
+    await reload_catalog_index()
+    return True
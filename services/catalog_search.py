@@ -0,0 +1,97 @@
+import logging
+import re
+from typing import List, Optional, Sequence
+
+from sqlalchemy import or_, select, text
+
+from database.database import read_session, read_engine
+from database.models import FTS_COLUMNS, Gift
+from services.catalog_index import GiftView, get_catalog_index
+
+logger = logging.getLogger(__name__)
+
+
+# Больше слов в запросе не нужно, а длинный запрос FTS5 разбирает дольше
+MAX_QUERY_WORDS = 8
+# Веса колонок для bm25 (в порядке FTS_COLUMNS): совпадение в названии важнее,
+# чем в категории, а та - важнее, чем в описании
+RANK_WEIGHTS = {'name': 10.0, 'description': 1.0, 'category': 4.0, 'subcategory': 3.0}
+_BM25 = f"bm25(gifts_fts, {', '.join(str(RANK_WEIGHTS[column]) for column in FTS_COLUMNS)})"
+
+# None - ещё не проверяли, есть ли в базе таблица gifts_fts
+_fts_available: Optional[bool] = None
+
+
+def _words(query: str) -> List[str]:
+    return re.findall(r'\w+', query.lower().replace('ё', 'е'))[:MAX_QUERY_WORDS]
+
+
+def fts_query(query: str, columns: Sequence[str] = FTS_COLUMNS) -> Optional[str]:
+    # Каждое слово - префикс в кавычках, так что операторы FTS5 из ввода не действуют
+    words = _words(query)
+    if not words:
+        return None
+    terms = ' '.join(f'"{word}"*' for word in words)
+    if tuple(columns) == FTS_COLUMNS:
+        return terms
+    return f"{{{' '.join(columns)}}} : ({terms})"
+
+
+async def _check_fts() -> bool:
+    global _fts_available
+    if _fts_available is None:
+        if read_engine.dialect.name != 'sqlite':
+            _fts_available = False
+        else:
+            async with read_engine.connect() as conn:
+                found = await conn.scalar(text("SELECT 1 FROM sqlite_master WHERE name = 'gifts_fts'"))
+            _fts_available = bool(found)
+        if not _fts_available:
+            logger.warning("Индекс gifts_fts не найден, поиск по каталогу идёт через LIKE")
+    return _fts_available
+
+
+async def _search_ids_fts(match: str, limit: int, offset: int = 0) -> List[int]:
+    async with read_engine.connect() as conn:
+        result = await conn.execute(
+            # В индексе только активные подарки, соединение с gifts не нужно
+            text(
+                "SELECT rowid FROM gifts_fts WHERE gifts_fts MATCH :match "
+                f"ORDER BY {_BM25}, rowid LIMIT :limit OFFSET :offset"
+            ),
+            {'match': match, 'limit': limit, 'offset': offset}
+        )
+        return list(result.scalars())
+
+
+async def _search_ids_like(words: List[str], columns: Sequence[str], limit: int, offset: int = 0) -> List[int]:
+    # Запасной путь (PostgreSQL или SQLite без FTS5): все слова должны встретиться
+    # хотя бы в одной из колонок
+    conditions = [
+        or_(*(Gift.__table__.c[column].ilike(f"%{word}%") for column in columns))
+        for word in words
+    ]
+    async with read_session() as session:
+        result = await session.execute(
+            select(Gift.id).where(Gift.is_active, *conditions).order_by(Gift.name, Gift.id).limit(limit).offset(offset)
+        )
+        return list(result.scalars())
+
+
+async def search_gifts(
+        query: str,
+        limit: int = 10,
+        columns: Sequence[str] = FTS_COLUMNS,
+        offset: int = 0
+) -> List[GiftView]:
+    # Поиск по активному каталогу, лучшие совпадения первыми (bm25);
+    # подарки берутся из индекса каталога в памяти
+    match = fts_query(query, columns)
+    if match is None:
+        return []
+
+    if await _check_fts():
+        gift_ids = await _search_ids_fts(match, limit, offset)
+    else:
+        gift_ids = await _search_ids_like(_words(query), columns, limit, offset)
+    return get_catalog_index().get_many(gift_ids)
@@ -0,0 +1,211 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageOps
+
+from config.config import RENDITIONS_DIR, CATEGORY_PRESENTATION, COLLAGE_CACHE_SIZE
+from services import media_cache
+from services.image_pipeline import rendition_path
+from services.image_registry import resolve_image
+
+logger = logging.getLogger(__name__)
+
+
+COLLAGES_DIR = os.path.join(RENDITIONS_DIR, 'collages')
+TILE_SIZE = 320
+TILE_GAP = 8
+MAX_COLUMNS = 3
+COLLAGE_QUALITY = 85
+
+# ключ набора изображений -> путь к готовому коллажу, от давно не показанных к недавним.
+# Коллажи собираются в потоках, поэтому словарь защищён блокировкой
+_collages: 'OrderedDict[str, str]' = OrderedDict()
+_collages_lock = threading.Lock()
+_disk_scanned = False
+# путь к коллажу -> сколько обработчиков сейчас его отправляют; такие коллажи не вытесняются
+_in_use: Dict[str, int] = {}
+# Сборки, которые уже идут: одновременные запросы одного коллажа ждут одну задачу
+_pending: Dict[Tuple[Tuple[int, str, str], ...], asyncio.Task] = {}
+
+
+def _tile_source(image_name: str, source_path: str) -> str:
+    # Превью из services.image_pipeline намного легче исходника
+    thumb = rendition_path('thumb', image_name)
+    if os.path.exists(thumb) and os.path.getmtime(thumb) >= os.path.getmtime(source_path):
+        return thumb
+    return source_path
+
+
+def _collage_key(tiles: Sequence[Tuple[int, str]]) -> str:
+    # mtime в ключе: после замены исходника коллаж собирается заново
+    digest = hashlib.sha1()
+    for number, path in tiles:
+        digest.update(f"{number}:{path}:{os.path.getmtime(path)}\n".encode())
+    return digest.hexdigest()
+
+
+def build_collage(tiles: Sequence[Tuple[int, str]], output_path: str):
+    columns = min(len(tiles), MAX_COLUMNS)
+    rows = math.ceil(len(tiles) / columns)
+    width = columns * TILE_SIZE + (columns + 1) * TILE_GAP
+    height = rows * TILE_SIZE + (rows + 1) * TILE_GAP
+
+    collage = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(collage)
+
+    for position, (number, path) in enumerate(tiles):
+        row, column = divmod(position, columns)
+        x = TILE_GAP + column * (TILE_SIZE + TILE_GAP)
+        y = TILE_GAP + row * (TILE_SIZE + TILE_GAP)
+
+        with Image.open(path) as img:
+            tile = ImageOps.exif_transpose(img).convert('RGBA')
+        tile.thumbnail((TILE_SIZE, TILE_SIZE), Image.Resampling.LANCZOS)
+        collage.paste(
+            tile,
+            (x + (TILE_SIZE - tile.width) // 2, y + (TILE_SIZE - tile.height) // 2),
+            mask=tile.getchannel('A')
+        )
+
+        # Номер совпадает с номером подарка в подписи
+        draw.rectangle((x, y, x + 28, y + 28), fill=(0, 0, 0))
+        draw.text((x + 10, y + 8), str(number), fill=(255, 255, 255))
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.tmp"
+    collage.save(temp_path, 'JPEG', quality=COLLAGE_QUALITY, optimize=True)
+    os.replace(temp_path, output_path)
+
+
+def _scan_disk():
+    # Коллажи прошлых запусков тоже входят в лимит: старые по времени изменения вытесняются первыми
+    global _disk_scanned
+    if _disk_scanned:
+        return
+    _disk_scanned = True
+
+    found = []
+    for name in os.listdir(COLLAGES_DIR) if os.path.isdir(COLLAGES_DIR) else ():
+        path = os.path.join(COLLAGES_DIR, name)
+        if name.endswith('.jpg'):
+            try:
+                found.append((os.path.getmtime(path), name[:-len('.jpg')], path))
+            except OSError:
+                continue
+    for _, key, path in sorted(found):
+        _collages.setdefault(key, path)
+
+
+def _cached_collage(key: str) -> Optional[str]:
+    with _collages_lock:
+        _scan_disk()
+        path = _collages.get(key)
+        if path is not None:
+            _collages.move_to_end(key)
+        return path
+
+
+def _remember_collage(key: str, path: str):
+    with _collages_lock:
+        _scan_disk()
+        _collages[key] = path
+        _collages.move_to_end(key)
+
+
+def _take_evicted() -> List[str]:
+    # Давно не показанные коллажи сверх лимита, кроме тех, что сейчас отправляются
+    evicted = []
+    with _collages_lock:
+        excess = len(_collages) - COLLAGE_CACHE_SIZE
+        if excess > 0:
+            for key, path in list(_collages.items()):
+                if len(evicted) == excess:
+                    break
+                if not _in_use.get(path):
+                    del _collages[key]
+                    evicted.append(path)
+    return evicted
+
+
+async def evict_collages() -> int:
+    evicted = _take_evicted()
+    for path in evicted:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if evicted:
+        # file_id удалённых коллажей больше не понадобятся
+        await media_cache.forget_files(evicted)
+        logger.info(f"Удалено давно не показанных коллажей: {len(evicted)}")
+    return len(evicted)
+
+
+def _ensure_collage(images: List[Tuple[int, str, str]]) -> str:
+    tiles = [(number, _tile_source(image_name, path)) for number, image_name, path in images]
+    key = _collage_key(tiles)
+    cached = _cached_collage(key)
+    if cached and os.path.exists(cached):
+        return cached
+
+    path = os.path.join(COLLAGES_DIR, f"{key}.jpg")
+    if not os.path.exists(path):
+        build_collage(tiles, path)
+        logger.info(f"Собран коллаж из {len(tiles)} изображений: {path}")
+    _remember_collage(key, path)
+    return path
+
+
+async def _collage(images: List[Tuple[int, str, str]]) -> str:
+    key = tuple(images)
+    task = _pending.get(key)
+    if task is None:
+        task = asyncio.create_task(asyncio.to_thread(_ensure_collage, images))
+        _pending[key] = task
+        task.add_done_callback(lambda _: _pending.pop(key, None))
+    return await task
+
+
+@contextlib.asynccontextmanager
+async def category_image(gifts) -> AsyncIterator[Optional[str]]:
+    # Одна картинка на страницу категории: единственное фото или коллаж из всех фото.
+    # Пока открыт контекст, коллаж не вытесняется: обработчик успеет его отправить
+    images = [
+        (number, str(gift.image_name), resolve_image(gift.image_name))
+        for number, gift in enumerate(gifts, 1)
+    ]
+    images = [image for image in images if image[2]]
+
+    if not images:
+        yield None
+        return
+    if len(images) == 1 or CATEGORY_PRESENTATION != 'collage':
+        yield images[0][2]
+        return
+
+    try:
+        path = await _collage(images)
+        # Вытеснение идёт только в цикле событий, поэтому между сборкой и отметкой
+        # файл мог исчезнуть лишь из-за вытеснения в другой задаче - собираем заново
+        if not os.path.exists(path):
+            path = await _collage(images)
+    except Exception as e:
+        logger.error(f"Не удалось собрать коллаж: {e}")
+        yield None
+        return
+
+    _in_use[path] = _in_use.get(path, 0) + 1
+    try:
+        await evict_collages()
+        yield path
+    finally:
+        _in_use[path] -= 1
+        if not _in_use[path]:
+            del _in_use[path]
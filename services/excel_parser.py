@@ -1,10 +1,25 @@
-import numpy as np
+import openpyxl
 import pandas as pd
-from database.database import get_session, async_session
-from database.models import Gift
-from typing import List, Dict, Any
+from config.config import IMPORT_WORKERS, IMPORT_PROGRESS_INTERVAL
+from database.database import engine
+from database.models import Gift, SelectionGift
+from services import catalog_browser
+from services.catalog_index import bump_catalog_version, reload_catalog_index
+from services.image_pipeline import process_catalog_images
+from services.image_registry import reload_image_registry
+from typing import List, Dict, Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
 import logging
-from sqlalchemy import delete
+import multiprocessing
+import queue
+import time
+from sqlalchemy import bindparam, delete, func, insert, select, update
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +46,8 @@ COLUMN_MAPPING = {
     'for_father': 'Отцу',
     'for_man': 'Мужчина',
     'for_woman': 'Женщина',
-    'image_name': 'Фото'
+    'image_name': 'Фото',
+    'sku': 'Артикул'
 }
 
 class ExcelParser:
@@ -82,7 +98,8 @@ class ExcelParser:
             'for_father': self._process_boolean_field(row[18]),
             'for_man': self._process_boolean_field(row[19]),
             'for_woman': self._process_boolean_field(row[20]),
-            'image_name': str(row[21])
+            'image_name': str(row[21]),
+            'sku': ''
         }
 
     async def process_file(self) -> bool:
@@ -101,15 +118,7 @@ class ExcelParser:
                     logger.error(f"Ошибка обработки строки {row}: {str(e)}")
                     continue
 
-            async with get_session() as session:
-                # Очищаем текущую базу подарков
-                await session.execute(delete(Gift))
-
-                # Добавляем новые подарки
-                for gift_data in gifts_data:
-                    gift = Gift(**gift_data)
-                    session.add(gift)
-
+            await import_catalog([gifts_data])
             logger.info(f"Успешно обработано {len(gifts_data)} подарков")
             return True
 
@@ -118,57 +127,497 @@ class ExcelParser:
             return False
 
 
-async def process_excel_file(file_path: str) -> bool:
+def _text_column(values: List[Any]) -> List[str]:
+    return ['' if value is None else str(value).strip() for value in values]
+
+
+def _name_column(values: List[Any]) -> List[str]:
+    # Имена файлов часто приходят числами: 1 или 1.0 должны дать "1"
+    return [
+        '' if value is None
+        else str(int(value)) if isinstance(value, float) and value.is_integer()
+        else str(value).strip()
+        for value in values
+    ]
+
+
+def _boolean_column(values: List[Any]) -> List[bool]:
+    return [value is True or str(value).strip().lower() == 'да' for value in values]
+
+
+def _float_column(values: List[Any], default: float = 0) -> List[float]:
+    result = []
+    for value in values:
+        try:
+            result.append(float(value))
+        except (TypeError, ValueError):
+            result.append(default)
+    return result
+
+
+def _int_column(values: List[Any], default: int = 5) -> List[int]:
+    return [int(value) for value in _float_column(values, default)]
+
+
+COLUMN_CONVERTERS = {
+    'name': _text_column,
+    'description': _text_column,
+    'category': _text_column,
+    'subcategory': _text_column,
+    'link': _text_column,
+    'age_range': _text_column,
+    'price': _float_column,
+    'city': _text_column,
+    'marketplace_available': _boolean_column,
+    'trend_score': _int_column,
+    'consumable': _boolean_column,
+    'creativity_score': _int_column,
+    'for_friend': _boolean_column,
+    'for_wife': _boolean_column,
+    'for_sister': _boolean_column,
+    'for_mother': _boolean_column,
+    'for_husband': _boolean_column,
+    'for_brother': _boolean_column,
+    'for_father': _boolean_column,
+    'for_man': _boolean_column,
+    'for_woman': _boolean_column,
+    'image_name': _name_column,
+    'sku': _name_column
+}
+
+# Поля, по которым решается, изменилась ли строка каталога
+SYNC_FIELDS = tuple(COLUMN_CONVERTERS)
+
+REQUIRED_COLUMNS = ('name', 'category', 'price')
+IMPORT_CHUNK_SIZE = 2000
+# Сколько разобранных чанков может ждать записи: больше в памяти не окажется
+IMPORT_QUEUE_SIZE = 4
+_QUEUE_POLL_SECONDS = 0.5
+
+# Чанки для записи: список (разбор в этом процессе) или поток из обработчика
+ChunkSource = Union[Iterable[List[Dict[str, Any]]], AsyncIterable[List[Dict[str, Any]]]]
+
+
+def _convert_chunk(positions: Dict[str, int], rows: List[tuple]) -> List[Dict[str, Any]]:
+    # Преобразуем сразу целые колонки, а не каждую ячейку по отдельности
+    columns = {}
+    for field, converter in COLUMN_CONVERTERS.items():
+        index = positions.get(field)
+        if index is None:
+            raw = [None] * len(rows)
+        else:
+            raw = [row[index] if index < len(row) else None for row in rows]
+        columns[field] = converter(raw)
+
+    fields = list(columns)
+    return [
+        dict(zip(fields, values))
+        for values in zip(*columns.values())
+        if values[0]  # строки без названия пропускаем
+    ]
+
+
+def iter_excel_chunks(file_path: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    # read_only-режим openpyxl читает лист потоково и не держит его в памяти
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(file_path)
-        df = df.rename(columns={v: k for k, v in COLUMN_MAPPING.items()})
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
 
-        # Преобразование boolean полей
-        boolean_columns = ['marketplace_available', 'consumable', 'for_friend', 'for_wife',
-                           'for_sister', 'for_mother', 'for_husband', 'for_brother',
-                           'for_father', 'for_man', 'for_woman']
+        field_by_title = {title: field for field, title in COLUMN_MAPPING.items()}
+        positions = {}
+        for index, title in enumerate(header):
+            field = field_by_title.get(str(title).strip()) if title is not None else None
+            if field and field not in positions:
+                positions[field] = index
 
-        for col in boolean_columns:
-            df[col] = df[col].map({'Да': True, 'Нет': False, np.nan: False})
+        missing = [COLUMN_MAPPING[field] for field in REQUIRED_COLUMNS if field not in positions]
+        if missing:
+            raise ValueError(f"Отсутствуют обязательные колонки: {', '.join(missing)}")
 
-        # Преобразование числовых полей
-        df['price'] = pd.to_numeric(df['price'], errors='coerce')
-        df['trend_score'] = pd.to_numeric(df['trend_score'], errors='coerce')
-        df['creativity_score'] = pd.to_numeric(df['creativity_score'], errors='coerce')
+        chunk = []
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield _convert_chunk(positions, chunk)
+                chunk = []
+        if chunk:
+            yield _convert_chunk(positions, chunk)
+    finally:
+        workbook.close()
 
-        async with async_session() as session:
-            await session.execute(delete(Gift))
 
-            for _, row in df.iterrows():
-                gift = Gift(
-                    name=str(row['name']),
-                    description=str(row['description']),
-                    category=str(row['category']),
-                    subcategory=str(row.get('subcategory', '')),
-                    link=str(row.get('link', '')),
-                    age_range=str(row.get('age_range', '')),
-                    price=float(row['price']) if pd.notna(row['price']) else 0,
-                    city=str(row['city']),
-                    marketplace_available=bool(row['marketplace_available']),
-                    trend_score=int(row['trend_score']) if pd.notna(row['trend_score']) else 5,
-                    consumable=bool(row['consumable']),
-                    creativity_score=int(row['creativity_score']) if pd.notna(row['creativity_score']) else 5,
-                    for_friend=bool(row['for_friend']),
-                    for_wife=bool(row['for_wife']),
-                    for_sister=bool(row['for_sister']),
-                    for_mother=bool(row['for_mother']),
-                    for_husband=bool(row['for_husband']),
-                    for_brother=bool(row['for_brother']),
-                    for_father=bool(row['for_father']),
-                    for_man=bool(row['for_man']),
-                    for_woman=bool(row['for_woman']),
-                    image_name=str(row.get('image_name', ''))
-                )
-                session.add(gift)
-
-            await session.commit()
+def _reset_peak_memory() -> bool:
+    # Обнуляет пиковый RSS процесса (Linux 4.0+), чтобы пик относился к одному импорту:
+    # обработчик живёт в пуле и разбирает файлы много раз
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory_mb() -> float:
+    # Пиковый RSS процесса; tracemalloc точнее, но замедляет разбор в разы
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _put(chunk_queue, cancel_event, item) -> bool:
+    # Очередь ограничена: обработчик ждёт, пока основной процесс запишет прошлые чанки
+    while True:
+        try:
+            chunk_queue.put(item, timeout=_QUEUE_POLL_SECONDS)
             return True
+        except queue.Full:
+            if cancel_event.is_set():
+                return False
+
+
+def parse_excel_file(file_path: str, chunk_queue, cancel_event) -> int:
+    # Выполняется в дочернем процессе: чанки по одному уходят через очередь,
+    # целиком каталог не накапливается ни здесь, ни в основном процессе
+    per_import = _reset_peak_memory()
+    rows = 0
+    for chunk in iter_excel_chunks(file_path):
+        if not _put(chunk_queue, cancel_event, ('chunk', chunk)):
+            return rows
+        rows += len(chunk)
+    _put(chunk_queue, cancel_event, ('done', peak_memory_mb(), per_import))
+    return rows
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_manager = None
+# fork копировал бы работающий цикл событий и потоки aiosqlite вместе с их
+# блокировками; spawn запускает обработчики с чистого интерпретатора
+_mp_context = multiprocessing.get_context('spawn')
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMPORT_WORKERS, mp_context=_mp_context)
+    return _executor
+
+
+def _get_manager():
+    global _manager
+    if _manager is None:
+        _manager = _mp_context.Manager()
+    return _manager
+
+
+def shutdown_import_workers():
+    global _executor, _manager
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
+
+
+class WorkerChunks:
+    # Чанки каталога из процесса-обработчика по мере разбора. Очередь менеджера -
+    # это синхронные обращения к другому процессу, поэтому читается она в потоке,
+    # а не в цикле событий
+    def __init__(
+            self,
+            file_path: str,
+            on_progress: Optional[Callable[[str, int], Awaitable[None]]] = None
+    ):
+        self.file_path = file_path
+        self.on_progress = on_progress
+        self.rows = 0
+        self.peak_memory_mb = 0.0
+        # 'import' - пик именно этого импорта, 'worker' - за всё время жизни обработчика
+        self.peak_memory_scope = 'worker'
+        self.parsed_at = 0.0
+        self._cancel_event = None
+        self._finished = False
+
+    async def _get(self, loop, chunk_queue, future):
+        while True:
+            try:
+                return await loop.run_in_executor(None, chunk_queue.get, True, _QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                if future.done():
+                    # Ошибка разбора приходит через future; без неё обработчик
+                    # не мог завершиться, не отправив итог
+                    future.result()
+                    raise RuntimeError("Обработчик Excel завершился, не передав итог разбора")
+
+    async def __aiter__(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        manager = _get_manager()
+        chunk_queue = manager.Queue(maxsize=IMPORT_QUEUE_SIZE)
+        self._cancel_event = manager.Event()
+        future = loop.run_in_executor(
+            _get_executor(), parse_excel_file, self.file_path, chunk_queue, self._cancel_event
+        )
+
+        reported_at = loop.time()
+        while True:
+            message = await self._get(loop, chunk_queue, future)
+            if message[0] == 'done':
+                _, self.peak_memory_mb, per_import = message
+                self.peak_memory_scope = 'import' if per_import else 'worker'
+                self._finished = True
+                self.parsed_at = time.perf_counter()
+                break
+
+            chunk = message[1]
+            self.rows += len(chunk)
+            yield chunk
+
+            if self.on_progress and loop.time() - reported_at >= IMPORT_PROGRESS_INTERVAL:
+                reported_at = loop.time()
+                await self.on_progress('parsing', self.rows)
+
+        await future
+        if self.on_progress:
+            await self.on_progress('writing', self.rows)
+
+    async def cancel(self):
+        # Запись прервалась: обработчик не должен вечно ждать места в очереди
+        if self._cancel_event is not None and not self._finished:
+            await asyncio.get_running_loop().run_in_executor(None, self._cancel_event.set)
+
+
+async def _iterate(chunks: ChunkSource) -> AsyncIterator[List[Dict[str, Any]]]:
+    if hasattr(chunks, '__aiter__'):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+def _natural_key(data) -> tuple:
+    # Явный артикул надёжнее, но старые таблицы его не содержат
+    if data['sku']:
+        return 'sku', data['sku']
+    return 'name_link', data['name'], data['link']
+
+
+async def _write(statement, rows: List[Dict[str, Any]]):
+    # Каждая пачка пишется в своей короткой транзакции: блокировка записи SQLite
+    # не держится всё время разбора, и запись подборок не упирается в busy_timeout
+    async with engine.begin() as conn:
+        await conn.execute(statement, rows)
+
+
+async def replace_catalog(chunks: ChunkSource) -> Dict[str, int]:
+    # Полная перезагрузка: меняет id всех подарков, поэтому используется только явно.
+    # Новые строки пишутся скрытыми по мере разбора, старый каталог подменяется
+    # новым одной короткой транзакцией в конце
+    async with engine.connect() as conn:
+        last_old_id = await conn.scalar(select(func.max(Gift.id))) or 0
+
+    added = 0
+    try:
+        async for chunk in _iterate(chunks):
+            if chunk:
+                await _write(insert(Gift), [{**data, 'is_active': False} for data in chunk])
+                added += len(chunk)
+    except Exception:
+        # Недописанный каталог ещё никому не виден - убираем его
+        async with engine.begin() as conn:
+            await conn.execute(delete(Gift).where(Gift.id > last_old_id))
+        raise
+
+    # Подарки из истории подборок скрываются: внешний ключ (его проверяет PostgreSQL)
+    # не даёт их удалить
+    referenced = select(SelectionGift.gift_id)
+    old = Gift.id <= last_old_id
+    async with engine.begin() as conn:
+        await conn.execute(update(Gift).where(old, Gift.id.in_(referenced)).values(is_active=False))
+        await conn.execute(delete(Gift).where(old, Gift.id.not_in(referenced)))
+        await conn.execute(update(Gift).where(Gift.id > last_old_id).values(is_active=True))
+
+    return {'added': added, 'updated': 0, 'deactivated': 0, 'unchanged': 0, 'duplicates': 0}
+
+
+async def sync_catalog(chunks: ChunkSource) -> Dict[str, int]:
+    # Разбор и сравнение идут вне транзакций; изменения пишутся пачками, каждая
+    # в своей транзакции. Прерванный импорт оставляет уже записанные пачки, а
+    # скрытие пропавших подарков выполняется последним, так что повторная
+    # загрузка того же файла доводит каталог до нужного состояния
+    table = Gift.__table__
+    fields = list(SYNC_FIELDS)
+
+    # Текущее состояние каталога держим в памяти в виде кортежей, без ORM
+    by_sku = {}
+    by_name_link = {}
+    active_ids = set()
+    async with engine.connect() as conn:
+        result = await conn.execute(select(table.c.id, table.c.is_active, *[table.c[field] for field in fields]))
+        rows = result.all()
+    for row in rows:
+        # NULL в старых строках равнозначен пустой ячейке таблицы
+        values = {field: '' if value is None else value for field, value in zip(fields, row[2:])}
+        existing = (row.id, row.is_active, values)
+        if values['sku']:
+            by_sku[values['sku']] = existing
+        else:
+            by_name_link[(values['name'], values['link'])] = existing
+        if row.is_active:
+            active_ids.add(row.id)
+    del rows
+
+    stats = {'added': 0, 'updated': 0, 'deactivated': 0, 'unchanged': 0, 'duplicates': 0}
+    seen_ids = set()
+    pending_keys = set()
+    inserts = []
+    updates = []
+
+    update_statement = (
+        update(table)
+        .where(table.c.id == bindparam('gift_id'))
+        .values({field: bindparam(field) for field in fields + ['is_active']})
+    )
+
+    async for chunk in _iterate(chunks):
+        for data in chunk:
+            existing = None
+            if data['sku']:
+                existing = by_sku.get(data['sku'])
+            if existing is None:
+                # Строка без артикула раньше могла быть сопоставлена по названию и ссылке
+                candidate = by_name_link.get((data['name'], data['link']))
+                if candidate is not None and (not data['sku'] or not candidate[2]['sku']):
+                    existing = candidate
+
+            if existing is None:
+                key = _natural_key(data)
+                if key in pending_keys:
+                    stats['duplicates'] += 1
+                    continue
+                pending_keys.add(key)
+                inserts.append({**data, 'is_active': True})
+                continue
+
+            gift_id, is_active, values = existing
+            if gift_id in seen_ids:
+                stats['duplicates'] += 1
+                continue
+            seen_ids.add(gift_id)
+
+            if is_active and all(values[field] == data[field] for field in fields):
+                stats['unchanged'] += 1
+                continue
+
+            updates.append({'gift_id': gift_id, **data, 'is_active': True})
+
+        # Отдаём управление циклу событий между чанками
+        await asyncio.sleep(0)
+
+        if len(inserts) >= IMPORT_CHUNK_SIZE:
+            await _write(insert(table), inserts)
+            stats['added'] += len(inserts)
+            inserts = []
+        if len(updates) >= IMPORT_CHUNK_SIZE:
+            await _write(update_statement, updates)
+            stats['updated'] += len(updates)
+            updates = []
+
+    if inserts:
+        await _write(insert(table), inserts)
+        stats['added'] += len(inserts)
+    if updates:
+        await _write(update_statement, updates)
+        stats['updated'] += len(updates)
+
+    # Подарки, которых нет в новой таблице, скрываем
+    missing_ids = sorted(active_ids - seen_ids)
+    if missing_ids:
+        async with engine.begin() as conn:
+            for start in range(0, len(missing_ids), IMPORT_CHUNK_SIZE):
+                batch = missing_ids[start:start + IMPORT_CHUNK_SIZE]
+                await conn.execute(update(table).where(table.c.id.in_(batch)).values(is_active=False))
+    stats['deactivated'] = len(missing_ids)
+
+    return stats
+
+
+IMPORT_MODES = {
+    'sync': sync_catalog,
+    'replace': replace_catalog
+}
+
+
+_import_lock = asyncio.Lock()
+
+
+async def import_catalog(chunks: ChunkSource, mode: str = 'sync') -> Dict[str, int]:
+    # Импорты пишут пачками в нескольких транзакциях, поэтому не должны пересекаться
+    async with _import_lock:
+        stats = await IMPORT_MODES[mode](chunks)
+
+    await reload_catalog_index()
+    catalog_browser.invalidate_prefetched()
+
+    try:
+        # Вместе с каталогом обычно обновляют и фотографии
+        try:
+            stats['images'] = await process_catalog_images()
+        except Exception as e:
+            logger.error(f"Ошибка подготовки изображений каталога: {e}")
+        await asyncio.to_thread(reload_image_registry)
+    finally:
+        # Остальные процессы бота перезагрузят каталог и изображения при проверке версии
+        await bump_catalog_version()
+    return stats
+
+
+async def process_excel_file(
+        file_path: str,
+        mode: str = 'sync',
+        on_progress: Optional[Callable[[str, int], Awaitable[None]]] = None
+) -> Optional[Dict[str, Any]]:
+    started = time.perf_counter()
+
+    try:
+        # Разбор и проверка файла идут в отдельном процессе, чанки записываются
+        # по мере разбора, в цикле событий остаётся только запись в базу
+        chunks = WorkerChunks(file_path, on_progress)
+        try:
+            stats = await import_catalog(chunks, mode)
+        finally:
+            await chunks.cancel()
+
+        rows = chunks.rows
+        seconds = time.perf_counter() - started
+        stats.update({
+            'rows': rows,
+            'seconds': seconds,
+            'parse_seconds': chunks.parsed_at - started,
+            'rows_per_sec': rows / seconds if seconds else 0,
+            'peak_memory_mb': chunks.peak_memory_mb,
+            'peak_memory_scope': chunks.peak_memory_scope
+        })
+        logger.info(
+            f"Импорт каталога ({mode}): {stats['rows']} строк за {stats['seconds']:.2f} с "
+            f"(разбор {stats['parse_seconds']:.2f} с, {stats['rows_per_sec']:.0f} строк/с), "
+            f"пик памяти обработчика {stats['peak_memory_mb']:.1f} МБ "
+            f"({'за этот импорт' if stats['peak_memory_scope'] == 'import' else 'за всё время его работы'}); "
+            f"добавлено {stats['added']}, обновлено {stats['updated']}, "
+            f"скрыто {stats['deactivated']}, без изменений {stats['unchanged']}"
+        )
+        return stats
 
     except Exception as e:
         logging.error(f"Ошибка обработки файла: {str(e)}")
-        return False
\ No newline at end of file
+        return None
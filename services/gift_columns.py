@@ -0,0 +1,57 @@
+from typing import Sequence
+
+import numpy as np
+
+from services.catalog_index import (
+    GiftView,
+    RECIPIENT_FIELDS,
+    DEFAULT_TREND_SCORE,
+    DEFAULT_CREATIVITY_SCORE,
+    parse_age_range
+)
+
+# Номер бита получателя в упакованной маске recipients
+RECIPIENT_BITS = {recipient: 1 << bit for bit, recipient in enumerate(RECIPIENT_FIELDS)}
+
+
+class GiftColumns:
+    # Колоночное представление каталога: позиция в массивах совпадает с позицией
+    # подарка в CatalogIndex.gifts, поэтому подарки передаются упорядоченными по id
+
+    def __init__(self, gifts: Sequence[GiftView]):
+        count = len(gifts)
+
+        self.ids = np.fromiter((gift.id for gift in gifts), dtype=np.int64, count=count)
+        self.price = np.fromiter((gift.price or 0 for gift in gifts), dtype=np.float64, count=count)
+        self.trend = np.fromiter(
+            (DEFAULT_TREND_SCORE if gift.trend_score is None else gift.trend_score for gift in gifts),
+            dtype=np.int16, count=count
+        )
+        self.creativity = np.fromiter(
+            (DEFAULT_CREATIVITY_SCORE if gift.creativity_score is None else gift.creativity_score for gift in gifts),
+            dtype=np.int16, count=count
+        )
+
+        age_ranges = np.array([parse_age_range(gift.age_range) for gift in gifts], dtype=np.int16).reshape(count, 2)
+        self.age_min = age_ranges[:, 0]
+        self.age_max = age_ranges[:, 1]
+
+        self.marketplace = np.fromiter((bool(gift.marketplace_available) for gift in gifts), dtype=bool, count=count)
+        self.consumable = np.fromiter((bool(gift.consumable) for gift in gifts), dtype=bool, count=count)
+        self.active = np.fromiter((gift.is_active is not False for gift in gifts), dtype=bool, count=count)
+
+        # Девять флагов получателя упакованы в одно 16-битное число на подарок
+        self.recipients = np.zeros(count, dtype=np.uint16)
+        for recipient, field in RECIPIENT_FIELDS.items():
+            flags = np.fromiter((bool(getattr(gift, field)) for gift in gifts), dtype=bool, count=count)
+            self.recipients[flags] |= RECIPIENT_BITS[recipient]
+
+        # Коды категорий упорядочены по названию, что даёт детерминированный тай-брейк
+        self.categories, self.category_codes = np.unique(
+            np.array([gift.category for gift in gifts], dtype=object),
+            return_inverse=True
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
@@ -1,95 +1,242 @@
-from database.database import get_session
-from database.models import Gift
-from sqlalchemy import select, and_, or_, func
-from typing import List, Dict, Any
+import heapq
 import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from config.config import MAX_GIFTS_PER_CATEGORY, MATCHER_BACKEND
+from services.catalog_index import (
+    GiftView,
+    get_catalog_index,
+    CatalogIndex,
+    RECIPIENT_FIELDS,
+    DEFAULT_TREND_SCORE,
+    DEFAULT_CREATIVITY_SCORE
+)
+from services.gift_columns import RECIPIENT_BITS
 
 logger = logging.getLogger(__name__)
 
 
+# Веса слагаемых расстояния. None означает жёсткий фильтр вместо штрафа
+WEIGHTS = {
+    'budget': 3.0,
+    'age': 2.0,
+    'trend': 1.0,
+    'creativity': 0.5,
+    'marketplace': None,
+    'consumable': None
+}
+
+# Допустимое отклонение трендовости (раньше - точное совпадение, затем ±2)
+MAX_TREND_DISTANCE = 2
+# Сколько лет вне возрастного диапазона считается единицей расстояния
+AGE_SCALE = 10
+MAX_CATEGORIES = 3
+
+
 class GiftFinder:
-    def __init__(self, criteria: Dict[str, Any]):
+    def __init__(self, criteria: Dict[str, Any], weights: Optional[Dict[str, Optional[float]]] = None):
         self.criteria = criteria
-        self.filters = []
-
-    def _add_price_filter(self):
-        if self.criteria.get('budget', 0) > 0:
-            budget = float(self.criteria['budget'])
-            min_price = budget - 1000
-            max_price = budget + 1000
-            self.filters.append(Gift.price.between(min_price, max_price))
-
-    def _add_age_filter(self):
-        if 'age' in self.criteria:
-            age = int(self.criteria['age'])
-            self.filters.append(Gift.age_range.contains(str(age)))
-
-    def _add_recipient_filter(self):
-        recipient_mapping = {
-            'friend': Gift.for_friend,
-            'wife': Gift.for_wife,
-            'sister': Gift.for_sister,
-            'mother': Gift.for_mother,
-            'husband': Gift.for_husband,
-            'brother': Gift.for_brother,
-            'father': Gift.for_father,
-            'man': Gift.for_man,
-            'woman': Gift.for_woman
-        }
-
-        if recipient := self.criteria.get('recipient'):
-            if recipient in recipient_mapping:
-                self.filters.append(recipient_mapping[recipient] == True)
+        self.weights = {**WEIGHTS, **(weights or {})}
 
-    def _add_marketplace_filter(self):
-        if 'marketplace' in self.criteria:
-            self.filters.append(Gift.marketplace_available == self.criteria['marketplace'])
+    def _candidate_mask(self, catalog: CatalogIndex) -> int:
+        recipient = self.criteria.get('recipient')
+        mask = catalog.match_mask(
+            recipient=recipient if recipient in RECIPIENT_FIELDS else None,
+            marketplace=self.criteria.get('marketplace') if self.weights['marketplace'] is None else None,
+            consumable=self.criteria.get('consumable') if self.weights['consumable'] is None else None
+        )
 
-    def _add_trend_filter(self):
         if 'trend_score' in self.criteria:
             trend_score = int(self.criteria['trend_score'])
-            min_trend = max(1, trend_score - 1)
-            max_trend = min(10, trend_score + 1)
-            self.filters.append(Gift.trend_score.between(min_trend, max_trend))
-
-    def _add_consumable_filter(self):
-        if 'consumable' in self.criteria:
-            self.filters.append(Gift.consumable == self.criteria['consumable'])
-
-    async def find_gifts(self, limit_per_category: int = 2) -> Dict[str, List[Gift]]:
-        self._add_price_filter()
-        self._add_age_filter()
-        self._add_recipient_filter()
-        self._add_marketplace_filter()
-        self._add_trend_filter()
-        self._add_consumable_filter()
-
-        async with get_session() as session:
-            # Получаем все подходящие подарки
-            query = select(Gift).where(and_(*self.filters))
-            result = await session.execute(query)
-            gifts = result.scalars().all()
-
-            # Группируем по категориям
-            categorized_gifts = {}
-            for gift in gifts:
-                if gift.category not in categorized_gifts:
-                    categorized_gifts[gift.category] = []
-                if len(categorized_gifts[gift.category]) < limit_per_category:
-                    categorized_gifts[gift.category].append(gift)
-
-            # Сортируем категории по количеству подарков и берем топ-3
-            sorted_categories = dict(
-                sorted(
-                    categorized_gifts.items(),
-                    key=lambda x: len(x[1]),
-                    reverse=True
-                )[:3]
+            mask &= catalog.trend_mask(trend_score - MAX_TREND_DISTANCE, trend_score + MAX_TREND_DISTANCE)
+
+        return mask
+
+    def _score(self, gift: GiftView, age_range: Tuple[int, int]) -> float:
+        criteria = self.criteria
+        weights = self.weights
+        score = 0.0
+
+        budget = float(criteria.get('budget') or 0)
+        if budget > 0:
+            score += weights['budget'] * abs(gift.price - budget) / budget
+
+        if criteria.get('age') is not None:
+            age = int(criteria['age'])
+            min_age, max_age = age_range
+            if age < min_age:
+                score += weights['age'] * (min_age - age) / AGE_SCALE
+            elif age > max_age:
+                score += weights['age'] * (age - max_age) / AGE_SCALE
+
+        if 'trend_score' in criteria:
+            trend_score = gift.trend_score if gift.trend_score is not None else DEFAULT_TREND_SCORE
+            score += weights['trend'] * abs(trend_score - int(criteria['trend_score']))
+
+        if criteria.get('creativity_score') is not None:
+            creativity_score = gift.creativity_score if gift.creativity_score is not None else DEFAULT_CREATIVITY_SCORE
+            score += weights['creativity'] * abs(creativity_score - int(criteria['creativity_score']))
+
+        for flag, field in (('marketplace', 'marketplace_available'), ('consumable', 'consumable')):
+            if weights[flag] is not None and flag in criteria and bool(getattr(gift, field)) != criteria[flag]:
+                score += weights[flag]
+
+        return score
+
+    def rank(
+            self,
+            catalog: CatalogIndex,
+            limit_per_category: int = MAX_GIFTS_PER_CATEGORY,
+            max_categories: int = MAX_CATEGORIES
+    ) -> Dict[str, List[GiftView]]:
+        # Один проход по кандидатам: в каждой категории держим кучу из лучших
+        # limit_per_category подарков (max-heap по (score, id) через инверсию знака)
+        heaps: Dict[str, list] = {}
+        gifts = catalog.gifts
+        age_ranges = catalog.age_ranges
+
+        for position in catalog.positions(self._candidate_mask(catalog)):
+            gift = gifts[position]
+            entry = (-self._score(gift, age_ranges[position]), -gift.id, position)
+            heap = heaps.setdefault(gift.category, [])
+            if len(heap) < limit_per_category:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        ranked = {
+            category: [(-score, -negative_id, position) for score, negative_id, position in heap]
+            for category, heap in heaps.items()
+        }
+        for entries in ranked.values():
+            entries.sort()
+
+        # Категории упорядочиваем по лучшему подарку, при равенстве - по названию
+        categories = heapq.nsmallest(
+            max_categories,
+            ranked,
+            key=lambda category: (ranked[category][0][0], category)
+        )
+
+        return {
+            category: [gifts[position] for _, _, position in ranked[category]]
+            for category in categories
+        }
+
+    async def find_gifts(
+            self,
+            limit_per_category: int = MAX_GIFTS_PER_CATEGORY,
+            max_categories: int = MAX_CATEGORIES
+    ) -> Dict[str, List[GiftView]]:
+        result = self.rank(get_catalog_index(), limit_per_category, max_categories)
+        logger.debug(f"Criteria: {self.criteria}, categories found: {len(result)}")
+        return result
+
+
+class VectorGiftFinder(GiftFinder):
+    # Тот же алгоритм ранжирования, но расчёт по всем кандидатам ведётся
+    # векторными операциями NumPy над колоночным представлением каталога
+
+    def _candidate_positions(self, columns) -> np.ndarray:
+        criteria = self.criteria
+        mask = columns.active.copy()
+
+        recipient = criteria.get('recipient')
+        if recipient in RECIPIENT_BITS:
+            mask &= (columns.recipients & RECIPIENT_BITS[recipient]) != 0
+
+        if self.weights['marketplace'] is None and criteria.get('marketplace') is not None:
+            mask &= columns.marketplace == bool(criteria['marketplace'])
+        if self.weights['consumable'] is None and criteria.get('consumable') is not None:
+            mask &= columns.consumable == bool(criteria['consumable'])
+
+        if 'trend_score' in criteria:
+            mask &= np.abs(columns.trend - int(criteria['trend_score'])) <= MAX_TREND_DISTANCE
+
+        return np.flatnonzero(mask)
+
+    def _scores(self, columns, positions: np.ndarray) -> np.ndarray:
+        # Порядок слагаемых совпадает с GiftFinder._score, чтобы баллы были побитово равны
+        criteria = self.criteria
+        weights = self.weights
+        scores = np.zeros(len(positions), dtype=np.float64)
+
+        budget = float(criteria.get('budget') or 0)
+        if budget > 0:
+            scores += weights['budget'] * np.abs(columns.price[positions] - budget) / budget
+
+        if criteria.get('age') is not None:
+            age = int(criteria['age'])
+            below = np.maximum(columns.age_min[positions].astype(np.float64) - age, 0)
+            above = np.maximum(age - columns.age_max[positions].astype(np.float64), 0)
+            scores += weights['age'] * (below + above) / AGE_SCALE
+
+        if 'trend_score' in criteria:
+            scores += weights['trend'] * np.abs(columns.trend[positions].astype(np.float64) - int(criteria['trend_score']))
+
+        if criteria.get('creativity_score') is not None:
+            scores += weights['creativity'] * np.abs(
+                columns.creativity[positions].astype(np.float64) - int(criteria['creativity_score'])
             )
 
-            return sorted_categories
+        for flag, column in (('marketplace', columns.marketplace), ('consumable', columns.consumable)):
+            if weights[flag] is not None and flag in criteria:
+                scores += weights[flag] * (column[positions] != bool(criteria[flag]))
+
+        return scores
+
+    def rank(
+            self,
+            catalog: CatalogIndex,
+            limit_per_category: int = MAX_GIFTS_PER_CATEGORY,
+            max_categories: int = MAX_CATEGORIES
+    ) -> Dict[str, List[GiftView]]:
+        columns = catalog.columns
+        if columns is None:
+            # Индекс построен без колонок: тот же результат даёт подбор по маскам
+            return super().rank(catalog, limit_per_category, max_categories)
+        positions = self._candidate_positions(columns)
+        if not len(positions):
+            return {}
+
+        scores = self._scores(columns, positions)
+        codes = columns.category_codes[positions]
+
+        # Группируем кандидатов по коду категории
+        order = np.argsort(codes, kind='stable')
+        group_codes, group_starts = np.unique(codes[order], return_index=True)
+        group_ends = np.append(group_starts[1:], len(order))
+
+        best = []
+        for code, start, end in zip(group_codes, group_starts, group_ends):
+            group = order[start:end]
+            group_scores = scores[group]
+            if len(group) > limit_per_category:
+                # argpartition находит k-й балл за O(n); всё, что не хуже него,
+                # досортировываем по (score, id) ради детерминизма при равенстве
+                kth = group_scores[np.argpartition(group_scores, limit_per_category - 1)[limit_per_category - 1]]
+                group = group[group_scores <= kth]
+                group_scores = scores[group]
+            top = group[np.lexsort((columns.ids[positions[group]], group_scores))[:limit_per_category]]
+            best.append((scores[top[0]], int(code), top))
+
+        best.sort(key=lambda item: (item[0], item[1]))
+
+        gifts = catalog.gifts
+        return {
+            columns.categories[code]: [gifts[position] for position in positions[top]]
+            for _, code, top in best[:max_categories]
+        }
+
+
+FINDER_BACKENDS = {
+    'python': GiftFinder,
+    'numpy': VectorGiftFinder
+}
 
 
-async def find_matching_gifts(criteria: Dict[str, Any]) -> Dict[str, List[Gift]]:
-    finder = GiftFinder(criteria)
+async def find_matching_gifts(criteria: Dict[str, Any]) -> Dict[str, List[GiftView]]:
+    finder = FINDER_BACKENDS.get(MATCHER_BACKEND, GiftFinder)(criteria)
     return await finder.find_gifts()
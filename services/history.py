@@ -0,0 +1,109 @@
+import logging
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+
+from config.config import ITEMS_PER_PAGE, HISTORY_CACHE_SIZE
+from database.database import read_session
+from database.models import Selection
+from database.snapshot import GiftSnapshot, unpack_snapshot
+from utils.history_cursor import Cursor
+
+logger = logging.getLogger(__name__)
+
+
+OLDER = 'older'
+NEWER = 'newer'
+
+# selection_id -> {категория: снимки подарков}. Сохранённые подборки не меняются,
+# поэтому записи не устаревают, а только вытесняются по размеру
+_selection_gifts: 'OrderedDict[int, Dict[str, Tuple[GiftSnapshot, ...]]]' = OrderedDict()
+
+
+class HistoryItem(NamedTuple):
+    id: int
+    recipient_type: Optional[str]
+    created_at: datetime
+    gift_count: int
+    top_category: Optional[str]
+
+
+class HistoryPage(NamedTuple):
+    items: List[HistoryItem]
+    # Курсоры для кнопок "старше" и "новее"; None - в эту сторону подборок больше нет
+    older: Optional[Cursor]
+    newer: Optional[Cursor]
+
+
+def _summary(snapshot: Optional[list]) -> Tuple[int, Optional[str]]:
+    # Число подарков и самая частая категория по снимку подборки
+    counter = Counter(row[0] for row in snapshot or ())
+    # При равенстве - первая по алфавиту, чтобы подпись не менялась между показами
+    top_category = min(counter, key=lambda name: (-counter[name], name), default=None)
+    return sum(counter.values()), top_category
+
+
+async def load_history_page(
+        user_id: int,
+        cursor: Optional[Cursor] = None,
+        direction: str = OLDER,
+        page_size: int = ITEMS_PER_PAGE
+) -> HistoryPage:
+    # Keyset-пагинация по индексу ix_selections_user_created: читается page_size + 1
+    # строка, лишняя только показывает, есть ли следующая страница. Подписи кнопок
+    # считаются по снимкам подарков из тех же строк, без соединений
+    position = tuple_(Selection.created_at, Selection.id)
+    stmt = select(Selection.id, Selection.recipient_type, Selection.created_at, Selection.gifts_snapshot).where(
+        Selection.user_id == user_id
+    )
+    if direction == NEWER:
+        if cursor is not None:
+            stmt = stmt.where(position > tuple_(*cursor))
+        stmt = stmt.order_by(Selection.created_at, Selection.id)
+    else:
+        if cursor is not None:
+            stmt = stmt.where(position < tuple_(*cursor))
+        stmt = stmt.order_by(Selection.created_at.desc(), Selection.id.desc())
+
+    async with read_session() as session:
+        rows = (await session.execute(stmt.limit(page_size + 1))).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+    if direction == NEWER:
+        rows.reverse()
+    items = [
+        HistoryItem(row.id, row.recipient_type, row.created_at, *_summary(row.gifts_snapshot))
+        for row in rows
+    ]
+    if not items:
+        return HistoryPage(items, None, None)
+
+    first = (items[0].created_at, items[0].id)
+    last = (items[-1].created_at, items[-1].id)
+    if direction == NEWER:
+        return HistoryPage(items, last, first if has_more else None)
+    return HistoryPage(items, last if has_more else None, first if cursor is not None else None)
+
+
+async def load_selection_gifts(selection_id: int) -> Dict[str, Tuple[GiftSnapshot, ...]]:
+    cached = _selection_gifts.get(selection_id)
+    if cached is not None:
+        _selection_gifts.move_to_end(selection_id)
+        return cached
+
+    # Одна строка без соединений: подарки хранятся в снимке, уже по категориям
+    async with read_session() as session:
+        snapshot = await session.scalar(
+            select(Selection.gifts_snapshot).where(Selection.id == selection_id)
+        )
+    groups = unpack_snapshot(snapshot)
+
+    # Пустой результат не кэшируем: подборка с таким id может быть ещё не создана
+    if groups:
+        _selection_gifts[selection_id] = groups
+        if len(_selection_gifts) > HISTORY_CACHE_SIZE:
+            _selection_gifts.popitem(last=False)
+    return groups
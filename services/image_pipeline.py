@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageOps
+from sqlalchemy import select
+
+from config.config import IMAGES_DIR, RENDITIONS_DIR, IMAGE_WORKERS
+from database.database import async_session, get_session
+from database.models import ImageRendition
+from services.image_registry import scan_images, reload_image_registry
+
+logger = logging.getLogger(__name__)
+
+
+# Варианты изображений: формат, максимальная сторона, качество.
+# photo отправляется в чат (Telegram сам ужимает фото до 1280 px),
+# thumb - лёгкое превью для коллажей
+RENDITIONS = {
+    'photo': ('JPEG', 1280, 85),
+    'thumb': ('WEBP', 320, 80)
+}
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def rendition_path(rendition: str, image_name: str) -> str:
+    image_format = RENDITIONS[rendition][0]
+    return os.path.join(RENDITIONS_DIR, rendition, f"{image_name}{EXTENSIONS[image_format]}")
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    # JPEG не поддерживает прозрачность: кладём изображение на белый фон
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+def render_image(
+        source_path: str,
+        image_name: str,
+        known_hash: Optional[str] = None,
+        force: bool = False
+) -> Optional[Dict[str, Any]]:
+    # Выполняется в дочернем процессе
+    source_hash = file_hash(source_path)
+    outputs = {rendition: rendition_path(rendition, image_name) for rendition in RENDITIONS}
+    if not force and source_hash == known_hash and all(map(os.path.exists, outputs.values())):
+        return None
+
+    renditions = []
+    with Image.open(source_path) as original:
+        img = _flatten(ImageOps.exif_transpose(original))
+
+        for rendition, (image_format, max_side, quality) in RENDITIONS.items():
+            copy = img.copy()
+            copy.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+            path = outputs[rendition]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Пишем во временный файл, чтобы бот не отправил недописанное изображение
+            temp_path = f"{path}.tmp"
+            if image_format == 'JPEG':
+                copy.save(temp_path, image_format, quality=quality, optimize=True, progressive=True)
+            else:
+                copy.save(temp_path, image_format, quality=quality, method=6)
+            os.replace(temp_path, path)
+
+            renditions.append({
+                'rendition': rendition,
+                'path': path,
+                'format': image_format,
+                'width': copy.width,
+                'height': copy.height,
+                'size_bytes': os.path.getsize(path)
+            })
+
+    return {
+        'image_name': image_name,
+        'source_hash': source_hash,
+        'source_bytes': os.path.getsize(source_path),
+        'renditions': renditions
+    }
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+
+def shutdown_image_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _known_hashes() -> Dict[str, str]:
+    async with async_session() as session:
+        result = await session.execute(
+            select(ImageRendition.image_name, ImageRendition.source_hash)
+        )
+        return {image_name: source_hash for image_name, source_hash in result.all()}
+
+
+async def _save_renditions(results: List[Dict[str, Any]]):
+    async with get_session() as session:
+        for result in results:
+            for rendition in result['renditions']:
+                await session.merge(ImageRendition(
+                    image_name=result['image_name'],
+                    source_hash=result['source_hash'],
+                    **rendition
+                ))
+
+
+async def process_catalog_images(force: bool = False) -> Dict[str, int]:
+    sources = await asyncio.to_thread(scan_images, IMAGES_DIR)
+    known = await _known_hashes()
+
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    tasks = {
+        image_name: loop.run_in_executor(
+            executor, render_image, path, image_name, known.get(image_name), force
+        )
+        for image_name, path in sources.items()
+    }
+
+    stats = {'processed': 0, 'skipped': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0}
+    results = []
+    for image_name, task in tasks.items():
+        try:
+            result = await task
+        except Exception as e:
+            logger.error(f"Ошибка подготовки изображения {image_name}: {e}")
+            stats['failed'] += 1
+            continue
+
+        if result is None:
+            stats['skipped'] += 1
+            continue
+
+        results.append(result)
+        stats['processed'] += 1
+        stats['bytes_before'] += result['source_bytes']
+        stats['bytes_after'] += sum(
+            rendition['size_bytes'] for rendition in result['renditions']
+            if rendition['rendition'] == 'photo'
+        )
+
+    if results:
+        await _save_renditions(results)
+        await asyncio.to_thread(reload_image_registry)
+
+    logger.info(
+        f"Изображения: подготовлено {stats['processed']}, без изменений {stats['skipped']}, "
+        f"ошибок {stats['failed']}; {stats['bytes_before'] / 1024:.0f} КБ -> {stats['bytes_after'] / 1024:.0f} КБ"
+    )
+    return stats
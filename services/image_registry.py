@@ -0,0 +1,71 @@
+import logging
+import os
+from typing import Dict, Optional
+
+from config.config import IMAGES_DIR, RENDITIONS_DIR
+
+logger = logging.getLogger(__name__)
+
+
+# Порядок задаёт приоритет, если есть несколько файлов с одним именем
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Копии, подготовленные services.image_pipeline для отправки в чат
+PHOTO_RENDITIONS_DIR = os.path.join(RENDITIONS_DIR, 'photo')
+
+# image_name -> путь к файлу
+_images: Dict[str, str] = {}
+
+
+def scan_images(directory: str = IMAGES_DIR) -> Dict[str, str]:
+    found = {}
+    priorities = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+
+            name, ext = os.path.splitext(entry.name)
+            ext = ext.lower()
+            if ext not in IMAGE_EXTENSIONS:
+                continue
+
+            priority = IMAGE_EXTENSIONS.index(ext)
+            if name not in found or priority < priorities[name]:
+                found[name] = entry.path
+                priorities[name] = priority
+    return found
+
+
+def _prefer_renditions(images: Dict[str, str]) -> Dict[str, str]:
+    if not os.path.isdir(PHOTO_RENDITIONS_DIR):
+        return images
+
+    for image_name, path in scan_images(PHOTO_RENDITIONS_DIR).items():
+        source = images.get(image_name)
+        # Устаревшую копию (исходник заменили после обработки) не используем
+        if source and os.path.getmtime(path) >= os.path.getmtime(source):
+            images[image_name] = path
+    return images
+
+
+def reload_image_registry(directory: str = IMAGES_DIR) -> int:
+    global _images
+
+    # Словарь подменяется целиком, поэтому читатели никогда не видят его частично
+    _images = _prefer_renditions(scan_images(directory))
+    logger.info(f"Реестр изображений обновлён: {len(_images)} файлов")
+    return len(_images)
+
+
+def register_image(image_name: str, path: str):
+    _images[str(image_name)] = path
+
+
+def unregister_image(image_name: str):
+    _images.pop(str(image_name), None)
+
+
+def resolve_image(image_name) -> Optional[str]:
+    if not image_name:
+        return None
+    return _images.get(str(image_name))
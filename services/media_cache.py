@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select
+from telegram import InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+from config.config import MEDIA_CACHE_SIZE
+from database.database import async_session, get_session
+from database.models import MediaFile
+
+logger = logging.getLogger(__name__)
+
+
+# (имя файла, хэш содержимого) -> file_id, от давно не отправленных к недавним.
+# Не больше MEDIA_CACHE_SIZE записей, вытесненные удаляются и из media_files
+_file_ids: 'OrderedDict[Tuple[str, str], str]' = OrderedDict()
+# путь -> (mtime, размер, хэш), чтобы не перечитывать неизменённые файлы
+_hashes: Dict[str, Tuple[float, int, str]] = {}
+
+
+def content_hash(path: str) -> str:
+    stat = os.stat(path)
+    cached = _hashes.get(path)
+    if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+        return cached[2]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+
+    _hashes[path] = (stat.st_mtime, stat.st_size, digest.hexdigest())
+    return _hashes[path][2]
+
+
+def _cache_key(path: str) -> Tuple[str, str]:
+    return os.path.basename(path), content_hash(path)
+
+
+async def load_media_cache():
+    async with async_session() as session:
+        result = await session.execute(
+            select(MediaFile).order_by(MediaFile.created_at.desc()).limit(MEDIA_CACHE_SIZE)
+        )
+        for media in reversed(result.scalars().all()):
+            _file_ids[(media.image_name, media.content_hash)] = media.file_id
+    logger.info(f"Загружено {len(_file_ids)} file_id изображений")
+
+
+def _cached_file_id(key: Tuple[str, str]) -> Optional[str]:
+    file_id = _file_ids.get(key)
+    if file_id is not None:
+        _file_ids.move_to_end(key)
+    return file_id
+
+
+def _media_rows(keys: Iterable[Tuple[str, str]]):
+    return or_(*[
+        and_(MediaFile.image_name == image_name, MediaFile.content_hash == digest)
+        for image_name, digest in keys
+    ])
+
+
+async def _remember(key: Tuple[str, str], result) -> None:
+    if not isinstance(result, Message) or not result.photo:
+        return
+
+    file_id = result.photo[-1].file_id
+    if _file_ids.get(key) == file_id:
+        return
+
+    _file_ids[key] = file_id
+    _file_ids.move_to_end(key)
+    evicted: List[Tuple[str, str]] = []
+    while len(_file_ids) > MEDIA_CACHE_SIZE:
+        evicted.append(_file_ids.popitem(last=False)[0])
+
+    try:
+        async with get_session() as session:
+            await session.merge(MediaFile(image_name=key[0], content_hash=key[1], file_id=file_id))
+            if evicted:
+                await session.execute(delete(MediaFile).where(_media_rows(evicted)))
+    except Exception as e:
+        logger.error(f"Не удалось сохранить file_id для {key[0]}: {e}")
+
+
+async def forget_files(paths: Iterable[str]):
+    # Файлы удалены с диска (например, вытесненные коллажи): их file_id больше не понадобятся
+    paths = list(paths)
+    names = {os.path.basename(path) for path in paths}
+    for key in [key for key in _file_ids if key[0] in names]:
+        del _file_ids[key]
+    for path in paths:
+        _hashes.pop(path, None)
+
+    try:
+        async with get_session() as session:
+            await session.execute(delete(MediaFile).where(MediaFile.image_name.in_(names)))
+    except Exception as e:
+        logger.error(f"Не удалось удалить file_id удалённых файлов: {e}")
+
+
+def _is_file_id_error(error: BadRequest) -> bool:
+    # Остальные BadRequest (длинная подпись и т.п.) обрабатывают вызывающие
+    return 'file' in str(error).lower()
+
+
+async def edit_photo(
+        message: Message,
+        image_path: str,
+        caption: str,
+        reply_markup=None,
+        parse_mode: Optional[str] = None
+):
+    key = _cache_key(image_path)
+
+    file_id = _cached_file_id(key)
+    if file_id:
+        try:
+            return await message.edit_media(
+                media=InputMediaPhoto(media=file_id, caption=caption, parse_mode=parse_mode),
+                reply_markup=reply_markup
+            )
+        except BadRequest as e:
+            if not _is_file_id_error(e):
+                raise
+            logger.warning(f"file_id для {key[0]} недействителен, загружаем файл заново")
+            _file_ids.pop(key, None)
+
+    with open(image_path, 'rb') as photo:
+        result = await message.edit_media(
+            media=InputMediaPhoto(media=photo, caption=caption, parse_mode=parse_mode),
+            reply_markup=reply_markup
+        )
+    await _remember(key, result)
+    return result
+
+
+async def reply_photo(
+        message: Message,
+        image_path: str,
+        caption: str,
+        reply_markup=None,
+        parse_mode: Optional[str] = None
+):
+    key = _cache_key(image_path)
+
+    file_id = _cached_file_id(key)
+    if file_id:
+        try:
+            return await message.reply_photo(
+                photo=file_id,
+                caption=caption,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
+        except BadRequest as e:
+            if not _is_file_id_error(e):
+                raise
+            logger.warning(f"file_id для {key[0]} недействителен, загружаем файл заново")
+            _file_ids.pop(key, None)
+
+    with open(image_path, 'rb') as photo:
+        result = await message.reply_photo(
+            photo=photo,
+            caption=caption,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+    await _remember(key, result)
+    return result
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import and_, bindparam, delete, insert, select
+from telegram.ext import Application, BasePersistence, PersistenceInput
+
+from config.config import PERSISTENCE_INTERVAL, PERSISTENCE_TTL_DAYS
+from database.database import engine, init_db
+from database.models import BotState
+from services.catalog_index import get_catalog_index, reload_catalog_index
+
+logger = logging.getLogger(__name__)
+
+
+USER_DATA = 'user_data'
+CONVERSATION = 'conversation:'
+# Записи, накопленные за один проход PTB по изменённым данным, пишутся одной транзакцией
+FLUSH_DELAY = 0.5
+# Как часто при записи искать в памяти пользователей, неактивных дольше PERSISTENCE_TTL_DAYS
+EVICTION_INTERVAL = timedelta(hours=1)
+
+
+def _decode_user_data(data: dict) -> dict:
+    gifts_by_category = data.get('current_gifts')
+    if gifts_by_category is not None:
+        # JSON возвращает списки: приводим к кортежам id, как их кладут обработчики.
+        # Подарки, которых уже нет в каталоге, отбрасываем
+        catalog = get_catalog_index()
+        data['current_gifts'] = {}
+        for category, gift_ids in gifts_by_category.items():
+            gift_ids = tuple(
+                gift_id for gift_id in gift_ids if isinstance(gift_id, int) and catalog.get(gift_id)
+            )
+            if gift_ids:
+                data['current_gifts'][category] = gift_ids
+
+        if not data['current_gifts']:
+            data.pop('current_gifts')
+            data.pop('current_category_index', None)
+        else:
+            data['current_category_index'] = min(
+                data.get('current_category_index', 0), len(data['current_gifts']) - 1
+            )
+    return data
+
+
+def _key_user_id(key: Tuple[Union[int, str], ...]) -> Union[int, str]:
+    # Ключ диалога: (chat_id, user_id[, message_id]); при per_chat=False - (user_id,)
+    return key[1] if len(key) > 1 else key[0]
+
+
+class DatabasePersistence(BasePersistence):
+    # Хранит user_data и состояния ConversationHandler в таблице bot_state.
+    # Обработчики держат в user_data только id подарков, так что данные пишутся
+    # в JSON как есть. Данные неактивных дольше PERSISTENCE_TTL_DAYS не загружаются,
+    # а во время работы вытесняются из памяти приложения и удаляются из базы
+
+    def __init__(self, update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        # (kind, key) -> JSON; None - удалить запись
+        self._pending: Dict[Tuple[str, str], Optional[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._ready = False
+        self._application: Optional[Application] = None
+        # user_id -> время последнего обновления его данных
+        self._last_active: Dict[int, datetime] = {}
+        self._evicted_at = datetime.utcnow()
+
+    def attach(self, application: Application):
+        # PTB передаёт хранилищу только бота, а вытеснять данные нужно из приложения
+        self._application = application
+
+    async def _ensure_ready(self):
+        # Application.initialize загружает данные раньше post_init
+        if self._ready:
+            return
+        await init_db()
+        if not len(get_catalog_index()):
+            await reload_catalog_index()
+
+        cutoff = datetime.utcnow() - timedelta(days=PERSISTENCE_TTL_DAYS)
+        async with engine.begin() as conn:
+            result = await conn.execute(delete(BotState).where(BotState.updated_at < cutoff))
+        if result.rowcount:
+            logger.info(f"Удалено устаревших записей состояния: {result.rowcount}")
+        self._ready = True
+
+    async def _load(self, kind: str) -> List[Tuple[str, Any, datetime]]:
+        await self._ensure_ready()
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                select(BotState.key, BotState.data, BotState.updated_at).where(BotState.kind == kind)
+            )
+            return [(key, json.loads(data), updated_at) for key, data, updated_at in result.all()]
+
+    def evict_idle(self, now: Optional[datetime] = None) -> int:
+        # Удаляет из памяти приложения user_data и состояния диалогов пользователей,
+        # неактивных дольше PERSISTENCE_TTL_DAYS. Удаления уходят в базу при следующем
+        # проходе PTB по изменённым данным, как и любые другие
+        now = now or datetime.utcnow()
+        self._evicted_at = now
+        cutoff = now - timedelta(days=PERSISTENCE_TTL_DAYS)
+        idle = {user_id for user_id, seen in self._last_active.items() if seen < cutoff}
+        if not idle or self._application is None:
+            return 0
+
+        for user_id in idle:
+            del self._last_active[user_id]
+            self._application.drop_user_data(user_id)
+
+        # Публичного способа завершить чужой диалог в PTB нет. Удаление из словаря
+        # состояний PTB отслеживает и передаёт в update_conversation(..., None)
+        for conversations in self._application._conversation_handler_conversations.values():
+            for key in [key for key in conversations if _key_user_id(key) in idle]:
+                del conversations[key]
+
+        logger.info(f"Из памяти вытеснены данные неактивных пользователей: {len(idle)}")
+        return len(idle)
+
+    def _set(self, kind: str, key: str, value: Any):
+        if value is None:
+            self._pending[(kind, key)] = None
+        else:
+            try:
+                self._pending[(kind, key)] = json.dumps(value, ensure_ascii=False)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Не удалось сохранить {kind} {key}: {e}")
+                return
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(FLUSH_DELAY)
+        await self._write_pending()
+
+    async def _write_pending(self):
+        if datetime.utcnow() - self._evicted_at >= EVICTION_INTERVAL:
+            self.evict_idle()
+
+        async with self._write_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+            now = datetime.utcnow()
+            table = BotState.__table__
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        delete(table).where(and_(
+                            table.c.kind == bindparam('b_kind'), table.c.key == bindparam('b_key')
+                        )),
+                        [{'b_kind': kind, 'b_key': key} for kind, key in pending]
+                    )
+                    rows = [
+                        {'kind': kind, 'key': key, 'data': data, 'updated_at': now}
+                        for (kind, key), data in pending.items() if data is not None
+                    ]
+                    if rows:
+                        await conn.execute(insert(table), rows)
+            except Exception as e:
+                # Более свежие изменения, пришедшие во время записи, не затираем
+                for item, data in pending.items():
+                    self._pending.setdefault(item, data)
+                logger.error(f"Не удалось сохранить состояние бота: {e}")
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        user_data = {}
+        for user_id, data, updated_at in await self._load(USER_DATA):
+            user_data[int(user_id)] = _decode_user_data(data)
+            self._last_active[int(user_id)] = updated_at
+        return user_data
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        # PTB вызывает его после каждого обновления от пользователя
+        self._last_active[user_id] = datetime.utcnow()
+        self._set(USER_DATA, str(user_id), data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._last_active.pop(user_id, None)
+        self._set(USER_DATA, str(user_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[Union[int, str], ...], object]:
+        return {
+            tuple(json.loads(key)): state
+            for key, state, _ in await self._load(CONVERSATION + name)
+        }
+
+    async def update_conversation(
+            self,
+            name: str,
+            key: Tuple[Union[int, str], ...],
+            new_state: Optional[object]
+    ) -> None:
+        self._set(CONVERSATION + name, json.dumps(list(key)), new_state)
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return None
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self._write_pending()
+        if self._flush_task is not None:
+            await self._flush_task
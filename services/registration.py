@@ -0,0 +1,48 @@
+import logging
+from typing import Optional, Set
+
+from sqlalchemy import select
+
+from database.database import async_session
+from database.models import User
+
+logger = logging.getLogger(__name__)
+
+
+AWAITING_CONTACT = 'awaiting_contact'
+AWAITING_NAME = 'awaiting_name'
+
+# Пользователи, не завершившие регистрацию. Все остальные текстовые
+# сообщения handle_name пропускает, не обращаясь к базе
+_awaiting_contact: Set[int] = set()
+_awaiting_name: Set[int] = set()
+
+
+async def load_registration_state():
+    # Имя ещё не введено: регистрация прервалась до перезапуска бота
+    async with async_session() as session:
+        result = await session.execute(select(User.telegram_id).where(User.name.is_(None)))
+        _awaiting_name.update(result.scalars())
+    logger.info(f"Ожидают ввода имени: {len(_awaiting_name)} пользователей")
+
+
+def registration_state(user_id: int) -> Optional[str]:
+    if user_id in _awaiting_name:
+        return AWAITING_NAME
+    if user_id in _awaiting_contact:
+        return AWAITING_CONTACT
+    return None
+
+
+def expect_contact(user_id: int):
+    _awaiting_contact.add(user_id)
+
+
+def expect_name(user_id: int):
+    _awaiting_contact.discard(user_id)
+    _awaiting_name.add(user_id)
+
+
+def finish_registration(user_id: int):
+    _awaiting_contact.discard(user_id)
+    _awaiting_name.discard(user_id)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    # Обновления разных чатов обрабатываются параллельно (не больше
+    # max_concurrent_updates одновременно), обновления одного чата - строго
+    # по очереди, как пришли: состояния ConversationHandler не перемешиваются
+
+    __slots__ = ('_chats', 'in_progress', 'waiting', 'processed', 'max_waiting')
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # ключ чата -> [блокировка, число обновлений этого чата в работе и в ожидании]
+        self._chats: Dict[Hashable, List[Any]] = {}
+        self.in_progress = 0
+        self.waiting = 0
+        self.processed = 0
+        self.max_waiting = 0
+
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            # Инлайн-запросы и т.п. без чата упорядочиваем по пользователю
+            return 'user', update.effective_user.id
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # BaseUpdateProcessor занимает слот до вызова do_process_update, и обновления,
+        # ждущие своей очереди в одном медленном чате, держали бы все слоты.
+        # Здесь слот берётся только после очереди чата, внутри do_process_update
+        await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._ordering_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        try:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                # asyncio.Lock отдаёт блокировку ожидающим в порядке очереди
+                await entry[0].acquire()
+            finally:
+                self.waiting -= 1
+
+            try:
+                await self._run(coroutine)
+            finally:
+                entry[0].release()
+        finally:
+            # Блокировку без ожидающих убираем: словарь не растёт с каждым новым чатом
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        async with self._semaphore:
+            self.in_progress += 1
+            try:
+                await coroutine
+            finally:
+                self.in_progress -= 1
+                self.processed += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrent': self.max_concurrent_updates,
+            'in_progress': self.in_progress,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'active_chats': len(self._chats),
+            'processed': self.processed
+        }
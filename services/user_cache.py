@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import bindparam, select, update
+
+from config.config import USER_CACHE_SIZE, LAST_SEEN_FLUSH_INTERVAL
+from database.database import read_session, engine
+from database.models import User
+
+logger = logging.getLogger(__name__)
+
+
+class UserProfile(NamedTuple):
+    telegram_id: int
+    name: Optional[str]
+    username: Optional[str]
+    phone: Optional[str]
+    is_admin: bool
+    is_premium: bool
+
+
+def _profile(user: User) -> UserProfile:
+    return UserProfile(
+        telegram_id=user.telegram_id,
+        name=user.name,
+        username=user.username,
+        phone=user.phone,
+        is_admin=bool(user.is_admin),
+        is_premium=bool(user.is_premium)
+    )
+
+
+# telegram_id -> профиль; None - пользователя нет в базе
+_users: 'OrderedDict[int, Optional[UserProfile]]' = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+# telegram_id -> время последней активности, ещё не записанное в базу
+_last_seen: Dict[int, datetime] = {}
+_flush_task: Optional[asyncio.Task] = None
+
+
+def _store(telegram_id: int, profile: Optional[UserProfile]):
+    _users[telegram_id] = profile
+    _users.move_to_end(telegram_id)
+    while len(_users) > USER_CACHE_SIZE:
+        _users.popitem(last=False)
+        _stats['evictions'] += 1
+
+
+async def get_user(telegram_id: int) -> Optional[UserProfile]:
+    if telegram_id in _users:
+        _stats['hits'] += 1
+        _users.move_to_end(telegram_id)
+        return _users[telegram_id]
+
+    _stats['misses'] += 1
+    async with read_session() as session:
+        user = await session.get(User, telegram_id)
+        profile = _profile(user) if user else None
+
+    _store(telegram_id, profile)
+    return profile
+
+
+def remember_user(user: User) -> UserProfile:
+    # Запись в кэш сразу после коммита изменений пользователя
+    profile = _profile(user)
+    _store(user.telegram_id, profile)
+    return profile
+
+
+def forget_user(telegram_id: int):
+    _users.pop(telegram_id, None)
+
+
+def touch(telegram_id: int):
+    _last_seen[telegram_id] = datetime.utcnow()
+
+
+async def flush_last_seen() -> int:
+    global _last_seen
+
+    if not _last_seen:
+        return 0
+
+    pending, _last_seen = _last_seen, {}
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(
+                update(User)
+                .where(User.telegram_id == bindparam('uid'))
+                .values(last_seen=bindparam('seen')),
+                [{'uid': telegram_id, 'seen': seen} for telegram_id, seen in pending.items()]
+            )
+    except Exception as e:
+        # Возвращаем отметки, не затирая более свежие
+        for telegram_id, seen in pending.items():
+            _last_seen.setdefault(telegram_id, seen)
+        logger.error(f"Не удалось сохранить время активности: {e}")
+        return 0
+    return len(pending)
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(LAST_SEEN_FLUSH_INTERVAL)
+        await flush_last_seen()
+
+
+def start_last_seen_flusher():
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_last_seen_flusher():
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    await flush_last_seen()
+
+
+def cache_stats() -> dict:
+    requests = _stats['hits'] + _stats['misses']
+    return {
+        **_stats,
+        'size': len(_users),
+        'capacity': USER_CACHE_SIZE,
+        'hit_rate': _stats['hits'] / requests if requests else 0.0,
+        'pending_last_seen': len(_last_seen)
+    }
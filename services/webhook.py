@@ -0,0 +1,149 @@
+import hmac
+import json
+import logging
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+
+# Обновление Telegram укладывается в несколько килобайт; больше - не от Telegram
+MAX_BODY_SIZE = 1024 * 1024
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+
+
+class WebhookApp:
+    # ASGI-приложение: POST <path> принимает обновления от Telegram,
+    # GET /healthz - проверка для балансировщика. Запускается любым ASGI-сервером
+    def __init__(
+            self,
+            application: Application,
+            secret_token: str,
+            path: str = '/telegram',
+            webhook_url: Optional[str] = None
+    ):
+        # Без секрета любой, кто знает адрес, прислал бы обновление от имени администратора
+        if not secret_token:
+            raise ValueError("Для вебхука нужен secret_token (WEBHOOK_SECRET)")
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.webhook_url = webhook_url
+        self.accepting = False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception("Не удалось запустить бота")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+
+        if self.webhook_url:
+            await application.bot.set_webhook(
+                url=f"{self.webhook_url.rstrip('/')}{self.path}",
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logger.info(f"Вебхук установлен: {self.webhook_url.rstrip('/')}{self.path}")
+
+        await application.start()
+        self.accepting = True
+
+    async def shutdown(self):
+        # Новые обновления отклоняем (Telegram повторит их на другом экземпляре или
+        # после перезапуска), уже принятые - обрабатываем до конца в stop()
+        self.accepting = False
+        application = self.application
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    async def _http(self, scope, receive, send):
+        path = scope['path']
+        method = scope['method']
+
+        if path == '/healthz' and method in ('GET', 'HEAD'):
+            status = 200 if self.accepting else 503
+            await self._respond(send, status, {
+                'status': 'ok' if self.accepting else 'unavailable',
+                'update_queue': self.application.update_queue.qsize()
+            })
+        elif path == self.path and method == 'POST':
+            await self._handle_update(scope, receive, send)
+        else:
+            await self._respond(send, 404, {'error': 'not found'})
+
+    async def _handle_update(self, scope, receive, send):
+        headers = dict(scope['headers'])
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b''), self.secret_token.encode()):
+            await self._respond(send, 403, {'error': 'forbidden'})
+            return
+
+        if not self.accepting:
+            await self._respond(send, 503, {'error': 'shutting down'})
+            return
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_SIZE:
+                await self._respond(send, 413, {'error': 'payload too large'})
+                return
+            if not message.get('more_body'):
+                break
+
+        try:
+            payload = json.loads(body)
+            # de_json возвращает None для пустого объекта, а на числах и строках падает
+            update = Update.de_json(payload, self.application.bot) if isinstance(payload, dict) else None
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Некорректное обновление: {e}")
+            update = None
+        if update is None:
+            await self._respond(send, 400, {'error': 'bad update'})
+            return
+
+        # Отвечаем сразу: обработка идёт в очереди приложения, как при polling
+        await self.application.update_queue.put(update)
+        await self._respond(send, 200, {'ok': True})
+
+    @staticmethod
+    async def _respond(send, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode())
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -1,11 +1,13 @@
 import asyncio
-from database.database import init_db
+from database.database import init_db, engine
 import logging
 
+
 async def setup():
     logging.info("Начало инициализации базы данных...")
     await init_db()
     logging.info("База данных успешно инициализирована")
+    await engine.dispose()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
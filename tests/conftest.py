@@ -0,0 +1,91 @@
+# Тесты работают с временной базой SQLite. Чтобы прогнать их на PostgreSQL, задайте
+# TEST_DATABASE_URL (postgresql+asyncpg://...) - все таблицы этой базы будут пересозданы,
+# поэтому рабочий DATABASE_URL тестами не используется
+import asyncio
+import json
+import os
+import tempfile
+
+import pytest
+from telegram.ext import ApplicationBuilder
+from telegram.request import BaseRequest
+
+os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or (
+    f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='gift_bot_test_'), 'test.db')}"
+)
+
+
+async def reset_database(create: bool = True):
+    from sqlalchemy import text
+
+    from database.database import engine, init_db
+    from database.migrations import schema_migrations
+    from database.models import Base
+
+    async with engine.begin() as conn:
+        if conn.dialect.name == 'sqlite':
+            # Индекс FTS5 не описан в моделях, drop_all его не удалит
+            await conn.execute(text("DROP TABLE IF EXISTS gifts_fts"))
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(schema_migrations.drop, checkfirst=True)
+    if create:
+        await init_db()
+
+
+@pytest.fixture
+def run_db():
+    # Выполняет корутину на пустой базе с актуальной схемой. Соединения пула
+    # привязаны к циклу событий, поэтому движки закрываются в том же цикле
+    from database.database import dispose_engines
+
+    def run(coro, create: bool = True):
+        async def main():
+            try:
+                await reset_database(create)
+                return await coro
+            finally:
+                await dispose_engines()
+        return asyncio.run(main())
+
+    return run
+
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Gift', 'username': 'gift_bot'}
+
+
+class FakeTelegramRequest(BaseRequest):
+    # Вместо api.telegram.org: на любой метод отвечает успехом, getMe - данными бота,
+    # sendMessage - отправленным сообщением (его текст запоминается в sent)
+    def __init__(self):
+        self.methods = []
+        self.sent = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.methods.append(endpoint)
+        result = BOT_USER if endpoint == 'getMe' else True
+        if endpoint == 'sendMessage':
+            parameters = request_data.parameters
+            self.sent.append(parameters['text'])
+            result = {
+                'message_id': len(self.sent), 'date': 0, 'text': parameters['text'],
+                'chat': {'id': parameters['chat_id'], 'type': 'private'}, 'from': BOT_USER
+            }
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+@pytest.fixture
+def application_builder():
+    # Приложение PTB, которое не ходит в сеть
+    return (
+        ApplicationBuilder()
+        .token('1:test')
+        .request(FakeTelegramRequest())
+        .get_updates_request(FakeTelegramRequest())
+    )
@@ -0,0 +1,111 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from database.database import engine, get_session, save_selection
+from database.models import Gift, Selection, User
+from services.excel_parser import COLUMN_CONVERTERS, IMPORT_CHUNK_SIZE, sync_catalog
+
+USER_ID = 42
+
+
+def gift_data(name: str, **values) -> dict:
+    # Строка в том виде, в каком её отдаёт разбор таблицы: пустые ячейки уже преобразованы
+    data = {field: converter([None])[0] for field, converter in COLUMN_CONVERTERS.items()}
+    data.update(name=name, category='Гаджеты', price=1000.0, link=f"https://example.com/{name}")
+    data.update(values)
+    return data
+
+
+async def count_gifts() -> int:
+    async with engine.connect() as conn:
+        return await conn.scalar(select(func.count(Gift.id)))
+
+
+async def wait_for_gifts(count: int):
+    while await count_gifts() < count:
+        await asyncio.sleep(0.01)
+
+
+def test_selection_is_saved_while_import_is_running(run_db):
+    async def main():
+        async with get_session() as session:
+            session.add(User(telegram_id=USER_ID, name='Тест'))
+        saved = asyncio.Event()
+
+        async def chunks():
+            # Первая пачка записывается сразу, после неё разбор файла "продолжается"
+            yield [gift_data(f"Подарок {i}") for i in range(IMPORT_CHUNK_SIZE)]
+            await asyncio.wait_for(saved.wait(), 10)
+            yield [gift_data('Последний')]
+
+        import_task = asyncio.create_task(sync_catalog(chunks()))
+        try:
+            # Записанная пачка видна другим соединениям: её транзакция уже закрыта
+            await asyncio.wait_for(wait_for_gifts(IMPORT_CHUNK_SIZE), 5)
+
+            # Запись подборки не ждёт окончания импорта (busy_timeout - 5 с)
+            selection_id = await asyncio.wait_for(save_selection(USER_ID, 'Маме', {}), 2)
+            assert not import_task.done()
+        finally:
+            saved.set()
+        stats = await import_task
+
+        async with get_session() as session:
+            selection = await session.get(Selection, selection_id)
+        return stats, selection.user_id, await count_gifts()
+
+    stats, user_id, gifts = run_db(main())
+    assert stats['added'] == IMPORT_CHUNK_SIZE + 1
+    assert user_id == USER_ID
+    assert gifts == IMPORT_CHUNK_SIZE + 1
+
+
+async def catalog_rows() -> dict:
+    async with engine.connect() as conn:
+        rows = (await conn.execute(select(Gift.id, Gift.name, Gift.price, Gift.is_active))).all()
+    return {row.name: (row.id, row.price, row.is_active) for row in rows}
+
+
+def test_sync_catalog_keeps_ids_across_imports(run_db):
+    catalog = [gift_data('Плед', sku='1'), gift_data('Свеча', sku='2'), gift_data('Кружка')]
+
+    async def main():
+        results = [await sync_catalog([catalog])]
+        states = [await catalog_rows()]
+
+        # Тот же файл ещё раз
+        results.append(await sync_catalog([catalog]))
+        states.append(await catalog_rows())
+
+        # Изменилась цена
+        edited = [gift_data('Плед', sku='1', price=1200.0), *catalog[1:]]
+        results.append(await sync_catalog([edited]))
+        states.append(await catalog_rows())
+
+        # Строку удалили из таблицы
+        results.append(await sync_catalog([edited[:2]]))
+        states.append(await catalog_rows())
+
+        # Строка вернулась
+        results.append(await sync_catalog([edited]))
+        states.append(await catalog_rows())
+        return results, states
+
+    results, states = run_db(main())
+    counts = [
+        (stats['added'], stats['updated'], stats['deactivated'], stats['unchanged']) for stats in results
+    ]
+    assert counts == [(3, 0, 0, 0), (0, 0, 0, 3), (0, 1, 0, 2), (0, 0, 1, 2), (0, 1, 0, 2)]
+
+    first, identical, edited, removed, restored = states
+    ids = {name: gift_id for name, (gift_id, _, _) in first.items()}
+    assert identical == first
+    assert edited['Плед'] == (ids['Плед'], 1200.0, True)
+    assert {name: row for name, row in edited.items() if name != 'Плед'} == {
+        name: row for name, row in first.items() if name != 'Плед'
+    }
+    # Пропавший подарок скрыт, но не удалён: ссылки из истории подборок остаются целыми
+    assert removed['Кружка'] == (ids['Кружка'], 1000.0, False)
+    assert restored['Кружка'] == (ids['Кружка'], 1000.0, True)
+    assert {name: row[0] for name, row in restored.items()} == ids
@@ -0,0 +1,55 @@
+from sqlalchemy import insert, update
+
+from database.database import engine
+from database.models import Gift, Meta
+from services import catalog_index
+from services.catalog_index import (
+    CATALOG_VERSION, bump_catalog_version, get_catalog_index, refresh_catalog_index, reload_catalog_index
+)
+from services.gift_finder import GiftFinder, VectorGiftFinder
+
+
+def test_catalog_is_reloaded_when_another_process_imports(run_db, monkeypatch):
+    monkeypatch.setattr(catalog_index, 'CATALOG_VERSION_CHECK_INTERVAL', 0)
+
+    async def main():
+        async with engine.begin() as conn:
+            await conn.execute(insert(Gift), {'id': 1, 'name': 'Плед', 'category': 'Для дома', 'price': 1500.0})
+        await reload_catalog_index()
+        # Импорт в этом процессе сам перестраивает индекс, повторная загрузка не нужна
+        await bump_catalog_version()
+        reloaded = [await refresh_catalog_index()]
+
+        # Другой процесс загрузил каталог и увеличил версию
+        async with engine.begin() as conn:
+            await conn.execute(insert(Gift), {'id': 2, 'name': 'Свеча', 'category': 'Для дома', 'price': 500.0})
+            await conn.execute(update(Meta).where(Meta.key == CATALOG_VERSION).values(value=Meta.value + 1))
+        stale = get_catalog_index().get(2)
+        reloaded.append(await refresh_catalog_index())
+        reloaded.append(await refresh_catalog_index())
+        return reloaded, stale, get_catalog_index().get(2)
+
+    reloaded, stale, fresh = run_db(main())
+    assert reloaded == [False, True, False]
+    assert stale is None
+    assert fresh.name == 'Свеча'
+
+
+def test_reload_builds_vector_columns_with_the_index(run_db, monkeypatch):
+    monkeypatch.setattr(catalog_index, 'MATCHER_BACKEND', 'numpy')
+
+    async def main():
+        async with engine.begin() as conn:
+            await conn.execute(insert(Gift).values(category='Для дома'), [
+                {'id': 2, 'name': 'Плед', 'price': 1500.0, 'for_mother': True},
+                {'id': 1, 'name': 'Свеча', 'price': 500.0, 'for_mother': True},
+            ])
+        index = await reload_catalog_index()
+        criteria = {'recipient': 'mother', 'budget': 600}
+        return index, GiftFinder(criteria).rank(index), VectorGiftFinder(criteria).rank(index)
+
+    index, expected, actual = run_db(main())
+    # Колонки уже готовы: первый подбор не строит их в цикле событий
+    assert index.columns is not None
+    assert list(index.columns.ids) == [gift.id for gift in index.gifts] == [1, 2]
+    assert actual == expected
@@ -0,0 +1,32 @@
+from sqlalchemy import insert, update
+
+from database.database import engine
+from database.models import Gift
+from services.catalog_index import reload_catalog_index
+from services.catalog_search import search_gifts
+
+
+def test_search_follows_catalog_changes(run_db):
+    async def main():
+        async with engine.begin() as conn:
+            await conn.execute(insert(Gift).values(category='Для дома', price=500.0), [
+                {'id': 1, 'name': 'Ёлка игрушечная', 'description': None, 'is_active': True},
+                {'id': 2, 'name': 'Свеча', 'description': 'Аромат ёлки', 'is_active': True},
+                {'id': 3, 'name': 'Старая ёлка', 'description': None, 'is_active': False},
+            ])
+        await reload_catalog_index()
+        found = [[gift.id for gift in await search_gifts(query)] for query in ('елк', 'ЁЛКА', 'для дом')]
+
+        # Скрытие, возврат и переименование подарков меняют индекс через триггеры
+        async with engine.begin() as conn:
+            await conn.execute(update(Gift).where(Gift.id == 1).values(is_active=False))
+            await conn.execute(update(Gift).where(Gift.id == 3).values(is_active=True))
+            await conn.execute(update(Gift).where(Gift.id == 2).values(name='Плед', description=None))
+        await reload_catalog_index()
+        found.append([gift.id for gift in await search_gifts('елк')])
+        found.append([gift.id for gift in await search_gifts('свеча')])
+        found.append([gift.id for gift in await search_gifts('плед', columns=('name', 'category'))])
+        return found
+
+    # Совпадение в названии выше совпадения в описании
+    assert run_db(main()) == [[1, 2], [1], [1, 2], [3], [], [2]]
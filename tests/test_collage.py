@@ -0,0 +1,109 @@
+import os
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from sqlalchemy import insert, select
+
+from database.database import engine
+from database.models import MediaFile
+from services import collage, media_cache
+
+
+@pytest.fixture
+def collages_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'collages'
+    monkeypatch.setattr(collage, 'COLLAGES_DIR', str(directory))
+    monkeypatch.setattr(collage, 'COLLAGE_CACHE_SIZE', 2)
+    monkeypatch.setattr(collage, '_collages', OrderedDict())
+    monkeypatch.setattr(collage, '_disk_scanned', False)
+    monkeypatch.setattr(collage, '_in_use', {})
+    monkeypatch.setattr(media_cache, '_file_ids', OrderedDict())
+    return directory
+
+
+def make_images(tmp_path, names):
+    images = []
+    for number, name in enumerate(names, 1):
+        path = tmp_path / f"{name}.png"
+        Image.new('RGB', (40, 40), (number * 40, 0, 0)).save(path)
+        images.append((number, name, str(path)))
+    return images
+
+
+async def media_names():
+    async with engine.connect() as conn:
+        return set((await conn.execute(select(MediaFile.image_name))).scalars())
+
+
+def test_least_recently_shown_collages_are_deleted(run_db, tmp_path, collages_dir):
+    async def main():
+        shown_twice = make_images(tmp_path, ['a', 'b'])
+        first = collage._ensure_collage(shown_twice)
+        second = collage._ensure_collage(make_images(tmp_path, ['c', 'd']))
+        # Повторный показ первого коллажа делает его недавним
+        assert collage._ensure_collage(shown_twice) == first
+        third = collage._ensure_collage(make_images(tmp_path, ['e', 'f']))
+
+        # Коллажи уже загружались в Telegram
+        for path in (first, second, third):
+            key = media_cache._cache_key(path)
+            media_cache._file_ids[key] = f"file-{key[0]}"
+            async with engine.begin() as conn:
+                await conn.execute(insert(MediaFile), {'image_name': key[0], 'content_hash': key[1], 'file_id': 'x'})
+
+        assert await collage.evict_collages() == 1
+        return first, second, third, await media_names()
+
+    first, second, third, stored = run_db(main())
+    assert list(collage._collages.values()) == [first, third]
+    assert os.path.exists(first) and os.path.exists(third)
+    assert not os.path.exists(second)
+    assert sorted(os.listdir(collages_dir)) == sorted(os.path.basename(path) for path in (first, third))
+    # file_id удалённого коллажа забыты и в памяти, и в базе
+    assert {name for name, _ in media_cache._file_ids} == {os.path.basename(first), os.path.basename(third)}
+    assert stored == {os.path.basename(first), os.path.basename(third)}
+
+
+def test_collage_being_sent_is_not_deleted(run_db, tmp_path, collages_dir, monkeypatch):
+    images = {name: path for _, name, path in make_images(tmp_path, ['a', 'b', 'c', 'd', 'e', 'f'])}
+    monkeypatch.setattr(collage, 'resolve_image', images.get)
+
+    def gifts(*names):
+        return [SimpleNamespace(image_name=name) for name in names]
+
+    async def main():
+        async with collage.category_image(gifts('a', 'b')) as sending:
+            # Пока первый коллаж отправляется, другие обработчики собирают новые
+            for names in (('c', 'd'), ('e', 'f')):
+                async with collage.category_image(gifts(*names)):
+                    pass
+            kept = os.path.exists(sending)
+        # После отправки он вытесняется первым
+        async with collage.category_image(gifts('c', 'd')) as shown_again:
+            pass
+        return sending, kept, shown_again
+
+    sending, kept, shown_again = run_db(main())
+    assert kept
+    assert not os.path.exists(sending)
+    assert os.path.exists(shown_again)
+    assert collage._in_use == {}
+    assert len(collage._collages) == 2
+
+
+def test_collages_from_previous_runs_count_towards_limit(run_db, tmp_path, collages_dir):
+    collages_dir.mkdir()
+    for age, name in enumerate(['old', 'older']):
+        path = collages_dir / f"{name}.jpg"
+        path.write_bytes(b'jpeg')
+        os.utime(path, (1000 - age, 1000 - age))
+
+    async def main():
+        fresh = collage._ensure_collage(make_images(tmp_path, ['a', 'b']))
+        await collage.evict_collages()
+        return fresh
+
+    fresh = run_db(main())
+    assert sorted(os.listdir(collages_dir)) == sorted(['old.jpg', os.path.basename(fresh)])
@@ -0,0 +1,11 @@
+from datetime import datetime
+
+from utils.history_cursor import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip_fits_callback_data():
+    cursor = (datetime(2024, 12, 31, 23, 59, 59, 999999), 2_000_000_000)
+    value = encode_cursor(cursor)
+    assert decode_cursor(value) == cursor
+    # callback_data ограничена 64 байтами вместе с префиксом hist_older_
+    assert len(f"hist_older_{value}".encode()) <= 64
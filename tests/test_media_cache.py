@@ -0,0 +1,35 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import select
+from telegram import Chat, Message, PhotoSize
+
+from database.database import engine
+from database.models import MediaFile
+from services import media_cache
+
+
+def photo_message(file_id: str) -> Message:
+    return Message(
+        1, datetime.now(), Chat(1, Chat.PRIVATE),
+        photo=[PhotoSize(file_id, f"unique-{file_id}", 100, 100)]
+    )
+
+
+def test_file_ids_are_capped_in_memory_and_database(run_db, monkeypatch):
+    monkeypatch.setattr(media_cache, 'MEDIA_CACHE_SIZE', 2)
+    monkeypatch.setattr(media_cache, '_file_ids', OrderedDict())
+
+    async def main():
+        await media_cache._remember(('1.jpg', 'h1'), photo_message('f1'))
+        await media_cache._remember(('2.jpg', 'h2'), photo_message('f2'))
+        # Недавно отправленный файл не вытесняется
+        assert media_cache._cached_file_id(('1.jpg', 'h1')) == 'f1'
+        await media_cache._remember(('3.jpg', 'h3'), photo_message('f3'))
+
+        async with engine.connect() as conn:
+            return set((await conn.execute(select(MediaFile.image_name))).scalars())
+
+    stored = run_db(main())
+    assert list(media_cache._file_ids) == [('1.jpg', 'h1'), ('3.jpg', 'h3')]
+    assert stored == {'1.jpg', '3.jpg'}
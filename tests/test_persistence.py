@@ -0,0 +1,64 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from telegram.ext import CommandHandler, ConversationHandler
+
+from config.config import PERSISTENCE_TTL_DAYS
+from database.database import engine
+from database.models import BotState
+from services.persistence import CONVERSATION, USER_DATA, DatabasePersistence
+
+IDLE_USER = 101
+ACTIVE_USER = 202
+
+
+async def noop(update, context):
+    return ConversationHandler.END
+
+
+def test_idle_users_are_evicted_from_memory_and_database(run_db, application_builder):
+    now = datetime.utcnow()
+    # Пользователь загружается при старте, но за время работы бота становится неактивным
+    almost_stale = now - timedelta(days=PERSISTENCE_TTL_DAYS) + timedelta(hours=1)
+
+    async def main():
+        async with engine.begin() as conn:
+            await conn.execute(insert(BotState), [
+                {'kind': USER_DATA, 'key': str(IDLE_USER), 'data': json.dumps({'a': 1}), 'updated_at': almost_stale},
+                {'kind': USER_DATA, 'key': str(ACTIVE_USER), 'data': json.dumps({'b': 2}), 'updated_at': now},
+                {'kind': CONVERSATION + 'conv', 'key': json.dumps([IDLE_USER, IDLE_USER]), 'data': '1',
+                 'updated_at': almost_stale},
+                {'kind': CONVERSATION + 'conv', 'key': json.dumps([ACTIVE_USER, ACTIVE_USER]), 'data': '1',
+                 'updated_at': almost_stale},
+            ])
+
+        persistence = DatabasePersistence(update_interval=3600)
+        application = application_builder.updater(None).persistence(persistence).build()
+        persistence.attach(application)
+        conversation = ConversationHandler(
+            entry_points=[CommandHandler('start', noop)], states={}, fallbacks=[], name='conv', persistent=True
+        )
+        application.add_handler(conversation)
+        await application.initialize()
+        try:
+            assert set(application.user_data) == {IDLE_USER, ACTIVE_USER}
+            await persistence.update_user_data(ACTIVE_USER, {'b': 3})
+
+            assert persistence.evict_idle(now + timedelta(hours=2)) == 1
+            assert set(application.user_data) == {ACTIVE_USER}
+            conversations = application._conversation_handler_conversations['conv']
+            assert set(conversations) == {(ACTIVE_USER, ACTIVE_USER)}
+
+            await application.update_persistence()
+            await persistence.flush()
+            async with engine.connect() as conn:
+                rows = (await conn.execute(select(BotState.kind, BotState.key))).all()
+        finally:
+            await application.shutdown()
+        return {tuple(row) for row in rows}
+
+    assert run_db(main()) == {
+        (USER_DATA, str(ACTIVE_USER)),
+        (CONVERSATION + 'conv', json.dumps([ACTIVE_USER, ACTIVE_USER]))
+    }
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, text, tuple_
+
+from database.database import engine
+from database.functions import day
+from database.models import Gift, Selection, SelectionGift, User
+
+
+def hot_queries():
+    # Запросы, которые должны идти по индексам при любом размере таблиц:
+    # имя -> (запрос, индекс из плана SQLite)
+    since = datetime(2024, 1, 1)
+    return {
+        'история пользователя': (select(
+            Selection.id, Selection.recipient_type, Selection.created_at, Selection.gifts_snapshot
+        ).where(
+            Selection.user_id == 1,
+            tuple_(Selection.created_at, Selection.id) < tuple_(since, 100)
+        ).order_by(Selection.created_at.desc(), Selection.id.desc()).limit(11), 'ix_selections_user_created'),
+        'подарки подборки': (
+            select(SelectionGift).where(SelectionGift.selection_id == 1),
+            'sqlite_autoindex_selection_gifts_1'  # первичный ключ (selection_id, gift_id)
+        ),
+        'активность по дням': (select(
+            day(Selection.created_at), func.count(Selection.id)
+        ).where(Selection.created_at >= since).group_by(day(Selection.created_at)), 'ix_selections_created_at'),
+        'новые пользователи за день': (select(func.count(User.telegram_id)).where(
+            User.created_at >= since, User.created_at < since + timedelta(days=1)
+        ), 'ix_users_created_at'),
+        'страница каталога': (select(Gift.id, Gift.name, Gift.price).where(
+            Gift.is_active, Gift.id > 100
+        ).order_by(Gift.id).limit(7), 'ix_gifts_active_id'),
+        # Агрегат по всем связям: читается покрывающий индекс, а не сама таблица
+        'популярные категории': (select(
+            Gift.category, func.count(SelectionGift.selection_id)
+        ).join(SelectionGift).group_by(Gift.category), 'sqlite_autoindex_selection_gifts_1'),
+    }
+
+
+@pytest.mark.parametrize('name', list(hot_queries()))
+def test_hot_query_uses_index(run_db, name):
+    if engine.dialect.name != 'sqlite':
+        pytest.skip("EXPLAIN QUERY PLAN есть только в SQLite")
+    query, index = hot_queries()[name]
+
+    async def main():
+        async with engine.connect() as conn:
+            sql = str(query.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+            return [row[-1] for row in await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+    plan = run_db(main())
+    assert any(f"INDEX {index} " in f"{detail} " for detail in plan), plan
+    # Полный просмотр таблицы без индекса не допускается ни для одной таблицы
+    assert not [detail for detail in plan if detail.startswith('SCAN ') and ' USING ' not in detail], plan
@@ -0,0 +1,65 @@
+import pytest
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from database.database import get_session
+from database.models import User
+from handlers.common import handle_name
+from services import registration, user_cache
+
+NEW_USER = 301
+HALF_REGISTERED = 302
+REGISTERED = 303
+
+
+def name_message(application, user_id: int, text: str = 'Иван') -> Update:
+    return Update.de_json({
+        'update_id': user_id,
+        'message': {
+            'message_id': user_id, 'date': 0, 'text': text,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': text}
+        }
+    }, application.bot)
+
+
+@pytest.fixture
+def application(application_builder):
+    return application_builder.updater(None).build()
+
+
+def test_name_without_registration_state_is_answered(run_db, application):
+    # Бот перезапустился: состояние регистрации в памяти потеряно
+    async def main():
+        async with get_session() as session:
+            session.add(User(telegram_id=HALF_REGISTERED, phone='+70000000000'))
+            session.add(User(telegram_id=REGISTERED, phone='+70000000001', name='Мария'))
+        for user_id in (NEW_USER, HALF_REGISTERED, REGISTERED):
+            user_cache.forget_user(user_id)
+            registration.finish_registration(user_id)
+
+        await application.initialize()
+        try:
+            replies = {}
+            for user_id in (NEW_USER, HALF_REGISTERED, REGISTERED):
+                update = name_message(application, user_id)
+                sent = application.bot.request.sent
+                before = len(sent)
+                await handle_name(update, CallbackContext.from_update(update, application))
+                replies[user_id] = sent[before:]
+        finally:
+            await application.shutdown()
+
+        async with get_session() as session:
+            name = (await session.get(User, HALF_REGISTERED)).name
+        return replies, name
+
+    replies, name = run_db(main())
+    # Незнакомому пользователю подсказываем начать заново, а не молчим
+    assert len(replies[NEW_USER]) == 1 and '/start' in replies[NEW_USER][0]
+    # Телефон уже сохранён: регистрация продолжается с ввода имени
+    assert len(replies[HALF_REGISTERED]) == 1 and replies[HALF_REGISTERED][0].startswith('Отлично, Иван!')
+    assert name == 'Иван'
+    assert registration.registration_state(HALF_REGISTERED) is None
+    # Обычные сообщения зарегистрированных пользователей этот обработчик не трогает
+    assert replies[REGISTERED] == []
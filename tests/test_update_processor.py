@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update
+
+from services.update_processor import ChatOrderedUpdateProcessor
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    return Update(update_id, message=Message(update_id, datetime.now(), Chat(chat_id, Chat.PRIVATE)))
+
+
+def test_updates_of_one_chat_run_in_order():
+    events = []
+
+    async def handle(update_id: int, delay: float):
+        events.append(('start', update_id))
+        await asyncio.sleep(delay)
+        events.append(('end', update_id))
+
+    async def main():
+        processor = ChatOrderedUpdateProcessor(4)
+        # Первые обновления обрабатываются дольше последующих
+        await asyncio.gather(*[
+            processor.process_update(make_update(update_id, 5), handle(update_id, delay))
+            for update_id, delay in ((1, 0.03), (2, 0.02), (3, 0.01))
+        ])
+        return processor.stats()
+
+    stats = asyncio.run(main())
+    assert events == [('start', 1), ('end', 1), ('start', 2), ('end', 2), ('start', 3), ('end', 3)]
+    assert stats['processed'] == 3
+    # Блокировки отработавших чатов не копятся
+    assert stats['active_chats'] == 0
+
+
+def test_blocked_chat_does_not_hold_other_chats():
+    async def main():
+        processor = ChatOrderedUpdateProcessor(2)
+        release = asyncio.Event()
+        handled = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+
+        async def fast():
+            handled.set()
+
+        # Очередь медленного чата длиннее числа слотов
+        slow_chat = [
+            asyncio.create_task(processor.process_update(make_update(update_id, 1), slow()))
+            for update_id in range(1, 4)
+        ]
+        other_chat = asyncio.create_task(processor.process_update(make_update(4, 2), fast()))
+        try:
+            await asyncio.wait_for(handled.wait(), 1)
+            stats = processor.stats()
+        finally:
+            release.set()
+        await asyncio.gather(other_chat, *slow_chat)
+        return stats, processor.stats()
+
+    during, after = asyncio.run(main())
+    # Пока первое обновление медленного чата в работе, остальные ждут очереди, не занимая слотов
+    assert during['in_progress'] == 1
+    assert during['waiting'] == 2
+    assert during['active_chats'] == 1
+    assert after['processed'] == 4
+    assert after['active_chats'] == 0
@@ -0,0 +1,182 @@
+import asyncio
+import json
+
+import pytest
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from services.webhook import MAX_BODY_SIZE, WebhookApp
+
+SECRET = 's3cret'
+
+
+def make_update(update_id: int = 1) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': 5, 'type': 'private'},
+            'from': {'id': 5, 'is_bot': False, 'first_name': 'Тест'},
+            'text': 'привет'
+        }
+    }
+
+
+class Lifespan:
+    # Имитирует ASGI-сервер: отправляет приложению события запуска и остановки
+    def __init__(self, app):
+        self.app = app
+        self.received = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        self.task = None
+
+    async def _send(self, message):
+        await self.sent.put(message)
+
+    async def startup(self):
+        self.task = asyncio.create_task(
+            self.app({'type': 'lifespan'}, self.received.get, self._send)
+        )
+        await self.received.put({'type': 'lifespan.startup'})
+        return (await asyncio.wait_for(self.sent.get(), 5))['type']
+
+    async def shutdown(self):
+        await self.received.put({'type': 'lifespan.shutdown'})
+        message = await asyncio.wait_for(self.sent.get(), 5)
+        await asyncio.wait_for(self.task, 5)
+        return message['type']
+
+
+async def request(app, method: str, path: str, body: bytes = b'', secret=SECRET, chunk_size=None):
+    headers = [(b'content-type', b'application/json')]
+    if secret is not None:
+        headers.append((b'x-telegram-bot-api-secret-token', secret.encode()))
+
+    chunk_size = chunk_size or max(len(body), 1)
+    parts = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    messages = [
+        {'type': 'http.request', 'body': part, 'more_body': i < len(parts) - 1}
+        for i, part in enumerate(parts)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': headers}, receive, send)
+    assert sent[0]['type'] == 'http.response.start'
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+@pytest.fixture
+def application(application_builder):
+    return application_builder.updater(None).build()
+
+
+def run_app(application, scenario, **kwargs):
+    async def main():
+        app = WebhookApp(application, secret_token=SECRET, **kwargs)
+        lifespan = Lifespan(app)
+        assert await lifespan.startup() == 'lifespan.startup.complete'
+        try:
+            await scenario(app)
+        finally:
+            if application.running:
+                await lifespan.shutdown()
+
+    asyncio.run(main())
+
+
+def test_valid_update_reaches_handlers(application):
+    received = []
+    handled = asyncio.Event()
+
+    async def record(update, context):
+        received.append(update)
+        handled.set()
+
+    application.add_handler(TypeHandler(Update, record))
+
+    async def scenario(app):
+        status, payload = await request(app, 'POST', '/telegram', json.dumps(make_update(7)).encode(), chunk_size=50)
+        assert (status, payload) == (200, {'ok': True})
+        await asyncio.wait_for(handled.wait(), 5)
+
+    run_app(application, scenario)
+    assert [update.update_id for update in received] == [7]
+    assert received[0].message.text == 'привет'
+
+
+@pytest.mark.parametrize('body', [b'not json', b'5', b'"x"', b'[]', b'{}', b'null', b'{"update_id": "x", "message": 5}'])
+def test_bad_body_is_rejected(application, body):
+    async def scenario(app):
+        status, payload = await request(app, 'POST', '/telegram', body)
+        assert status == 400
+        assert application.update_queue.qsize() == 0
+
+    run_app(application, scenario)
+
+
+def test_oversize_body_is_rejected(application):
+    async def scenario(app):
+        body = b'{"update_id": 1, "pad": "' + b'x' * MAX_BODY_SIZE + b'"}'
+        status, _ = await request(app, 'POST', '/telegram', body, chunk_size=64 * 1024)
+        assert status == 413
+
+    run_app(application, scenario)
+
+
+def test_wrong_secret_is_forbidden(application):
+    async def scenario(app):
+        status, _ = await request(app, 'POST', '/telegram', json.dumps(make_update()).encode(), secret='wrong')
+        assert status == 403
+        status, _ = await request(app, 'POST', '/telegram', json.dumps(make_update()).encode(), secret=None)
+        assert status == 403
+
+    run_app(application, scenario)
+
+
+@pytest.mark.parametrize('secret', [None, ''])
+def test_secret_is_required(application, secret):
+    with pytest.raises(ValueError):
+        WebhookApp(application, secret_token=secret)
+
+
+def test_health_and_unknown_path(application):
+    async def scenario(app):
+        status, payload = await request(app, 'GET', '/healthz')
+        assert status == 200
+        assert payload == {'status': 'ok', 'update_queue': 0}
+        status, _ = await request(app, 'GET', '/telegram')
+        assert status == 404
+
+    run_app(application, scenario)
+
+
+def test_startup_sets_webhook(application):
+    async def scenario(app):
+        assert 'setWebhook' in application.bot.request.methods
+
+    run_app(application, scenario, webhook_url='https://example.com/')
+
+
+def test_shutdown_stops_accepting_updates(application):
+    async def main():
+        app = WebhookApp(application, secret_token=SECRET)
+        lifespan = Lifespan(app)
+        assert await lifespan.startup() == 'lifespan.startup.complete'
+        assert application.running
+
+        assert await lifespan.shutdown() == 'lifespan.shutdown.complete'
+        assert not application.running
+
+        status, payload = await request(app, 'GET', '/healthz')
+        assert (status, payload['status']) == (503, 'unavailable')
+        status, _ = await request(app, 'POST', '/telegram', json.dumps(make_update()).encode())
+        assert status == 503
+
+    asyncio.run(main())
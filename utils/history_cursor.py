@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta
+from typing import Tuple
+
+# Позиция в истории: (created_at, id) последней показанной подборки
+Cursor = Tuple[datetime, int]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    # Для callback_data (до 64 байт): микросекунды от эпохи и id
+    created_at, selection_id = cursor
+    return f"{(created_at - _EPOCH) // timedelta(microseconds=1)}_{selection_id}"
+
+
+def decode_cursor(value: str) -> Cursor:
+    microseconds, selection_id = value.split('_')
+    return _EPOCH + timedelta(microseconds=int(microseconds)), int(selection_id)